@@ -2,7 +2,7 @@ import os.path
 
 from quality_filter.loader.base import Array, String
 from quality_filter.flow_builder import FlowBuilder
-from quality_filter.flow_engine import run_flow
+from quality_filter.flow_engine import run_flow, run_flows
 
 
 if __name__ == '__main__':
@@ -12,17 +12,28 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="SmartETL: a simple but strong ETL framework")
 
     # 添加位置参数
-    parser.add_argument("filename", type=str, default=None, help="yaml流程定义文件，或者流程名字")
+    parser.add_argument("filename", type=str, nargs='?', default=None, help="yaml流程定义文件，或者流程名字")
 
     # 添加可选参数
     parser.add_argument("-i", "--input", type=str, default=None, help="直接提供流程输入数据")
     parser.add_argument("--json", default=False, action="store_true", help="将--input参数提供的输入数据作为json加载，默认为纯文本")
     parser.add_argument("--loader", default=None, help="指定Loader表达式")
     parser.add_argument("--processor", default=None, help="指定Processor表达式")
+    parser.add_argument("--flows", nargs='+', default=None, help="同时运行多个yaml流程，加载器定义相同的流程只读取一遍数据")
+    parser.add_argument("--buffer-size", type=int, default=1000, help="--flows模式下每个流程的数据队列大小")
 
     # 解析参数
     args, unknown = parser.parse_known_args()
 
+    if args.flows:
+        flow_files = ([args.filename] if args.filename else []) + args.flows
+        run_flows(flow_files, *unknown, buffer_size=args.buffer_size)
+        exit(0)
+
+    if not args.filename:
+        parser.print_help()
+        exit(1)
+
     input_data = args.input
     if input_data and args.json is True:
         input_data = json.loads(input_data)
@@ -1,11 +1,15 @@
+import re
 import sys
 import signal
+import threading
 from typing import Any
-from types import GeneratorType
-from quality_filter.loader import DataProvider
-from quality_filter.iterator.base import Message, JsonIterator
+from quality_filter.loader import DataProvider, QueueLoader
+from quality_filter.iterator.base import Message, JsonIterator, process_mode, MODE_VALUE
+from quality_filter.iterator.flow_control import Chain, Filter, copier_of
+from quality_filter.util.queues import create_queue
 
 from quality_filter.flow import Flow
+from quality_filter.flow_builder import FlowBuilder
 
 
 process_status = {
@@ -21,13 +25,26 @@ def handle_sigint(signum, frame):
         sys.exit(0)
 
 
+def push_filters(data_provider: DataProvider, processor: JsonIterator):
+    """将流程最前端的过滤节点（processor本身或Chain开头连续的Filter）下推到加载器"""
+    nodes = processor.nodes if isinstance(processor, Chain) else [processor]
+    for node in nodes:
+        if not isinstance(node, Filter) or not node.push_down(data_provider):
+            break
+        print(f"filter pushed down: {node} -> {data_provider}")
+
+
 def run(data_provider: DataProvider, processor: JsonIterator):
-    # 注册信号处理程序
-    signal.signal(signal.SIGINT, handle_sigint)
+    # 注册信号处理程序 只能在主线程中注册（在线程中运行的流程由主线程处理信号）
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, handle_sigint)
+    push_filters(data_provider, processor)
 
     print(f"Run flow: \nloader: {data_provider}\nprocessor: {processor}")
     print("------------------------")
     processor.on_start()
+    # 输出模式只需确定一次
+    drain = process_mode(processor) != MODE_VALUE
 
     def execute(data: Any, *args):
         try:
@@ -35,7 +52,7 @@ def run(data_provider: DataProvider, processor: JsonIterator):
         except:
             return
         # 注意：包含yield的函数调用仅返回迭代器，而不会执行函数
-        if isinstance(res, GeneratorType):
+        if drain and res is not None:
             for _ in res:
                 pass
 
@@ -58,3 +75,99 @@ def run_flow(flow: Flow):
     print('starting flow:', flow.name)
     assert flow.loader is not None, "loader为空！可通过yaml文件或命令行参数进行配置"
     run(flow.loader, flow.processor)
+
+
+def loader_key(flow_def: dict, args: tuple = ()) -> str:
+    """
+    加载器定义的分组key：去掉空白的loader表达式，以及表达式中引用的consts、nodes定义和命令行参数，
+    避免同名变量在不同流程中取值不同时被误认为同一个加载器
+    """
+    expr = re.sub(r'\s+', '', str(flow_def.get('loader') or ''))
+    consts = flow_def.get('consts') or {}
+    nodes = flow_def.get('nodes') or {}
+    refs = []
+    for name in sorted(set(re.findall(r'[A-Za-z_]\w*', expr))):
+        if name in consts:
+            refs.append(f'{name}={consts[name]!r}')
+        elif name in nodes:
+            refs.append(f'{name}={nodes[name]}')
+        elif re.fullmatch(r'arg\d+', name):
+            refs.append(f'args={args!r}')
+    return ';'.join([expr] + refs)
+
+
+def broadcast(data_provider: DataProvider, queues: list, copier=None, chunk_size: int = 256):
+    """
+    读取一遍数据 按批放入各流程的队列，结束时发送结束消息
+    多个流程时每个流程都得到copier生成的副本（与Fork一致），原始数据不交给任何流程，避免某个流程原地修改嵌套字段时
+    影响其他流程尚未复制的视图；按批传递使每条数据的队列开销（加锁、线程唤醒）降低到1/chunk_size
+    """
+    if len(queues) == 1:
+        copier = None
+    chunks = [[] for _ in queues]
+    try:
+        for item in data_provider.iter():
+            for chunk in chunks:
+                chunk.append(copier(item) if copier else item)
+            if len(chunks[0]) >= chunk_size:
+                for q, chunk in zip(queues, chunks):
+                    q.put(chunk.copy())
+                    chunk.clear()
+            if process_status["stop"] > 0:
+                break
+    finally:
+        data_provider.close()
+        for q, chunk in zip(queues, chunks):
+            if chunk:
+                q.put(chunk)
+            q.put(Message.end())
+
+
+def consume(flow: Flow, queue):
+    """在线程中运行流程的处理节点；异常退出时继续取出队列中的数据，避免阻塞共享的加载器"""
+    loader = QueueLoader(queue, timeout=0, batched=True)
+    try:
+        run(loader, flow.processor)
+    except BaseException as e:
+        if not isinstance(e, SystemExit):
+            print(f"flow {flow.name} failed: {type(e).__name__}: {e}")
+        if not loader.finished:
+            while not isinstance(queue.get(), Message):
+                pass
+
+
+def run_flows(flow_files: list, *args, buffer_size: int = 1000, copy_mode: str = 'cow', chunk_size: int = 256,
+              **kwargs):
+    """
+    同时运行多个流程：按加载器定义分组，每组只读取、解析一遍数据，分发给组内各流程的处理节点
+    每个处理节点在独立线程中运行（各自的on_start/on_complete），通过有界队列（buffer_size）接收数据：
+    队列吸收各流程的速度差异，某个流程持续慢于加载时，其队列写满后加载器等待（整体速度受最慢的流程限制，内存有界）
+    :param flow_files yaml流程文件列表
+    :param buffer_size 每个流程的队列中最多缓存的数据条数
+    :param copy_mode 流程间数据隔离方式 cow: 写时复制视图 deep: 深拷贝 none: 不复制（各流程都不修改数据时）
+    :param chunk_size 每批传递的数据条数
+    """
+    groups = {}
+    for flow_file in flow_files:
+        flow_def = FlowBuilder.load_yaml(flow_file, set())
+        key = loader_key(flow_def, args)
+        shared = groups[key][0].loader if key in groups else None
+        flow = Flow(flow_def, *args, loader=shared, **kwargs)
+        assert flow.loader is not None and flow.processor is not None, f"流程缺少loader或processor: {flow_file}"
+        groups.setdefault(key, []).append(flow)
+
+    signal.signal(signal.SIGINT, handle_sigint)
+    copier = None if copy_mode == 'none' else copier_of(True, copy_mode)
+    threads = []
+    for flows in groups.values():
+        loader = flows[0].loader
+        print(f"loader {loader} shared by: {[flow.name for flow in flows]}")
+        queues = [create_queue(max(1, buffer_size // chunk_size)) for _ in flows]
+        for flow, q in zip(flows, queues):
+            threads.append(threading.Thread(target=consume, args=(flow, q), name=f'flow-{flow.name}'))
+        threads.append(threading.Thread(target=broadcast, args=(loader, queues, copier, chunk_size),
+                                        name=f'loader-{loader}'))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
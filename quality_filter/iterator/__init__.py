@@ -1,8 +1,12 @@
 from .base import JsonIterator, ToDict, ToArray, Repeat, Prompt, Print, Count, AddTS, UUID, MinValue, MaxValue, Wait, WriteQueue
-from .flow_control import Fork, Chain, If, IfElse, While, Aggregate
+from .flow_control import Fork, Chain, If, IfElse, While, Aggregate, Filter
 from .field_based import (Select, SelectVal, AddFields, RemoveFields, ReplaceFields, MergeFields, RenameFields,
                           CopyFields,
-                          InjectField, ConcatFields, ConcatArray, RemoveEmptyOrNullFields)
-from .rule import Character, EndWithTerminal,EndWithEllipsis,WordNumber,SentenceNumber,CheckNullValues,CheckUniqueValues,CheckDuplicateValues,ValidateFormat,ValidateDate,ValidateEmail,ValidatePhone,ValidatePostcode,ValidateIDCard,ValidateIPAddress
+                          InjectField, ConcatFields, ConcatArray, RemoveEmptyOrNullFields, KeepFields)
+from .rule import Character, EndWithTerminal,EndWithEllipsis,WordNumber,SentenceNumber,CheckNullValues,CheckUniqueValues,CheckDuplicateValues,ValidateFormat,ValidateDate,ValidateEmail,ValidatePhone,ValidatePostcode,ValidateIDCard,ValidateIPAddress,ValidateDateTime,ColumnProfiler
 from .score import Comprehensive
 from .transform import CSVToJSONConverter
+from .accuracy_llm import LLMJudge
+from .cache import Cached
+from .image import ImageResolution, ImageAspectRatio, ImageBlur, ImagePHash, ImageQRCode, ImageQuality, ImageDedup
+from .writer import JsonLineWriter, CSVWriter, ParquetWriter, BucketWriter
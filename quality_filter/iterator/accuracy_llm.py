@@ -0,0 +1,253 @@
+import re
+from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from quality_filter.iterator.base import Message
+from quality_filter.iterator.rule import BaseRule, ModelRes
+from quality_filter.util.caches import DiskCache, content_hash
+from quality_filter.util.rate_limit import TokenBucket, retry
+
+
+DEFAULT_TEMPLATE = """Please act as an impartial judge and evaluate the quality of the response provided by an AI assistant to the user question displayed below. Your evaluation should consider factors such as the helpfulness, relevance, accuracy, depth, creativity, and level of detail of the response. Begin your evaluation by providing a short explanation. After providing your explanation, you must rate the response on a scale of 1 to 10 by strictly following this format: "[[rating]]", for example: "Rating: [[5]]".
+
+{dialogue}"""
+
+SCORE_PATTERN = re.compile(r'\[\[(\d+(?:\.\d+)?)\]\]')
+
+QUESTION_KEYS = ['question', 'input', 'instruction', 'prompt']
+ANSWER_KEYS = ['answer', 'response', 'output', 'reference']
+
+
+def first_key(data: dict, keys: list):
+    for k in keys:
+        if k in data:
+            return k
+    return None
+
+
+def retryable(e: Exception) -> bool:
+    """网络错误、超时、429及5xx可以重试；其他4xx（如参数错误、鉴权失败）重试也不会成功"""
+    response = getattr(e, 'response', None)
+    if response is not None:
+        return response.status_code == 429 or response.status_code >= 500
+    import requests
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+def build_dialogue(data: dict, question_key: str = None, answer_key: str = None) -> str:
+    """将一条SFT记录渲染为对话文本 支持多轮`history`（如mtbench101）或问答字段"""
+    history = data.get('history')
+    if isinstance(history, list):
+        turns = []
+        for turn in history:
+            turns.append(f"[User]\n{turn.get('user', '')}")
+            turns.append(f"[Assistant]\n{turn.get('bot', '')}")
+        return '\n\n'.join(turns)
+    question_key = question_key or first_key(data, QUESTION_KEYS)
+    answer_key = answer_key or first_key(data, ANSWER_KEYS)
+    return f"[Question]\n{data.get(question_key, '')}\n\n[Answer]\n{data.get(answer_key, '')}"
+
+
+class LLMJudge(BaseRule):
+    """
+    基于大模型（OpenAI兼容接口）的打分规则，输出ModelRes
+    - 连接池+线程池并发请求，completions接口支持一次请求携带多个prompt
+    - 基于prompt哈希的本地磁盘缓存，重复运行不再请求
+    - 令牌桶限流，网络错误、429及5xx按指数退避重试，其他4xx不重试
+    - 模板引用的字段在记录中不存在时，该记录不请求，输出错误结果
+    """
+    def __init__(self, api_base: str, model: str, api_key: str = None, api: str = 'chat',
+                 prompt_template: str = None, question_key: str = None, answer_key: str = None,
+                 max_score: float = 10, threshold: float = 0.6,
+                 batch_size: int = 16, prompts_per_request: int = 8, max_workers: int = 4,
+                 rate: float = 0, cache_file: str = None, retries: int = 3, timeout: int = 60,
+                 temperature: float = 0, max_tokens: int = 512):
+        """
+        :param api_base 接口地址 如`http://localhost:8000/v1`
+        :param model 模型名称
+        :param api_key 接口密钥（可选）
+        :param api 接口类型 `chat`（/chat/completions 每次请求一个prompt）或`completions`（/completions 支持批量prompt）
+        :param prompt_template 评测提示模板 `{dialogue}`为对话内容占位符，也可引用记录中的字段
+        :param max_score 打分满分 结果value归一化到[0,1]
+        :param threshold 归一化得分低于此阈值认为质量不合格
+        :param batch_size 缓存多少条记录后统一并发请求
+        :param prompts_per_request completions接口每次请求携带的prompt数量
+        :param max_workers 并发请求数（同时也是连接池大小）
+        :param rate 每秒最大请求数 0表示不限流
+        :param cache_file 响应缓存文件（SQLite） 为空则不缓存
+        """
+        super().__init__()
+        assert api in ('chat', 'completions'), "api must be `chat` or `completions`"
+        self.api_base = api_base.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.api = api
+        self.prompt_template = prompt_template or DEFAULT_TEMPLATE
+        self.question_key = question_key
+        self.answer_key = answer_key
+        self.max_score = max_score
+        self.threshold = threshold
+        self.batch_size = max(batch_size, 1)
+        self.prompts_per_request = max(prompts_per_request, 1) if api == 'completions' else 1
+        self.max_workers = max_workers
+        self.rate = rate
+        self.cache_file = cache_file
+        self.retries = retries
+        self.timeout = timeout
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+        self.buffer = []
+        self.session = None
+        self.executor = None
+        self.limiter = None
+        self.cache = None
+
+    def on_start(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if self.api_key:
+            self.session.headers['Authorization'] = f'Bearer {self.api_key}'
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        if self.rate > 0:
+            self.limiter = TokenBucket(self.rate)
+        if self.cache_file:
+            self.cache = DiskCache(self.cache_file, table='llm_judge')
+
+    def on_complete(self):
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+        if self.session:
+            self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def build_prompt(self, data: Any) -> str:
+        if isinstance(data, dict):
+            dialogue = build_dialogue(data, self.question_key, self.answer_key)
+            return self.prompt_template.format(dialogue=dialogue, **{k: v for k, v in data.items() if k != 'dialogue'})
+        return self.prompt_template.format(dialogue=str(data))
+
+    def cache_key(self, prompt: str) -> str:
+        # 请求中的生成参数都需要计入 参数变化后不会命中旧的输出
+        return content_hash(self.api_base, self.model, self.api, self.temperature, self.max_tokens, prompt)
+
+    def _post(self, path: str, payload: dict) -> dict:
+        if self.limiter:
+            self.limiter.acquire()
+        resp = self.session.post(f'{self.api_base}{path}', json=payload, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def request(self, prompts: List[str]) -> List[str]:
+        """发送一次请求 返回与prompts一一对应的模型输出"""
+        if self.api == 'chat':
+            payload = {
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompts[0]}],
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens
+            }
+            res = retry(self._post, '/chat/completions', payload, retries=self.retries, retry_on=retryable)
+            return [res['choices'][0]['message']['content']]
+
+        payload = {
+            "model": self.model,
+            "prompt": prompts,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        res = retry(self._post, '/completions', payload, retries=self.retries, retry_on=retryable)
+        choices = sorted(res['choices'], key=lambda c: c.get('index', 0))
+        # 输出个数不一致时无法确定对应关系 整组按失败处理
+        if len(choices) != len(prompts):
+            raise ValueError(f'expected {len(prompts)} choices, got {len(choices)}')
+        return [c['text'] for c in choices]
+
+    def to_result(self, text: Optional[str], error: str = None) -> ModelRes:
+        """text为None时为错误结果 error为原因"""
+        res = ModelRes()
+        res.name = self.name
+        if text is None:
+            res.error_status = True
+            res.reason = [error]
+            return res
+        m = SCORE_PATTERN.search(text)
+        if not m:
+            res.error_status = True
+            res.reason = ['no rating found in judgement', text]
+            return res
+        res.value = min(float(m.group(1)) / self.max_score, 1.0)
+        res.error_status = res.value < self.threshold
+        res.reason = [text]
+        return res
+
+    def evaluate(self, items: list) -> List[ModelRes]:
+        """对一批记录打分 先查缓存 未命中的prompt分组并发请求"""
+        outputs = [None] * len(items)
+        errors = [None] * len(items)
+        prompts = [None] * len(items)
+        keys = [None] * len(items)
+        for i, item in enumerate(items):
+            try:
+                prompts[i] = self.build_prompt(item)
+            except (KeyError, IndexError) as e:
+                errors[i] = f'missing template field: {e}'
+                continue
+            keys[i] = self.cache_key(prompts[i])
+
+        pending = []
+        for i, key in enumerate(keys):
+            if key is None:
+                continue
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                outputs[i] = cached
+            else:
+                pending.append(i)
+
+        groups = [pending[i:i + self.prompts_per_request] for i in range(0, len(pending), self.prompts_per_request)]
+        futures = [self.executor.submit(self.request, [prompts[i] for i in group]) for group in groups]
+        for group, future in zip(groups, futures):
+            try:
+                texts = future.result()
+            except Exception as e:
+                for i in group:
+                    errors[i] = f'request failed: {e}'
+                continue
+            for i, text in zip(group, texts):
+                outputs[i] = text
+                if self.cache is not None:
+                    self.cache.set(keys[i], text)
+
+        return [self.to_result(text, error) for text, error in zip(outputs, errors)]
+
+    def flush(self):
+        items, self.buffer = self.buffer, []
+        if not items:
+            return []
+        return self.evaluate(items)
+
+    def __process__(self, input_data, *args):
+        # 链式流程结束时会收到None 顶层节点会收到结束消息 均需要处理剩余缓存
+        if input_data is None or isinstance(input_data, Message) and input_data.msg_type == 'end':
+            for res in self.flush():
+                yield res
+            return
+        if isinstance(input_data, Message):
+            input_data = input_data.data
+
+        self.buffer.append(input_data)
+        if len(self.buffer) >= self.batch_size:
+            for res in self.flush():
+                yield res
+
+    def __str__(self):
+        return f"{self.name}(model='{self.model}', api='{self.api}', batch_size={self.batch_size})"
@@ -1,9 +1,17 @@
+import inspect
 from copy import deepcopy
 from typing import Any
 from quality_filter.util.dates import current_ts
+from quality_filter.util.jsons import compile_getter
 import uuid
 
 
+# 节点输出模式 在流程构造时确定一次 避免对每条数据判断返回值类型
+MODE_VALUE = 'value'  # 返回单个结果 None表示无输出
+MODE_YIELD = 'yield'  # 返回可迭代对象（通常为生成器） 逐个输出 其中的None会被忽略
+MODE_BATCH = 'batch'  # 返回结果列表 逐个输出 其中的None会被忽略
+
+
 class Message:
     """对消息进行封装，以便在更高一层处理"""
     def __init__(self, msg_type: str, data=None):
@@ -20,7 +28,11 @@ class Message:
 
 
 class JsonIterator:
-    """流程处理算子（不包括数据加载）的基础接口"""
+    """
+    流程处理算子（不包括数据加载）的基础接口
+    输出模式默认根据`__process__`/`on_data`是否为生成器函数推断（见`process_mode`），
+    如果节点以普通函数返回生成器或列表，需要通过类属性`process_mode`显式声明
+    """
     def _set(self, **kwargs):
         """设置组件参数，提供对象属性链式设置"""
         for k, w in kwargs.items():
@@ -64,6 +76,21 @@ class JsonIterator:
         return f"{self.name}"
 
 
+def process_mode(node) -> str:
+    """获取节点的输出模式：优先使用节点声明的`process_mode` 否则根据方法是否为生成器函数推断"""
+    mode = getattr(node, 'process_mode', None)
+    if mode:
+        return mode
+    if callable(node) and not hasattr(node, '__process__'):
+        # 普通函数
+        return MODE_YIELD if inspect.isgeneratorfunction(node) else MODE_VALUE
+    cls = type(node)
+    for method in ('__process__', 'on_data'):
+        if inspect.isgeneratorfunction(getattr(cls, method, None)):
+            return MODE_YIELD
+    return MODE_VALUE
+
+
 class ToDict(JsonIterator):
     """数据转换为字典"""
     def __init__(self, key: str = 'd'):
@@ -91,13 +118,14 @@ class DictProcessorBase(JsonIterator):
 
 class Repeat(JsonIterator):
     """重复发送某个数据多次（简单循环）"""
+    process_mode = MODE_BATCH
+
     def __init__(self, num_of_repeats: int):
         super().__init__()
         self.num_of_repeats = num_of_repeats
 
     def on_data(self, data, *args):
-        for i in range(self.num_of_repeats):
-            yield data
+        return [data] * self.num_of_repeats
 
     def __str__(self):
         return f'{self.name}[num_of_repeats={self.num_of_repeats}]'
@@ -194,9 +222,10 @@ class MinValue(DictProcessorBase):
         super().__init__()
         self.target_key = target_key
         self.source_keys = source_keys
+        self.getters = [compile_getter(k) for k in source_keys]
 
     def on_data(self, data: dict, *args):
-        vals = [data[k] for k in self.source_keys if data.get(k)]
+        vals = [v for v in (getter(data) for getter in self.getters) if v]
         data[self.target_key] = min(vals)
         return data
 
@@ -207,9 +236,10 @@ class MaxValue(DictProcessorBase):
         super().__init__()
         self.target_key = target_key
         self.source_keys = source_keys
+        self.getters = [compile_getter(k) for k in source_keys]
 
     def on_data(self, data: dict, *args):
-        vals = [data[k] for k in self.source_keys if data.get(k)]
+        vals = [v for v in (getter(data) for getter in self.getters) if v]
         data[self.target_key] = max(vals)
         return data
 
@@ -230,10 +260,43 @@ class Wait(JsonIterator):
 
 
 class WriteQueue(JsonIterator):
-    """写入队列"""
-    def __init__(self, queue):
-        self.queue = queue
+    """
+    写入有界队列（线程安全，也可以是跨进程队列），队列满时阻塞（反压）；流程结束时向队列发送结束消息`Message.end()`，
+    下游流程的QueueLoader收到后结束
+    """
+    def __init__(self, queue=None, timeout: float = None, maxsize: int = 1000, process: bool = False):
+        """
+        :param queue 队列对象、QueueLoader或命名队列的名称 为空时新建
+        :param timeout 队列满时的最长等待时间（秒） 超时抛出queue.Full，为空时一直等待
+        :param maxsize 新建队列的最大元素个数
+        :param process 新建队列是否跨进程（multiprocessing.Queue）
+        """
+        from quality_filter.util.queues import resolve_queue
+        if hasattr(queue, 'iter'):
+            # QueueLoader
+            queue = queue.queue
+        self.queue = resolve_queue(queue, maxsize, process)
+        self.timeout = timeout
+        self.ended = False
+
+    def on_start(self):
+        self.ended = False
+
+    def __process__(self, data: Any, *args):
+        if isinstance(data, Message) and data.msg_type == 'end':
+            self.send_end()
+            return None
+        return super().__process__(data, *args)
 
     def on_data(self, data: Any, *args):
-        self.queue.append(data)
+        self.queue.put(data, timeout=self.timeout)
         return data
+
+    def send_end(self):
+        """发送结束消息 只发送一次"""
+        if not self.ended:
+            self.ended = True
+            self.queue.put(Message.end(), timeout=self.timeout)
+
+    def on_complete(self):
+        self.send_end()
@@ -0,0 +1,141 @@
+import re
+import json
+from types import GeneratorType, FunctionType, MethodType, CodeType
+from typing import Any, Optional
+
+from quality_filter.iterator.base import JsonIterator, Message, process_mode
+from quality_filter.util.caches import open_cache, close_cache, content_hash
+
+
+# 对象默认repr中包含内存地址 不能用于计算配置哈希
+ADDRESS_PATTERN = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def config_of(node, seen: set = None) -> str:
+    """
+    提取节点的配置描述，用于计算配置哈希。节点可实现`cache_config()`自定义
+    默认取节点的公开属性（忽略以下划线开头的属性），子节点、函数等按`value_config`递归描述
+    """
+    if hasattr(node, 'cache_config'):
+        return str(node.cache_config())
+    seen = set() if seen is None else seen
+    seen.add(id(node))
+    items = []
+    for k, v in sorted(vars(node).items()):
+        if k.startswith('_'):
+            continue
+        r = value_config(v, seen)
+        if r is not None:
+            items.append(f'{k}={r}')
+    return ';'.join(items)
+
+
+def value_config(v, seen: set) -> Optional[str]:
+    """
+    属性值的配置描述：
+    - 子节点（JsonIterator）递归取其配置，列表/元组/字典逐个元素描述
+    - 函数（含lambda）取字节码、常量、引用的名称、默认参数及闭包变量，绑定方法另加所属对象的配置
+    - 其他对象取repr，repr中带内存地址的运行时对象（如线程池、连接）返回None（忽略）
+    """
+    if isinstance(v, (str, int, float, bool, type(None))):
+        return repr(v)
+    if id(v) in seen:
+        return '<cycle>'
+    if hasattr(v, 'cache_config') and not isinstance(v, type):
+        return f'{type(v).__qualname__}({v.cache_config()})'
+    if isinstance(v, JsonIterator):
+        return f'{type(v).__qualname__}({config_of(v, seen)})'
+    if isinstance(v, (list, tuple)):
+        return '[' + ','.join(str(value_config(one, seen)) for one in v) + ']'
+    if isinstance(v, dict):
+        return '{' + ','.join(f'{k!r}:{value_config(one, seen)}' for k, one in sorted(v.items(), key=repr)) + '}'
+    if isinstance(v, FunctionType):
+        seen.add(id(v))
+        cells = [value_config(c.cell_contents, seen) for c in v.__closure__ or ()]
+        return f'{v.__qualname__}:{code_config(v.__code__)}:{value_config(v.__defaults__, seen)}:{cells}'
+    if isinstance(v, MethodType):
+        return f'{value_config(v.__self__, seen)}.{value_config(v.__func__, seen)}'
+    r = repr(v)
+    if ADDRESS_PATTERN.search(r):
+        return None
+    return r
+
+
+def code_config(code: CodeType) -> str:
+    """字节码的稳定哈希（常量中的嵌套函数递归计算）"""
+    consts = [code_config(c) if isinstance(c, CodeType) else repr(c) for c in code.co_consts]
+    return content_hash(code.co_code, *consts, *code.co_names)
+
+
+def digest_of(data: Any) -> str:
+    """计算输入数据的内容哈希"""
+    try:
+        text = json.dumps(data, ensure_ascii=False, sort_keys=True, default=repr)
+    except (TypeError, ValueError):
+        text = repr(data)
+    return content_hash(text)
+
+
+class Cached(JsonIterator):
+    """
+    结果缓存节点（可选启用）：对包装节点（规则或普通处理节点）的处理结果进行本地磁盘缓存
+    缓存key为（节点类、配置哈希、输入内容哈希），输入与配置均未变化时直接返回缓存结果，
+    因此修改某个规则的参数后重新运行，只有该规则会重新计算。
+    【注意】只适用于无副作用的节点，Print、写文件等节点不应缓存
+    """
+    def __init__(self, node, cache_file: str, max_size: int = 0, commit_every: int = 100):
+        """
+        :param node 被缓存的节点（BaseRule或JsonIterator）
+        :param cache_file 缓存文件（SQLite） 多个节点可共用同一个文件，每个节点类对应一张表
+        :param max_size 最大缓存条目数 超出后按LRU淘汰 0表示不限制（同类节点共用一张表时以首个节点的设置为准）
+        :param commit_every 每多少次写操作提交一次
+        """
+        assert node, "node is None"
+        self.node = node
+        self.cache_file = cache_file
+        self.max_size = max_size
+        self.commit_every = commit_every
+        self.cache = None
+        self.prefix = None
+
+    @property
+    def process_mode(self):
+        """与被包装节点的输出模式一致"""
+        return process_mode(self.node)
+
+    def on_start(self):
+        # 配置可能在构造后通过_set修改 因此在启动时计算配置哈希
+        cls = self.node.__class__
+        self.prefix = content_hash(f'{cls.__module__}.{cls.__qualname__}', config_of(self.node))
+        self.cache = open_cache(self.cache_file, table=f'results_{cls.__name__}', max_size=self.max_size,
+                                commit_every=self.commit_every)
+        self.node.on_start()
+
+    def on_complete(self):
+        self.node.on_complete()
+        if self.cache is not None:
+            print(f'{self}: {self.cache.stats()}')
+            close_cache(self.cache)
+            self.cache = None
+
+    def __process__(self, data: Any, *args):
+        # 结束信号及特殊消息不缓存
+        if data is None or isinstance(data, Message) or self.cache is None:
+            return self.node.__process__(data, *args)
+
+        key = f'{self.prefix}:{digest_of(data)}'
+        hit = self.cache.get(key)
+        if hit is not None:
+            is_iter, res = hit
+        else:
+            res = self.node.__process__(data, *args)
+            is_iter = isinstance(res, GeneratorType)
+            if is_iter:
+                res = list(res)
+            self.cache.set(key, (is_iter, res))
+        if is_iter:
+            return (one for one in res)
+        return res
+
+    def __str__(self):
+        return f"{self.name}({self.node}, cache_file='{self.cache_file}')"
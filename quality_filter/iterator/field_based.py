@@ -1,10 +1,12 @@
 from quality_filter.iterator.base import JsonIterator, DictProcessorBase
-from quality_filter.util.jsons import extract, fill
+from quality_filter.util.jsons import compile_getter, compile_setter, compile_function, parse_path
+from quality_filter.util.kvindex import MmapKV
 
 
 class Select(DictProcessorBase):
     """
     Select操作 key支持嵌套，如`user.name`表示user字段下面的name字段 并将name作为结果字段名
+    支持数组下标及通配符，如`items[0].id`、`items[*].id`
     """
     def __init__(self, *keys, short_key: bool = False):
         assert len(keys) > 0, "必须指定一个或多个字段名称"
@@ -14,14 +16,18 @@ class Select(DictProcessorBase):
             self.keys = keys
         self.short_key = short_key
         self.path = {}
+        self.getters = []
         for key in self.keys:
             path = key.split('.')
+            getter = compile_getter(key)
             if short_key:
                 key = path[-1]
             self.path[key] = path
+            # 路径在初始化时编译为取值函数
+            self.getters.append((key, getter))
 
     def on_data(self, data: dict, *args):
-        return {key: extract(data, path) for key, path in self.path.items()}
+        return {key: getter(data) for key, getter in self.getters}
 
     def __str__(self):
         return f"{self.name}(keys={self.keys}, short_key={self.short_key})"
@@ -29,14 +35,15 @@ class Select(DictProcessorBase):
 
 class SelectVal(DictProcessorBase):
     """
-    字段值选择操作 指定字段key的值作为新的数据返回
+    字段值选择操作 指定字段key的值作为新的数据返回 key支持嵌套路径
     """
     def __init__(self, key: str, inherit_props: bool = False):
         self.key = key
         self.inherit_props = inherit_props
+        self.getter = compile_getter(key)
 
     def on_data(self, data: dict, *args):
-        keyval = data.get(self.key)
+        keyval = self.getter(data)
         if self.inherit_props:
             if isinstance(keyval, dict):
                 for k, v in data.items():
@@ -50,6 +57,47 @@ class SelectVal(DictProcessorBase):
         return f"{self.name}('{self.key}', inherit_props={self.inherit_props})"
 
 
+class KeepFields(DictProcessorBase):
+    """
+    原地投影：只保留指定的字段（支持嵌套，如`content.title`表示content字段下只保留title），其余字段直接删除
+    与Select不同，不创建新的记录、不改变字段结构，适合在流程前部尽早丢弃不需要的大字段，降低处理中记录的内存占用
+    """
+    def __init__(self, *keys):
+        assert len(keys) > 0, "必须指定一个或多个字段名称"
+        if isinstance(keys[0], list) or isinstance(keys[0], tuple):
+            keys = keys[0]
+        self.keys = list(keys)
+        # 字段树：叶子节点为None 表示保留整个字段
+        self.tree = {}
+        for key in self.keys:
+            tokens = parse_path(key)
+            assert all(isinstance(t, str) and t != '*' for t in tokens), f"KeepFields不支持下标或通配符: {key}"
+            node = self.tree
+            for t in tokens[:-1]:
+                if node.get(t, 0) is None:
+                    break
+                node = node.setdefault(t, {})
+            else:
+                node[tokens[-1]] = None
+
+    @staticmethod
+    def prune(data: dict, tree: dict):
+        for k in [k for k in data if k not in tree]:
+            del data[k]
+        for k, sub in tree.items():
+            if sub is not None and k in data:
+                val = data[k]
+                if isinstance(val, dict):
+                    KeepFields.prune(val, sub)
+
+    def on_data(self, data: dict, *args):
+        self.prune(data, self.tree)
+        return data
+
+    def __str__(self):
+        return f"{self.name}(keys={self.keys})"
+
+
 class RemoveFields(DictProcessorBase):
     """
     移除部分字段
@@ -61,9 +109,14 @@ class RemoveFields(DictProcessorBase):
         else:
             self.keys = [key]
         self.keys.extend(keys)
+        self.key_set = frozenset(self.keys)
 
     def on_data(self, data: dict, *args):
-        return {k: v for k, v in data.items() if k not in self.keys}
+        key_set = self.key_set
+        return {k: v for k, v in data.items() if k not in key_set}
+
+    def fuse_code(self, code) -> list:
+        return [f'data = {{k: v for k, v in data.items() if k not in {code.const(frozenset(self.keys))}}}']
 
     def __str__(self):
         return f"{self.name}(keys={self.keys})"
@@ -109,6 +162,13 @@ class AddFields(DictEditBase):
                 data[k] = v
         return data
 
+    def fuse_code(self, code) -> list:
+        lines = []
+        for k, v in self.templates.items():
+            k = code.const(k)
+            lines += [f'if {k} not in data:', f'    data[{k}] = {code.const(v)}']
+        return lines
+
 
 class ReplaceFields(DictEditBase):
     """替换字段 Upsert模式"""
@@ -120,6 +180,9 @@ class ReplaceFields(DictEditBase):
             data[k] = v
         return data
 
+    def fuse_code(self, code) -> list:
+        return [f'data[{code.const(k)}] = {code.const(v)}' for k, v in self.templates.items()]
+
 
 class RenameFields(DictEditBase):
     """对字段重命名 如果目标字段存在则会被覆盖"""
@@ -132,6 +195,13 @@ class RenameFields(DictEditBase):
                 data[t] = data.pop(s)
         return data
 
+    def fuse_code(self, code) -> list:
+        lines = []
+        for s, t in self.templates.items():
+            s = code.const(s)
+            lines += [f'if {s} in data:', f'    data[{code.const(t)}] = data.pop({s})']
+        return lines
+
 
 class MergeFields(DictEditBase):
     """合并字段，如果某字段不存在或值为空，使用指定字段进行填充"""
@@ -143,6 +213,13 @@ class MergeFields(DictEditBase):
             data[t] = data.get(t) or data.get(s)
         return data
 
+    def fuse_code(self, code) -> list:
+        lines = []
+        for s, t in self.templates.items():
+            t = code.const(t)
+            lines.append(f'data[{t}] = data.get({t}) or data.get({code.const(s)})')
+        return lines
+
 
 class CopyFields(DictEditBase):
     """复制已有的字段 如果目标字段名存在 则覆盖"""
@@ -154,23 +231,122 @@ class CopyFields(DictEditBase):
             data[t] = data.get(s)
         return data
 
+    def fuse_code(self, code) -> list:
+        return [f'data[{code.const(t)}] = data.get({code.const(s)})' for s, t in self.templates.items()]
+
+
+_MISSING = object()
+
+
+class FieldCode:
+    """字段操作融合的代码生成上下文：字面量直接写入代码，其他常量通过生成函数的全局变量引用"""
+    def __init__(self):
+        self.env = {}
+
+    def const(self, val) -> str:
+        if val is None or type(val) in (str, int, bool):
+            return repr(val)
+        name = f'c{len(self.env)}'
+        self.env[name] = val
+        return name
+
+
+def is_fusible(node) -> bool:
+    """节点类自身实现了fuse_code（子类可能重写on_data 因此不沿用父类的实现）"""
+    return 'fuse_code' in type(node).__dict__
+
+
+class FusedFields(DictProcessorBase):
+    """
+    融合的字段操作节点：将连续的AddFields/ReplaceFields/RenameFields/MergeFields/CopyFields/RemoveFields
+    生成为一个处理函数，每条记录只做一次类型检查和一次函数调用，由Chain在构造时自动创建
+    """
+    def __init__(self, *nodes):
+        assert all(is_fusible(node) for node in nodes), "存在不支持融合的节点"
+        self.nodes = list(nodes)
+        self.func = None
+        self.compile()
+
+    def compile(self):
+        code = FieldCode()
+        body = []
+        for node in self.nodes:
+            body.extend(node.fuse_code(code))
+        body.append('return data')
+        self.func = compile_function('fused_fields', 'data', body, code.env)
+
+    def on_start(self):
+        for node in self.nodes:
+            node.on_start()
+        # 节点配置可能在构造后被修改 启动时重新生成
+        self.compile()
+
+    def on_complete(self):
+        for node in self.nodes[::-1]:
+            node.on_complete()
+
+    def __process__(self, data, *args):
+        if isinstance(data, dict):
+            return self.func(data)
+        return super().__process__(data, *args)
+
+    def on_data(self, data: dict, *args):
+        return self.func(data)
+
+    def __str__(self):
+        nodes = [str(node) for node in self.nodes]
+        return f'{self.name}(nodes={nodes})'
+
+
+def fuse_field_nodes(nodes: list) -> list:
+    """将连续的可融合字段操作节点（至少两个）替换为FusedFields"""
+    res = []
+    run = []
+    for node in list(nodes) + [None]:
+        if node is not None and is_fusible(node):
+            run.append(node)
+            continue
+        if len(run) > 1:
+            res.append(FusedFields(*run))
+        else:
+            res.extend(run)
+        run = []
+        if node is not None:
+            res.append(node)
+    return res
+
 
 class InjectField(DictProcessorBase):
     """
     基于给定的KV缓存对当前数据进行填充
+    kv可以是dict、`util.kvindex.MmapKV`等支持get的映射，或者索引文件路径（由`MmapKV.build`或`from_csv/from_json(index_file=...)`构建）
     """
-    def __init__(self, kv: dict, inject_path: str or list, reference_path: str = None):
+    def __init__(self, kv: dict or str, inject_path: str or list, reference_path: str = None):
+        if isinstance(kv, str):
+            kv = MmapKV(kv)
         assert kv, "kv should not be empty"
         assert inject_path, "inject_path should not be empty"
         self.kv = kv
         self.inject_path = inject_path
         self.reference_path = reference_path or inject_path
+        self.getter = compile_getter(self.reference_path)
+        self.setter = compile_setter(self.inject_path)
+
+    def on_start(self):
+        if isinstance(self.kv, MmapKV):
+            self.kv.open()
+
+    def on_complete(self):
+        # 释放内存映射和文件句柄
+        if isinstance(self.kv, MmapKV):
+            self.kv.close()
 
     def on_data(self, item: dict, *args):
-        match_val = extract(item, self.reference_path)
-        if match_val and match_val in self.kv:
-            val = self.kv[match_val]
-            fill(item, self.inject_path, val)
+        match_val = self.getter(item)
+        if match_val:
+            val = self.kv.get(match_val, _MISSING)
+            if val is not _MISSING:
+                self.setter(item, val)
         return item
 
 
@@ -183,9 +359,10 @@ class ConcatFields(DictProcessorBase):
         self.separator = separator if separator is not None else '_'
         self.prefix = prefix
         self.suffix = suffix
+        self.getters = [compile_getter(k) for k in source_keys]
 
     def on_data(self, data: dict, *args):
-        vals = [str(data.get(k)) for k in self.source_keys]
+        vals = [str(getter(data)) for getter in self.getters]
         data[self.target_key] = f'{self.prefix}{self.separator.join(vals)}{self.suffix}'
         return data
 
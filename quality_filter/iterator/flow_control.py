@@ -1,16 +1,77 @@
 import traceback
-from types import GeneratorType
 from typing import Any
-import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
-from quality_filter.iterator.base import JsonIterator, Message
-from quality_filter.util.dicts import copy_val
+from quality_filter.iterator.base import JsonIterator, Message, process_mode, MODE_VALUE, MODE_BATCH
+from quality_filter.iterator.field_based import fuse_field_nodes
+from quality_filter.util.dicts import copy_val, cow
+from quality_filter.util.filters import FilterExpr
 from quality_filter.util.mod_util import load_cls
 
 
+class Filter(JsonIterator):
+    """
+    过滤节点：满足条件的数据继续传递，否则丢弃
+    条件可以是过滤表达式（见`util.filters.FilterExpr`）、字段精确匹配（关键字参数）、matcher函数或key字段真值判断，
+    如`Filter("lang == 'zh' and len(text) > 100")`、`Filter(lang='zh', source='web')`
+    位于流程最前端的表达式过滤会在运行时下推到支持的加载器（如JsonLine、CSV），在解析前跳过不匹配的数据
+    """
+    def __init__(self, expr: str = None, matcher=None, key: str = None, **equals):
+        """
+        :param expr 过滤表达式
+        :param matcher 判断函数或函数的完整限定名
+        :param key 字段名 字段值为真时通过
+        :param equals 字段精确匹配条件 与expr同时指定时需同时满足
+        """
+        assert expr or matcher or key or equals, "expr, matcher, key and equals all None"
+        if equals:
+            conds = ' and '.join(f'f({k!r}) == {v!r}' for k, v in equals.items())
+            expr = f'({expr}) and {conds}' if expr else conds
+        self.expr = FilterExpr(expr) if expr else None
+        if matcher is None:
+            matcher = self.expr or (lambda r: r.get(key))
+        elif isinstance(matcher, str):
+            matcher = load_cls(matcher)[0]
+        if self.expr and matcher is not self.expr:
+            expr_matcher, func = self.expr, matcher
+            matcher = lambda r: expr_matcher(r) and func(r)
+        self.matcher = matcher
+        self.key = key
+        # 表达式已下推到加载器时 本节点直接放行
+        self.pushed = False
+
+    def push_down(self, loader) -> bool:
+        """尝试将过滤表达式下推到加载器 仅当条件完全由表达式构成时可下推"""
+        if self.expr is None or self.matcher is not self.expr:
+            return False
+        self.pushed = loader.push_filter(self.expr)
+        return self.pushed
+
+    def __process__(self, data: Any, *args):
+        if data is None or isinstance(data, Message):
+            return None
+        if self.pushed or self.matcher(data):
+            return data
+        return None
+
+    def __str__(self):
+        if self.expr is not None:
+            return f'{self.name}("{self.expr}")'
+        return f'{self.name}(key={self.key})'
+
+
+def collect(res, mode: str):
+    """统一节点输出：单值模式原样返回，迭代模式收集为列表（去掉None）"""
+    if mode == MODE_VALUE or res is None:
+        return res
+    return [one for one in res if one is not None]
+
+
 class If(JsonIterator):
-    """流程选择节点，指定条件满足时执行"""
+    """
+    流程选择节点，指定条件满足时执行node，否则数据原样传递
+    不使用生成器：node为单值输出时本节点也是单值输出，否则以列表形式批量输出
+    """
     def __init__(self, node: JsonIterator, matcher=None, key: str = None):
         assert node, "node is None"
         assert matcher or key, "matcher and key both None"
@@ -20,30 +81,28 @@ class If(JsonIterator):
             matcher = load_cls(matcher)[0]
         self.matcher = matcher
         self.node = node
+        self.node_mode = process_mode(node)
+
+    @property
+    def process_mode(self):
+        return MODE_VALUE if self.node_mode == MODE_VALUE else MODE_BATCH
+
+    def on_start(self):
+        self.node.on_start()
+
+    def on_complete(self):
+        self.node.on_complete()
 
     def __process__(self, data: Any, *args):
-        if data is None:
-            return None
-        if isinstance(data, Message):
-            if data.msg_type == 'end':
-                res = self.node.__process__(data)
-                if isinstance(res, GeneratorType):
-                    for one in res:
-                        if one is not None:
-                            yield one
-                return None
+        if data is None or isinstance(data, Message):
+            if data is None or data.msg_type == 'end':
+                # 结束信号传递给内部节点 以便输出其缓存的数据
+                return collect(self.node.__process__(data), self.node_mode)
             data = data.data
 
         if not self.matcher(data):
-            return data
-
-        res = self.node.__process__(data)
-        if isinstance(res, GeneratorType):
-            for one in res:
-                if one is not None:
-                    yield one
-        else:
-            return res
+            return data if self.node_mode == MODE_VALUE else (data,)
+        return collect(self.node.__process__(data), self.node_mode)
 
 
 class IfElse(JsonIterator):
@@ -58,73 +117,93 @@ class IfElse(JsonIterator):
         self.matcher = matcher
         self.node_a = node_a
         self.node_b = node_b
+        self.mode_a = process_mode(node_a)
+        self.mode_b = process_mode(node_b)
+        # 两个分支均为单值输出时本节点为单值输出
+        self.is_value = self.mode_a == MODE_VALUE and self.mode_b == MODE_VALUE
+
+    @property
+    def process_mode(self):
+        return MODE_VALUE if self.is_value else MODE_BATCH
+
+    def on_start(self):
+        self.node_a.on_start()
+        self.node_b.on_start()
+
+    def on_complete(self):
+        self.node_b.on_complete()
+        self.node_a.on_complete()
+
+    def _batch(self, res, mode: str) -> list:
+        if mode == MODE_VALUE:
+            return [] if res is None else [res]
+        return collect(res, mode) or []
 
     def __process__(self, data: Any, *args):
-        if data is None:
-            return None
-        if isinstance(data, Message):
-            if data.msg_type == 'end':
-                self.node_a.__process__(data)
-                self.node_b.__process__(data)
-                return None
+        if data is None or isinstance(data, Message):
+            if data is None or data.msg_type == 'end':
+                res_a = self.node_a.__process__(data)
+                res_b = self.node_b.__process__(data)
+                if self.is_value:
+                    return res_a if res_a is not None else res_b
+                return self._batch(res_a, self.mode_a) + self._batch(res_b, self.mode_b)
             data = data.data
+
         if self.matcher(data):
             res = self.node_a.__process__(data)
+            mode = self.mode_a
         else:
             res = self.node_b.__process__(data)
-
-        if isinstance(res, GeneratorType):
-            for one in res:
-                if one is not None:
-                    yield one
+            mode = self.mode_b
+        if self.is_value:
+            return res
+        return self._batch(res, mode)
 
 
 class While(If):
-    """循环节点，重复执行某个节点，直到条件不满足"""
+    """
+    循环节点，重复执行某个节点，直到条件不满足（或达到最大迭代次数）
+    node为单值输出时逐条循环，不构造中间队列；否则按轮次处理，已不满足条件的数据直接输出
+    """
     def __init__(self, node: JsonIterator, matcher=None, key: str = None, max_iterations: int = -1):
         super().__init__(node, matcher=matcher, key=key)
         self.max_iterations = max_iterations
 
     def __process__(self, data: Any, *args):
-        if data is None:
-            return None
-        if isinstance(data, Message):
-            if data.msg_type == 'end':
-                res = self.node.__process__(data)
-                if isinstance(res, GeneratorType):
-                    for one in res:
-                        if one is not None:
-                            yield one
-                    return
-                else:
-                    return res
+        if data is None or isinstance(data, Message):
+            if data is None or data.msg_type == 'end':
+                return collect(self.node.__process__(data), self.node_mode)
             data = data.data
 
+        node = self.node
+        matcher = self.matcher
+        max_iterations = self.max_iterations
         ith = 0
+        if self.node_mode == MODE_VALUE:
+            while data and matcher(data):
+                data = node.__process__(data)
+                ith += 1
+                if 0 < max_iterations <= ith:
+                    break
+            return data
+
+        done = []
         queue = [data]
         while queue:
             new_queue = []
-            unfinished = False
             for one in queue:
-                if one and self.matcher(one):
-                    unfinished = True
-                    res = self.node.__process__(one)
-                    if isinstance(res, GeneratorType):
-                        for one2 in res:
-                            if one2 is not None:
-                                new_queue.append(one2)
-                    else:
-                        new_queue.append(res)
-            if not unfinished:
+                if one and matcher(one):
+                    res = node.__process__(one)
+                    if res is not None:
+                        new_queue.extend(one2 for one2 in res if one2 is not None)
+                elif one is not None:
+                    done.append(one)
+            queue = new_queue
+            ith += 1
+            if 0 < max_iterations <= ith:
+                done.extend(queue)
                 break
-            else:
-                queue = new_queue
-                ith += 1
-                if 0 < self.max_iterations <= ith:
-                    break
-
-        for one in queue:
-            yield one
+        return done
 
 
 class Multiple(JsonIterator):
@@ -134,10 +213,13 @@ class Multiple(JsonIterator):
         :param *nodes 处理算子
         """
         self.nodes = list(nodes)
+        # 各节点的输出模式 构造时确定
+        self.modes = [process_mode(node) for node in self.nodes]
 
     def add(self, iterator: JsonIterator):
         """添加节点"""
         self.nodes.append(iterator)
+        self.modes.append(process_mode(iterator))
         return self
 
     def on_start(self):
@@ -154,27 +236,44 @@ class Multiple(JsonIterator):
         # return f'{self.name}()'
 
 
+def copier_of(copy_data: bool, copy_mode: str):
+    """分支间数据隔离方式：cow为写时复制视图（非dict/list数据退化为深拷贝），deep为深拷贝"""
+    if not copy_data:
+        return None
+    assert copy_mode in ('cow', 'deep'), f"不支持的复制方式: {copy_mode}"
+    if copy_mode == 'deep':
+        return copy_val
+
+    def cow_or_copy(data):
+        if isinstance(data, (dict, list)):
+            return cow(data)
+        return copy_val(data)
+    return cow_or_copy
+
+
 class Fork(Multiple):
     """
     分叉节点（并行逻辑），各处理节点独立运行。
     Fork节点本身不产生输出，因此不能与其他节点串联
     """
-    def __init__(self, *nodes, copy_data: bool = False):
+    def __init__(self, *nodes, copy_data: bool = False, copy_mode: str = 'cow'):
         """
         :param *nodes 处理算子
         :param copy_data 是否复制数据，使得各个分支对数据修改互不干扰
+        :param copy_mode 复制方式 cow: 写时复制视图（默认，只复制分支实际修改的部分） deep: 深拷贝
         """
         super().__init__(*nodes)
         self.copy_data = copy_data
+        self.copy_mode = copy_mode
+        self.copier = copier_of(copy_data, copy_mode)
 
     def __process__(self, data: Any, *args):
-        for node in self.nodes:
-            _data = data
-            if self.copy_data:
-                _data = copy_val(_data)
+        copier = self.copier
+        for node, mode in zip(self.nodes, self.modes):
+            _data = copier(data) if copier else data
             res = node.__process__(_data, *args)
             # 注意：包含yield的函数调用仅返回迭代器，而不会执行函数
-            if isinstance(res, GeneratorType):
+            if mode != MODE_VALUE and res is not None:
                 for _ in res:
                     pass
 
@@ -182,14 +281,41 @@ class Fork(Multiple):
 class Chain(Multiple):
     """
     链式组合节点（串行逻辑），前一个的输出作为后一个的输入。
+    连续的字段操作节点（AddFields/RenameFields/CopyFields/RemoveFields等）默认融合为一个节点执行
     """
-    def __init__(self, *nodes):
+    def __init__(self, *nodes, fuse: bool = True):
+        """
+        :param *nodes 处理算子
+        :param fuse 是否融合连续的字段操作节点
+        """
+        if fuse:
+            nodes = fuse_field_nodes(nodes)
         super().__init__(*nodes)
 
     def walk(self, data: Any, break_when_empty: bool = True, end_msg: bool = False) -> list[Any]:
         """将前一个节点的输出作为下一个节点的输入，依次执行每个节点。返回最后一个节点的输出"""
+        nodes = self.nodes
+        modes = self.modes
+        start = 0
+        if break_when_empty and not end_msg:
+            # 快速路径：连续的单值输出节点逐个传递单条数据 无需构造中间队列
+            num = len(nodes)
+            while start < num and modes[start] == MODE_VALUE:
+                node = nodes[start]
+                try:
+                    data = node.__process__(data)
+                except Exception as e:
+                    print("ERROR! node: ", node, "data:", data)
+                    traceback.print_exc()
+                    raise e
+                if data is None:
+                    return []
+                start += 1
+
         queue = [data]
-        for node in self.nodes:
+        for i in range(start, len(nodes)):
+            node = nodes[i]
+            mode = modes[i]
             new_queue = []  # cache for next processor, though there's only one item for most time
             # iterate over the current cache
             for current in queue:
@@ -199,14 +325,15 @@ class Chain(Multiple):
                     print("ERROR! node: ", node, "data:", current)
                     traceback.print_exc()
                     raise e
+                if res is None:
+                    continue
                 # 注意：包含yield的函数调用仅返回迭代器，而不会执行函数
-                if isinstance(res, GeneratorType):
+                if mode == MODE_VALUE:
+                    new_queue.append(res)
+                else:
                     for one in res:
                         if one is not None:
                             new_queue.append(one)
-                else:
-                    if res is not None:
-                        new_queue.append(res)
 
             # empty, check if break the chain
             if not new_queue and break_when_empty:
@@ -248,58 +375,78 @@ class Chain(Multiple):
 class Aggregate(JsonIterator):
     """
     聚合节点，将多个处理方法的结果汇总到一个数组中，保持结果顺序与节点添加顺序一致。
-    每个处理方法可以是独立的节点或函数，它们会并行处理输入数据，
+    每个处理方法可以是独立的节点或函数，默认依次处理输入数据；指定`max_workers`（大于1）时在线程池中并行处理，
+    适合IO密集的处理方法（如调用模型接口），此时各处理方法需要线程安全，修改数据时应设置`copy_data=True`。
     最终将所有结果按节点添加顺序收集到一个列表中输出。
     """
-    def __init__(self, *processors, copy_data: bool = False, max_workers: int = None):
+    def __init__(self, *processors, copy_data: bool = False, copy_mode: str = 'cow', max_workers: int = None):
         """
         :param processors: 处理方法或节点，可以是 JsonIterator 实例或可调用对象
         :param copy_data: 是否复制数据，使得各个处理方法对数据修改互不干扰
-        :param max_workers: 并行处理的最大工作线程数
+        :param copy_mode: 复制方式 cow: 写时复制视图（默认） deep: 深拷贝
+        :param max_workers: 并行处理的最大工作线程数 为空或不大于1时依次处理
         """
         self.processors = list(processors)
         self.copy_data = copy_data
+        self.copy_mode = copy_mode
+        self.copier = copier_of(copy_data, copy_mode)
         self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = None
+        # 各处理器的类型（节点或函数）及输出模式 构造时确定
+        self.modes = [self.mode_of(processor) for processor in self.processors]
+
+    @staticmethod
+    def mode_of(processor):
+        if hasattr(processor, '__process__'):
+            return True, process_mode(processor)
+        if callable(processor):
+            return False, MODE_VALUE
+        return None, None
 
     def add(self, processor):
         """添加处理方法或节点"""
         self.processors.append(processor)
+        self.modes.append(self.mode_of(processor))
         return self
 
     def on_start(self):
         """初始化所有子节点"""
-        for processor in self.processors:
-            if hasattr(processor, 'on_start'):
+        for processor, (is_node, _) in zip(self.processors, self.modes):
+            if is_node:
                 processor.on_start()
+        if self.max_workers and self.max_workers > 1 and len(self.processors) > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
 
     def on_complete(self):
         """完成所有子节点的处理"""
-        for processor in reversed(self.processors):
-            if hasattr(processor, 'on_complete'):
+        for processor, (is_node, _) in zip(self.processors[::-1], self.modes[::-1]):
+            if is_node:
                 processor.on_complete()
-        self.executor.shutdown()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
 
-    async def _process_processor(self, index, processor, data, args):
-        """异步处理单个处理器，并返回结果和索引"""
+    def _process_processor(self, processor, is_node, mode, data, args, results: list) -> list:
+        """执行单个处理器，结果追加到results中并返回results"""
+        _data = self.copier(data) if self.copier else data
         try:
-            _data = copy_val(data) if self.copy_data else data
-            if hasattr(processor, '__process__'):
+            if is_node:
                 # 处理 JsonIterator 类型的处理器
                 res = processor.__process__(_data, *args)
-                if isinstance(res, GeneratorType):
-                    return index, list(res)
-                else:
-                    return index, [res] if res is not None else []
-            elif callable(processor):
+            elif is_node is not None:
                 # 处理普通可调用对象（函数）
                 res = processor(_data)
-                return index, [res] if res is not None else []
             else:
-                return index, []
+                return results
         except Exception as e:
             print(f"ERROR! processor: {processor}, data: {_data}")
             raise e
+        if mode == MODE_VALUE:
+            if res is not None:
+                results.append(res)
+        elif res is not None:
+            results.extend(res)
+        return results
 
     def __process__(self, data: Any, *args):
         """处理数据并聚合所有结果到一个数组中，保持顺序"""
@@ -311,36 +458,31 @@ class Aggregate(JsonIterator):
             if data.msg_type == 'end':
                 # 处理结束消息，顺序执行所有处理器
                 results = []
-                for processor in self.processors:
-                    if hasattr(processor, '__process__'):
+                for processor, (is_node, mode) in zip(self.processors, self.modes):
+                    if is_node:
                         res = processor.__process__(data)
-                        if isinstance(res, GeneratorType):
-                            results.extend(list(res))
+                        if mode != MODE_VALUE:
+                            if res is not None:
+                                results.extend(res)
                         elif res is not None:
                             results.append(res)
                 yield results
                 return
             data = data.data
 
-        # 并行处理普通数据，收集所有处理器的结果
-        loop = asyncio.get_event_loop()
-        tasks = [
-            self._process_processor(i, processor, data, args)
-            for i, processor in enumerate(self.processors)
-        ]
-        
-        # 执行所有任务并等待完成
-        results = loop.run_until_complete(asyncio.gather(*tasks))
-        
-        # 按索引排序结果
-        sorted_results = [res for _, res in sorted(results, key=lambda x: x[0])]
-        
-        # 展平结果列表
-        flattened_results = []
-        for sublist in sorted_results:
-            flattened_results.extend(sublist)
-        
-        yield flattened_results
+        results = []
+        if self.executor is not None:
+            # 并行处理 各处理器的结果分别收集 再按节点添加顺序合并
+            futures = [self.executor.submit(self._process_processor, processor, is_node, mode, data, args, [])
+                       for processor, (is_node, mode) in zip(self.processors, self.modes)]
+            for future in futures:
+                results.extend(future.result())
+            yield results
+            return
+        # 按节点添加顺序依次处理，收集所有处理器的结果
+        for processor, (is_node, mode) in zip(self.processors, self.modes):
+            self._process_processor(processor, is_node, mode, data, args, results)
+        yield results
 
 
 # class Aggregate(JsonIterator):
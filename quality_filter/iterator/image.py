@@ -0,0 +1,352 @@
+import os
+from collections import OrderedDict
+from itertools import repeat
+from typing import Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from quality_filter.iterator.base import Message
+from quality_filter.iterator.rule import BaseRule, ModelRes
+from quality_filter.util.caches import open_cache, close_cache, content_hash
+from quality_filter.util.images import analyze_image, file_stamp, HEADER_METRICS, _pil
+from quality_filter.util.jsons import compile_getter
+from quality_filter.util.hamming import HashIndex
+
+
+class ImageRule(BaseRule):
+    """
+    图片质量规则基类 记录中的图片路径字段（默认`img`）指向本地图片文件，每条记录输出一个ModelRes
+    - 记录先缓存为批，批内去重后在进程池中解码图片并计算指标（见`util.images.analyze_image`），只需要宽高时不解码像素
+    - 解码时按`max_side`降采样，节省内存和计算
+    - 可选磁盘缓存：key为（文件路径、修改时间、大小、max_side），文件修改后自动失效；
+      不同规则共用同一个缓存文件时，已计算的指标会被复用
+    子类声明`metrics`并实现`judge`
+    """
+    metrics = frozenset()
+
+    def __init__(self, key: str = 'img', base_dir: str = None, batch_size: int = 64, max_workers: int = None,
+                 max_side: int = 1024, cache_file: str = None):
+        """
+        :param key 图片路径字段 支持嵌套路径；输入数据为字符串时直接作为路径
+        :param base_dir 相对路径的根目录
+        :param batch_size 缓存多少条记录后统一处理
+        :param max_workers 进程数 默认为CPU核数 0表示在当前进程中处理
+        :param max_side 解码后图片的最大边长
+        :param cache_file 指标缓存文件（SQLite） 为空则不缓存
+        """
+        super().__init__()
+        self.key = key
+        self.getter = compile_getter(key)
+        self.base_dir = base_dir
+        self.batch_size = max(batch_size, 1)
+        self.max_workers = max_workers
+        self.max_side = max_side
+        self.cache_file = cache_file
+        self.buffer = []
+        self.executor = None
+        self.workers = 0
+        self.cache = None
+
+    def on_start(self):
+        # 尽早检查依赖 避免在子进程中才报错
+        _pil()
+        if 'qr' in self.metrics:
+            try:
+                import cv2
+            except ImportError:
+                raise ImportError("QR code detection requires opencv, please install it: pip install opencv-python")
+        if self.max_workers != 0:
+            # 与ProcessPoolExecutor的默认值一致
+            self.workers = self.max_workers or os.cpu_count() or 1
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        if self.cache_file:
+            self.cache = open_cache(self.cache_file, table='image_metrics')
+
+    def on_complete(self):
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+        if self.cache is not None:
+            close_cache(self.cache)
+            self.cache = None
+
+    def image_path(self, data: Any) -> str or None:
+        path = data if isinstance(data, str) else self.getter(data)
+        if not path or not isinstance(path, str):
+            return None
+        if self.base_dir and not os.path.isabs(path):
+            path = os.path.join(self.base_dir, path)
+        return path
+
+    def _analyze(self, paths: list, metrics: list) -> list:
+        if not paths:
+            return []
+        if self.executor is None:
+            return list(map(analyze_image, paths, metrics, repeat(self.max_side)))
+        chunksize = max(1, len(paths) // (self.workers * 4))
+        return list(self.executor.map(analyze_image, paths, metrics, repeat(self.max_side), chunksize=chunksize))
+
+    def measure(self, paths: List[str]) -> List[dict]:
+        """计算一批图片的指标 同一路径只处理一次 先查缓存"""
+        needed = self.metrics | HEADER_METRICS
+        found = {}
+        keys = {}
+        todo = []
+        todo_metrics = []
+        for path in dict.fromkeys(p for p in paths if p):
+            stamp = file_stamp(path)
+            if stamp is None:
+                found[path] = {'error': 'file not found'}
+                continue
+            cached = None
+            if self.cache is not None:
+                keys[path] = content_hash(os.path.abspath(path), *stamp, self.max_side)
+                cached = self.cache.get(keys[path])
+            if cached is not None and (needed <= cached.keys() or 'error' in cached):
+                found[path] = cached
+                continue
+            found[path] = cached or {}
+            todo.append(path)
+            todo_metrics.append(needed - found[path].keys())
+
+        for path, res in zip(todo, self._analyze(todo, todo_metrics)):
+            if 'error' not in res:
+                res = {**found[path], **res}
+            found[path] = res
+            if self.cache is not None:
+                self.cache.set(keys[path], res)
+        return [found.get(p) for p in paths]
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        raise NotImplementedError()
+
+    def result(self, m: dict or None, path: str or None):
+        if m is None or 'error' in m:
+            res = ModelRes()
+            res.name = self.name
+            res.error_status = True
+            res.reason = [f'invalid image: {path}' if m is None else f"{m['error']}: {path}"]
+            return res
+        return self.judge(m, path)
+
+    def evaluate(self, items: list) -> list:
+        paths = [self.image_path(item) for item in items]
+        return [self.result(m, path) for m, path in zip(self.measure(paths), paths)]
+
+    def flush(self):
+        items, self.buffer = self.buffer, []
+        if not items:
+            return []
+        return self.evaluate(items)
+
+    def __process__(self, input_data, *args):
+        # 链式流程结束时会收到None 顶层节点会收到结束消息 均需要处理剩余缓存
+        if input_data is None or isinstance(input_data, Message) and input_data.msg_type == 'end':
+            for res in self.flush():
+                yield res
+            return
+        if isinstance(input_data, Message):
+            input_data = input_data.data
+
+        self.buffer.append(input_data)
+        if len(self.buffer) >= self.batch_size:
+            for res in self.flush():
+                yield res
+
+    def __str__(self):
+        return f"{self.name}(key='{self.key}', batch_size={self.batch_size})"
+
+
+def _res(name: str, value, error: bool, reason: str) -> ModelRes:
+    res = ModelRes()
+    res.name = name
+    res.value = value
+    res.error_status = error
+    res.reason = [reason]
+    return res
+
+
+class ImageResolution(ImageRule):
+    """图片分辨率检查：宽或高小于下限时不合格 value为短边长度 只读取图片头部"""
+    metrics = HEADER_METRICS
+
+    def __init__(self, min_width: int = 256, min_height: int = 256, **kwargs):
+        super().__init__(**kwargs)
+        self.min_width = min_width
+        self.min_height = min_height
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        w, h = m['width'], m['height']
+        return _res(self.name, min(w, h), w < self.min_width or h < self.min_height, f'resolution: {w}x{h}')
+
+
+class ImageAspectRatio(ImageRule):
+    """图片宽高比检查：长边/短边超过上限时不合格 value为宽高比 只读取图片头部"""
+    metrics = HEADER_METRICS
+
+    def __init__(self, max_ratio: float = 3.0, **kwargs):
+        super().__init__(**kwargs)
+        self.max_ratio = max_ratio
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        w, h = m['width'], m['height']
+        ratio = max(w, h) / max(min(w, h), 1)
+        return _res(self.name, round(ratio, 4), ratio > self.max_ratio, f'aspect ratio: {w}x{h}')
+
+
+class ImageBlur(ImageRule):
+    """图片模糊检查：拉普拉斯方差（在max_side降采样后的灰度图上计算）低于阈值时不合格 value为方差"""
+    metrics = frozenset(('blur',))
+
+    def __init__(self, threshold: float = 100.0, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        blur = m['blur']
+        return _res(self.name, round(blur, 4), blur < self.threshold, f'laplacian variance: {blur:.2f}')
+
+
+class ImagePHash(ImageRule):
+    """
+    图片感知哈希 reason中为16进制哈希值；与本次运行中之前的记录哈希相同（同一图片、内容重复或近似，如缩放、转码）时不合格，
+    此时value为0（汉明距离，与ImageDedup一致），否则为None
+    :param hash_type phash（DCT感知哈希）或dhash（差异哈希）
+    """
+    def __init__(self, hash_type: str = 'phash', **kwargs):
+        assert hash_type in ('phash', 'dhash'), "hash_type must be `phash` or `dhash`"
+        super().__init__(**kwargs)
+        self.hash_type = hash_type
+        self.metrics = frozenset((hash_type,))
+        self.seen = {}
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        h = m[self.hash_type]
+        dup = h in self.seen
+        first = self.seen.setdefault(h, path)
+        if dup:
+            return _res(self.name, 0, True, f'duplicate of: {first} ({self.hash_type}: {h:016x})')
+        return _res(self.name, None, False, f'{self.hash_type}: {h:016x}')
+
+
+class ImageQRCode(ImageRule):
+    """二维码检测：图片中包含二维码时不合格 value为是否包含二维码（需要安装opencv）"""
+    metrics = frozenset(('qr',))
+
+    def judge(self, m: dict, path: str) -> ModelRes:
+        qr = m['qr']
+        return _res(self.name, qr is not None, qr is not None, 'no QR code' if qr is None else f'QR code: {qr}')
+
+
+class ImageQuality(ImageRule):
+    """
+    组合多个图片规则 每张图片只解码一次 同时计算所有规则需要的指标，每条记录输出规则名到ModelRes的字典
+    例如：`ImageQuality(ImageResolution(min_width=512), ImageBlur(threshold=50), ImageQRCode(), key='img')`
+    各子规则只使用其判断参数 图片路径、批大小、进程数、缓存等以本节点为准
+    """
+    def __init__(self, *rules: ImageRule, **kwargs):
+        assert rules, "at least one image rule is required"
+        super().__init__(**kwargs)
+        self.rules = list(rules)
+        self.metrics = frozenset().union(*(rule.metrics for rule in rules))
+
+    def judge(self, m: dict, path: str) -> dict:
+        return {rule.name: rule.judge(m, path) for rule in self.rules}
+
+    def result(self, m: dict or None, path: str or None):
+        if m is None or 'error' in m:
+            return {rule.name: ImageRule.result(rule, m, path) for rule in self.rules}
+        return self.judge(m, path)
+
+    def __str__(self):
+        return f"{self.name}({', '.join(str(rule.name) for rule in self.rules)}, key='{self.key}')"
+
+
+class ImageDedup(ImageRule):
+    """
+    图片近似去重：计算记录引用图片的感知哈希，在持久化的哈希索引（`util.hamming.HashIndex`）中查找
+    汉明距离不超过`max_distance`且更早加入索引的图片，找到时不合格（value为最近的距离，reason为重复的图片）；
+    同一图片在本次运行中被多条记录引用时，之后的记录同样不合格（reason为首次引用的记录序号，从0开始），
+    引用记录只保留最近的`max_referenced`个路径，内存占用有上限。
+    索引保存在`index_file`中，重复运行或处理增量数据时，未修改的文件直接使用已保存的哈希，只需解码新文件；
+    近邻检索基于多索引哈希，不需要与全部图片比较
+    """
+    def __init__(self, hash_type: str = 'phash', max_distance: int = 4, index_file: str = None,
+                 max_referenced: int = 1000000, **kwargs):
+        """
+        :param hash_type phash（DCT感知哈希）或dhash（差异哈希）
+        :param max_distance 认为是近似重复的最大汉明距离（64位哈希） 0表示只判断哈希相同
+        :param index_file 哈希索引文件（SQLite） 为空时只在内存中
+        :param max_referenced 记录已引用路径的最大数量 超出时淘汰最久未引用的路径
+        其他参数见ImageRule
+        """
+        assert hash_type in ('phash', 'dhash'), "hash_type must be `phash` or `dhash`"
+        super().__init__(**kwargs)
+        self.hash_type = hash_type
+        self.metrics = frozenset((hash_type,))
+        self.max_distance = max_distance
+        self.index_file = index_file
+        self.index = None
+        self.max_referenced = max_referenced
+        # 路径 -> 首次引用该路径的记录序号
+        self.referenced = OrderedDict()
+        self.records = 0
+
+    def on_start(self):
+        super().on_start()
+        self.index = HashIndex(self.index_file, table=self.hash_type, max_distance=self.max_distance)
+
+    def on_complete(self):
+        super().on_complete()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def evaluate(self, items: list) -> list:
+        paths = [self.image_path(item) for item in items]
+        paths = [os.path.abspath(p) if p else None for p in paths]
+        unique = list(dict.fromkeys(p for p in paths if p))
+        known = self.index.lookup(unique)
+        # 路径 -> (id, 哈希) 或错误信息
+        entries = {}
+        todo = []
+        stamps = {}
+        for path in unique:
+            stamp = file_stamp(path)
+            if stamp is None:
+                entries[path] = {'error': 'file not found'}
+                continue
+            row = known.get(path)
+            if row is not None and row[1] == stamp:
+                entries[path] = row[0], row[2]
+            else:
+                todo.append(path)
+                stamps[path] = stamp
+        # 新文件按记录顺序加入索引
+        for path, m in zip(todo, self._analyze(todo, [self.metrics] * len(todo))):
+            if 'error' in m:
+                entries[path] = m
+            else:
+                h = m[self.hash_type]
+                entries[path] = self.index.add(path, stamps[path], h), h
+        return [self.check(entries.get(path), path) for path in paths]
+
+    def check(self, entry, path: Optional[str]) -> ModelRes:
+        record = self.records
+        self.records += 1
+        if entry is None or isinstance(entry, dict):
+            return self.result(entry, path)
+        id_, h = entry
+        first = self.referenced.get(path)
+        if first is not None:
+            self.referenced.move_to_end(path)
+            return _res(self.name, 0, True, f'same image as record #{first}: {path}')
+        self.referenced[path] = record
+        if len(self.referenced) > self.max_referenced:
+            self.referenced.popitem(last=False)
+        for d, other in self.index.search(h):
+            if other < id_:
+                return _res(self.name, d, True, f'near duplicate of: {self.index.path_of(other)} (distance {d})')
+        return _res(self.name, None, False, f'{self.hash_type}: {h:016x}')
+
+    def __str__(self):
+        return f"{self.name}(hash_type='{self.hash_type}', max_distance={self.max_distance}, key='{self.key}')"
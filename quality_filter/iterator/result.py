@@ -0,0 +1,70 @@
+class ModelRes:
+    """
+    规则输出结果 基于__slots__的轻量实现，字段及默认值与原pydantic模型一致，但构造时不做校验
+    需要pydantic对象时通过`to_pydantic()`转换，需要字典时通过`to_dict()`/`model_dump()`转换
+    """
+    __slots__ = ('error_status', 'type', 'name', 'value', 'reason')
+
+    def __init__(self, error_status: bool = False, type: str = 'QUALITY_GOOD', name: str = 'Data',
+                 value: float = None, reason: list = None):
+        self.error_status = error_status
+        self.type = type
+        self.name = name
+        self.value = value
+        self.reason = [] if reason is None else reason
+
+    def to_dict(self) -> dict:
+        return {
+            "error_status": self.error_status,
+            "type": self.type,
+            "name": self.name,
+            "value": self.value,
+            "reason": list(self.reason)
+        }
+
+    # 兼容pydantic v2的接口
+    model_dump = to_dict
+
+    @staticmethod
+    def from_dict(d: dict):
+        return ModelRes(**d)
+
+    model_validate = from_dict
+
+    def to_pydantic(self):
+        """转换为pydantic模型对象 用于需要校验或序列化schema的报告场景"""
+        return pydantic_model()(**self.to_dict())
+
+    def __eq__(self, other):
+        if not isinstance(other, ModelRes):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __str__(self):
+        return (f"error_status={self.error_status} type='{self.type}' name='{self.name}' "
+                f"value={self.value} reason={list(self.reason)}")
+
+    def __repr__(self):
+        return (f"ModelRes(error_status={self.error_status}, type='{self.type}', name='{self.name}', "
+                f"value={self.value}, reason={list(self.reason)})")
+
+
+_pydantic_model = None
+
+
+def pydantic_model():
+    """原ModelRes的pydantic定义 按需创建"""
+    global _pydantic_model
+    if _pydantic_model is None:
+        from typing import List, Optional
+        from pydantic import BaseModel
+
+        class ModelResModel(BaseModel):
+            error_status: bool = False
+            type: str = 'QUALITY_GOOD'
+            name: str = 'Data'
+            value: Optional[float] = None
+            reason: List[str] = []
+
+        _pydantic_model = ModelResModel
+    return _pydantic_model
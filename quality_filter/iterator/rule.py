@@ -1,5 +1,5 @@
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
 import re
 from collections import defaultdict
@@ -9,6 +9,14 @@ from typing import Callable, List, Set, Tuple
 import string
 import zhon.hanzi
 import unicodedata
+import numpy as np
+from quality_filter.iterator.base import JsonIterator
+from quality_filter.iterator.result import ModelRes
+from quality_filter.util import texts
+from quality_filter.util.segment import get_segmenter
+from quality_filter.util.sketches import HyperLogLog, TopK, LengthHistogram
+from quality_filter.util.jsons import compile_getter
+from quality_filter.util.dates import DateParser
 TRANSLATION_TABLE_PUNCTUATION_EN = str.maketrans('', '', string.punctuation)
 TRANSLATION_TABLE_PUNCTUATION_ZH = str.maketrans('', '', zhon.hanzi.punctuation)
 
@@ -18,38 +26,21 @@ class DynamicRuleConfig(BaseModel):
     key_list: Optional[List[str]] = None
     refer_path: Optional[List[str]] = None
     
-class ModelRes(BaseModel):
-    error_status: bool = False
-    type: str = 'QUALITY_GOOD'
-    name: str = 'Data'
-    value: Optional[float] = None
-    reason: List[str] = []  
-    
-class BaseRule:
+
+class BaseRule(JsonIterator):
+    """
+    规则基类 遵循JsonIterator协议 子类实现`on_data`
+    结果约定：返回一个ModelRes，或指标名到ModelRes的字典（如列检查类规则）
+    """
     # metric_type: str  # This will be set by the decorator
     # group: List[str]  # This will be set by the decorator
     # dynamic_config:  DynamicRuleConfig
     def __init__(self):
         pass
 
-    def __process__(self, input_data) -> ModelRes:
-        raise NotImplementedError()   
-    
-    def on_start(self):
-        """处理数据前，主要用于一些数据处理的准备工作，不应该用于具体数据处理"""
-        pass
+    def on_data(self, input_data, *args) -> Union[ModelRes, Dict[str, ModelRes]]:
+        raise NotImplementedError()
 
-    def on_complete(self):
-        """结束处理。主要用于数据处理结束后的清理工作，不应该用于具体数据处理"""
-        pass
-    
-    @property
-    def name(self):
-        return self.__class__.__name__
-
-    def __str__(self):
-        return f"{self.name}"
-    
     
 class Character(BaseRule):
     """check whether content has special characters. """
@@ -67,7 +58,7 @@ class Character(BaseRule):
         )
 
 
-    def __process__(self, input_data) -> ModelRes:
+    def on_data(self, input_data, *args) -> ModelRes:
         res = ModelRes()
         content = input_data[0]['data']
         if len(content) == 0:
@@ -103,21 +94,9 @@ def normalize(
         nfd_unicode: bool = True,
         white_space: bool = True
 ) -> str:
-    """Normalize the text by lowercasing and removing punctuation."""
-    # remove punctuation
-    if remove_punct:
-        text = text.translate(TRANSLATION_TABLE_PUNCTUATION_EN)
-        text = text.translate(TRANSLATION_TABLE_PUNCTUATION_ZH)
-    # lowercase
-    if lowercase:
-        text = text.lower()
-    if white_space:
-        text = text.strip()
-        text = re.sub(r'\s+', ' ', text)
-    # NFD unicode normalization
-    if nfd_unicode:
-        text = unicodedata.normalize('NFD', text)
-    return text
+    """Normalize the text by lowercasing and removing punctuation. See `util.texts.normalize`."""
+    return texts.normalize(text, remove_punct=remove_punct, lowercase=lowercase, nfd_unicode=nfd_unicode,
+                           white_space=white_space)
 
 def split_paragraphs(
             text: str, normalizer: Callable[[str], str], remove_empty: bool = True
@@ -145,25 +124,24 @@ class EndWithTerminal(BaseRule):
         super().__init__()
         self.dynamic_config = DynamicRuleConfig(threshold=0.6, key_list=[".", "!", "?", "”", "\""])
 
-    def __process__(self, input_data) -> ModelRes:
+    def on_data(self, input_data, *args) -> ModelRes:
         res = ModelRes()
         raw_content = input_data[0]['data']
-        raw_lines: Tuple[TextSlice] = split_paragraphs(
-            text=raw_content, normalizer=lambda x: x, remove_empty=True
-        )
-        num_lines = len(raw_lines)
+        # 基于非空行的偏移索引统计 不切分出行字符串
+        index = texts.line_index(raw_content)
+        num_lines = len(index) // 2
         if num_lines == 0:
             return res
 
-        terminal_marks = [line.text.rstrip()[-1] for line in raw_lines if line.text and line.text.rstrip()[-1] not in self.dynamic_config.key_list]
-        num_occurrences = sum([line.text.rstrip().endswith(tuple(self.dynamic_config.key_list)) for line in raw_lines])
+        key_list = tuple(self.dynamic_config.key_list)
+        num_occurrences = texts.count_line_endings(raw_content, index, key_list)
         ratio = num_occurrences / num_lines
         res.value = ratio
         if ratio < self.dynamic_config.threshold:
             res.error_status = True
             #res.type = cls.metric_type
             res.name = self.__class__.__name__
-            res.reason = list(set(terminal_marks))
+            res.reason = list(texts.line_end_chars(raw_content, index, key_list))
         return res
 
 class EndWithEllipsis(BaseRule):
@@ -172,18 +150,15 @@ class EndWithEllipsis(BaseRule):
     def __init__(self):
         super().__init__()
         self.dynamic_config = DynamicRuleConfig(threshold=0.3, key_list=["...", "…"])
-    def __process__(self,input_data) -> ModelRes:
+    def on_data(self, input_data, *args) -> ModelRes:
         res = ModelRes()
         raw_content = input_data[0]['data']
-        raw_lines: Tuple[TextSlice] = split_paragraphs(
-            text=raw_content, normalizer=lambda x: x, remove_empty=True
-        )
-        num_lines = len(raw_lines)
+        index = texts.line_index(raw_content)
+        num_lines = len(index) // 2
         if num_lines == 0:
             return res
 
-        num_occurrences = sum(
-            [line.text.rstrip().endswith(tuple(self.dynamic_config.key_list)) for line in raw_lines])
+        num_occurrences = texts.count_line_endings(raw_content, index, tuple(self.dynamic_config.key_list))
         ratio = num_occurrences / num_lines
         res.value=ratio
         if ratio > self.dynamic_config.threshold:
@@ -196,15 +171,18 @@ class EndWithEllipsis(BaseRule):
 class SentenceNumber(BaseRule):
     """check whether the number of sentence in [3, 7500] """
 
-    def __init__(self):
+    def __init__(self, segmenter=None):
+        """
+        :param segmenter 分句分词组件（util.segment.Segmenter）或分词模式名 分句支持中英文句末标点
+        """
         super().__init__()
         self.dynamic_config = DynamicRuleConfig(key_list=['3', '7500'])
-        self.SENT_PATTERN = re.compile(r'\b[^.!?\n]+[.!?]*', flags=re.UNICODE)
+        self.segmenter = get_segmenter(segmenter)
 
-    def __process__(self, input_data) -> ModelRes:
+    def on_data(self, input_data, *args) -> ModelRes:
         res = ModelRes()
         raw_content = input_data[0]['data']
-        num_sentence = len(self.SENT_PATTERN.findall(raw_content))
+        num_sentence = self.segmenter.count_sentences(raw_content)
         res.value = num_sentence
         if num_sentence < int(self.dynamic_config.key_list[0]) or num_sentence > int(self.dynamic_config.key_list[1]):
             res.error_status = True
@@ -215,15 +193,18 @@ class SentenceNumber(BaseRule):
 
 class WordNumber(BaseRule):
     """check whether the number of word in [20, 100000] """
-    def __init__(self):
-        super.__init__()
+    def __init__(self, segmenter=None):
+        """
+        :param segmenter 分句分词组件（util.segment.Segmenter）或分词模式名（whitespace/char/bigram/dict） 默认bigram
+        """
+        super().__init__()
         self.dynamic_config = DynamicRuleConfig(key_list=['20', '100000'])
+        self.segmenter = get_segmenter(segmenter)
 
-    def __process__(self, input_data) -> ModelRes:
+    def on_data(self, input_data, *args) -> ModelRes:
         res = ModelRes()
-        normalized_content = normalize(input_data[0]['data'])
-        normalized_words = tuple(normalized_content.split())
-        num_normalized_words = len(normalized_words)
+        # 只需要词数 不构造规范化后的文本
+        num_normalized_words = self.segmenter.count_words(input_data[0]['data'])
         res.value = num_normalized_words
         if num_normalized_words >= int(self.dynamic_config.key_list[0]) and num_normalized_words < int(self.dynamic_config.key_list[1]):
             pass
@@ -238,13 +219,14 @@ class ValidateFormat(BaseRule):
     def __init__(self,pattern):
         super().__init__()
         self.pattern = pattern
-    def __process__(self,data) -> Dict[str, ModelRes]:
+        self.regex = re.compile(pattern)
+    def on_data(self, data, *args) -> Dict[str, ModelRes]:
         """
         通用格式校验函数，根据传入正则表达式校验数据格式有效性
         忽略 None 和空字符串。
         返回：无效行数，有效行数，总行数，无效比率
         """
-        regex = re.compile(self.pattern)
+        regex = self.regex
         valid_count = 0
         invalid_count = 0
         filtered_data = [x for x in data if x is not None and x.strip() != ""]
@@ -258,14 +240,10 @@ class ValidateFormat(BaseRule):
         total = len(filtered_data)
         invalid_ratio = invalid_count / total if total > 0 else 0.0
 
-        invalid_count_ = ModelRes()
-        invalid_count_.value = invalid_count
-        valid_count_=ModelRes()
-        valid_count_.value = valid_count
-        total_ = ModelRes()
-        total_.value = total
-        invalid_ratio_ = ModelRes()
-        invalid_ratio_.value = round(invalid_ratio, 4)
+        invalid_count_ = ModelRes(value=invalid_count)
+        valid_count_ = ModelRes(value=valid_count)
+        total_ = ModelRes(value=total)
+        invalid_ratio_ = ModelRes(value=round(invalid_ratio, 4))
         return {
             "invalid_count": invalid_count_,
             "valid_count": valid_count_,
@@ -314,10 +292,33 @@ class ValidateDate(ValidateFormat):
         super().__init__(self.pattern)
 
 
+class ValidateDateTime(BaseRule):
+    """
+    日期时间校验 输入输出与ValidateDate一致（忽略None和空字符串），但接受DateParser支持的全部格式
+    （ISO格式及`util.dates.possible_formats`，也可指定格式），整列通过`DateParser.parse_many`批量解析
+    """
+    def __init__(self, formats: list = None):
+        super().__init__()
+        self.formats = formats
+
+    def on_data(self, data, *args) -> Dict[str, ModelRes]:
+        filtered_data = [x.strip() for x in data if x is not None and x.strip() != ""]
+        parsed = DateParser(self.formats).parse_many(filtered_data)
+        invalid_count = int(np.isnat(parsed).sum())
+        total = len(filtered_data)
+        invalid_ratio = invalid_count / total if total > 0 else 0.0
+        return {
+            "invalid_count": ModelRes(value=invalid_count),
+            "valid_count": ModelRes(value=total - invalid_count),
+            "total": ModelRes(value=total),
+            "invalid_ratio": ModelRes(value=round(invalid_ratio, 4))
+        }
+
+
 class CheckNullValues(BaseRule):
     def __init__(self):
         super().__init__()
-    def __process__(self, input_data) -> Dict[str, ModelRes]:
+    def on_data(self, input_data, *args) -> Dict[str, ModelRes]:
     #check_null_values(data: Union[Dict, List], path: List[str]) -> Dict[Any, Any]:
         """
         检查空值：空字符串或None视为空值。
@@ -328,19 +329,16 @@ class CheckNullValues(BaseRule):
         null_count = sum(1 for x in data if x is None or x.strip() == "")
         null_ratio = null_count / total if total > 0 else 0.0
         #return null_count, total, round(null_ratio, 4)
-        null_count_ = ModelRes()
-        null_count_.value = null_count
-        total_ = ModelRes()
-        total_.value = total
-        null_ratio_ = ModelRes()
-        null_ratio_.value = round(null_ratio, 4)
+        null_count_ = ModelRes(value=null_count)
+        total_ = ModelRes(value=total)
+        null_ratio_ = ModelRes(value=round(null_ratio, 4))
         return {"null_count": null_count_,"total": total_,"null_ratio": null_ratio_}
 
 
 class CheckUniqueValues(BaseRule):
     def __init__(self):
         super().__init__()
-    def __process__(self, input_data) -> Dict[str, ModelRes]:
+    def on_data(self, input_data, *args) -> Dict[str, ModelRes]:
     #def check_unique_values(data: Union[Dict, List], ) -> Dict[Any, Any]:
         """
         检查唯一值，包含NULL（None/空字符串）作为唯一值计入。
@@ -356,12 +354,9 @@ class CheckUniqueValues(BaseRule):
         total = len(data)
         unique_ratio = unique_count / total if total > 0 else 0.0
         #return unique_count, total, round(unique_ratio, 4)
-        unique_count_ = ModelRes()
-        unique_count_.value = unique_count
-        total_ = ModelRes()
-        total_.value = total
-        unique_ratio_ = ModelRes()
-        unique_ratio_.value = round(unique_ratio, 4)
+        unique_count_ = ModelRes(value=unique_count)
+        total_ = ModelRes(value=total)
+        unique_ratio_ = ModelRes(value=round(unique_ratio, 4))
         return {
             "unique_count": unique_count_,
             "total": total_,
@@ -372,7 +367,7 @@ class CheckUniqueValues(BaseRule):
 class CheckDuplicateValues(BaseRule):
     def __init__(self):
         super().__init__()
-    def __process__(self, input_data) -> Dict[str, ModelRes]:
+    def on_data(self, input_data, *args) -> Dict[str, ModelRes]:
 #def check_duplicate_values(data: Union[Dict, List], path: List[str]) -> Dict[Any, Any]:
         """
         检查重复值行数（不含NULL），重复值率。
@@ -388,12 +383,9 @@ class CheckDuplicateValues(BaseRule):
         total = len(data)
         duplicate_ratio = duplicate_rows / total if total > 0 else 0.0
         #return duplicate_rows, total, round(duplicate_ratio, 4)
-        duplicate_count_ = ModelRes()
-        duplicate_count_.value = duplicate_rows
-        total_ = ModelRes()
-        total_.value = total
-        duplicate_ratio_ = ModelRes()
-        duplicate_ratio_.value = round(duplicate_ratio, 4)
+        duplicate_count_ = ModelRes(value=duplicate_rows)
+        total_ = ModelRes(value=total)
+        duplicate_ratio_ = ModelRes(value=round(duplicate_ratio, 4))
         return {
             "duplicate_rows": duplicate_count_,
             "total": total_,
@@ -402,6 +394,251 @@ class CheckDuplicateValues(BaseRule):
 
 
 
+# 列剖析中可按名称引用的格式校验
+FORMAT_VALIDATORS = {
+    'email': ValidateEmail,
+    'id_card': ValidateIDCard,
+    'ip': ValidateIPAddress,
+    'phone': ValidatePhone,
+    'postcode': ValidatePostcode,
+    'date': ValidateDate,
+}
+
+
+def format_regex(fmt: str):
+    """格式名（见FORMAT_VALIDATORS）或正则表达式"""
+    if fmt in FORMAT_VALIDATORS:
+        return FORMAT_VALIDATORS[fmt]().regex
+    return re.compile(fmt)
+
+
+class ColumnProfile:
+    """
+    单列的流式统计状态 一次遍历同时计算：
+    空值数（None/空白字符串，与CheckNullValues一致）、近似唯一值数（HyperLogLog）、
+    重复值行数与重复率（与CheckDuplicateValues一致）、最小/最大值（有数值时为数值，否则为字符串）、
+    字符串长度直方图、高频值（TopK）及格式校验命中率
+    每条数据只在预聚合字典中计数，不同值达到`BUFFER_SIZE`个时再按(值, 次数)批量更新各项统计，
+    重复值较多的列每个值只需计算一次长度、格式校验和哈希。
+    1、1.0、True相等且哈希相同，除字符串和整数外的值按(类型名, 值)计数，不同类型的值分别统计
+    状态可以pickle，并通过`merge`合并多个进程的统计结果
+    """
+    BUFFER_SIZE = 8192
+
+    def __init__(self, formats: dict = None, top_k: int = 10, precision: int = 14, exact_limit: int = 1 << 20):
+        """
+        :param formats 格式名到正则表达式的字典
+        :param top_k 输出的高频值个数
+        :param precision HyperLogLog精度
+        :param exact_limit 精确统计重复值行数时最多保存的不同值个数 超过后重复值行数和重复率为None
+        """
+        self.formats = formats or {}
+        self.total = 0
+        self.null_count = 0
+        self.distinct = HyperLogLog(precision)
+        self.top = TopK(top_k)
+        self.lengths = LengthHistogram()
+        self.format_hits = dict.fromkeys(self.formats, 0)
+        self.min = self.max = None
+        self.min_str = self.max_str = None
+        self.exact_limit = exact_limit
+        # 各非空值的精确出现次数 不同值超过exact_limit个后为None
+        self.counts = {}
+        self.pending = {}
+
+    def add(self, val):
+        pending = self.pending
+        cls = val.__class__
+        if cls is not str and cls is not int and val is not None:
+            val = (cls.__name__, val)
+        try:
+            pending[val] = pending.get(val, 0) + 1
+        except TypeError:
+            # dict/list等不可哈希的值按json字符串统计
+            val = (cls.__name__, json.dumps(val[1], ensure_ascii=False, sort_keys=True, default=str))
+            pending[val] = pending.get(val, 0) + 1
+        if len(pending) >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """将预聚合的计数合并到统计状态中"""
+        pending = self.pending
+        if not pending:
+            return
+        self.pending = {}
+        formats = self.formats
+        hits = self.format_hits
+        lengths = self.lengths
+        keys = []
+        for key, num in pending.items():
+            self.total += num
+            val = key[1] if key.__class__ is tuple else key
+            if val is None:
+                self.null_count += num
+                continue
+            if isinstance(val, str):
+                if not val or val.isspace():
+                    self.null_count += num
+                    continue
+                lengths.add(len(val), num)
+                if self.min_str is None or val < self.min_str:
+                    self.min_str = val
+                if self.max_str is None or val > self.max_str:
+                    self.max_str = val
+                if formats:
+                    text = val.strip()
+                    for name, regex in formats.items():
+                        if regex.fullmatch(text):
+                            hits[name] += num
+            elif isinstance(val, (int, float)) and not isinstance(val, bool):
+                if self.min is None or val < self.min:
+                    self.min = val
+                if self.max is None or val > self.max:
+                    self.max = val
+            keys.append(key)
+        self.distinct.update(keys)
+        self.top.update((key, pending[key]) for key in keys)
+        counts = self.counts
+        if counts is not None:
+            for key in keys:
+                counts[key] = counts.get(key, 0) + pending[key]
+            if len(counts) > self.exact_limit:
+                self.counts = None
+
+    def merge(self, other: 'ColumnProfile'):
+        self.flush()
+        other.flush()
+        self.total += other.total
+        self.null_count += other.null_count
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        self.lengths.merge(other.lengths)
+        if self.counts is not None and other.counts is not None:
+            counts = self.counts
+            for key, num in other.counts.items():
+                counts[key] = counts.get(key, 0) + num
+            if len(counts) > self.exact_limit:
+                self.counts = None
+        else:
+            self.counts = None
+        for name, num in other.format_hits.items():
+            self.format_hits[name] = self.format_hits.get(name, 0) + num
+        for attr, pick in (('min', min), ('max', max), ('min_str', min), ('max_str', max)):
+            val = getattr(other, attr)
+            if val is not None:
+                mine = getattr(self, attr)
+                setattr(self, attr, val if mine is None else pick(mine, val))
+        return self
+
+    def to_dict(self) -> dict:
+        self.flush()
+        total = self.total
+        non_null = total - self.null_count
+        # 近似值可能略大于非空行数
+        distinct = min(self.distinct.count(), non_null)
+        numeric = self.min is not None
+        if self.counts is None:
+            duplicate_rows = duplicate_ratio = None
+        else:
+            duplicate_rows = sum(num for num in self.counts.values() if num > 1)
+            duplicate_ratio = round(duplicate_rows / total, 4) if total else 0.0
+        return {
+            'total': total,
+            'null_count': self.null_count,
+            'null_ratio': round(self.null_count / total, 4) if total else 0.0,
+            'distinct': distinct,
+            # 值出现多于一次的非空行数（含首次出现）及其占总行数的比例
+            'duplicate_rows': duplicate_rows,
+            'duplicate_ratio': duplicate_ratio,
+            # 重复出现（第二次及以后）的非空行占比 由近似唯一值数计算
+            'repeat_ratio': round(1 - distinct / non_null, 4) if non_null else 0.0,
+            'min': self.min if numeric else self.min_str,
+            'max': self.max if numeric else self.max_str,
+            'length': self.lengths.to_dict(),
+            'top_k': [(key[1] if key.__class__ is tuple else key, num) for key, num in self.top.top()],
+            # 高频值计数的最大低估量
+            'top_k_error': self.top.error,
+            'formats': {name: round(num / non_null, 4) if non_null else 0.0
+                        for name, num in self.format_hits.items()},
+        }
+
+    def __getstate__(self):
+        self.flush()
+        return self.__dict__
+
+
+class ColumnProfiler(JsonIterator):
+    """
+    流式列剖析节点：逐条接收记录，一次遍历统计各配置列的空值率、近似唯一值数、重复率、最小/最大值、
+    长度直方图、高频值及格式校验命中率（统计方式见ColumnProfile），数据原样向后传递；
+    结束时（on_complete）输出剖析报告，报告同时保存在`report`属性中。
+    多进程处理时，各进程的节点可pickle后通过`merge`合并
+    """
+    def __init__(self, *columns, formats: dict = None, top_k: int = 10, precision: int = 14,
+                 exact_limit: int = 1 << 20, output_file: str = None):
+        """
+        :param columns 列名（字段路径，如`meta.lang`）
+        :param formats 列名到格式列表的字典 格式为FORMAT_VALIDATORS中的名称或正则表达式 如{'mail': ['email']}
+        :param top_k 每列输出的高频值个数
+        :param precision HyperLogLog精度 每列占用2^precision字节
+        :param exact_limit 每列精确统计重复值行数时最多保存的不同值个数 超过后该列的重复值行数和重复率为None
+        :param output_file 报告输出的json文件 为空时仅打印
+        """
+        super().__init__()
+        assert columns, "至少需要一个列名"
+        self.columns = list(columns)
+        self.formats = formats or {}
+        self.top_k = top_k
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.output_file = output_file
+        self.profiles = {col: ColumnProfile({fmt: format_regex(fmt) for fmt in self.formats.get(col, [])},
+                                            top_k=top_k, precision=precision, exact_limit=exact_limit)
+                         for col in self.columns}
+        self._init_getters()
+        self.report = None
+
+    def _init_getters(self):
+        self.pairs = [(compile_getter(col), self.profiles[col]) for col in self.columns]
+
+    def on_data(self, data, *args):
+        for getter, profile in self.pairs:
+            profile.add(getter(data))
+        return data
+
+    def merge(self, other: 'ColumnProfiler'):
+        """合并另一个节点（如其他进程）的统计状态"""
+        for col, profile in other.profiles.items():
+            if col in self.profiles:
+                self.profiles[col].merge(profile)
+        return self
+
+    def profile(self) -> dict:
+        return {col: self.profiles[col].to_dict() for col in self.columns}
+
+    def on_complete(self):
+        self.report = self.profile()
+        text = json.dumps(self.report, ensure_ascii=False, indent=2, default=str)
+        if self.output_file:
+            with open(self.output_file, 'w', encoding='utf8') as f:
+                f.write(text)
+        print(f'{self.name}:', text)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # 编译的取值函数不能pickle 恢复时重新编译
+        state.pop('pairs')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_getters()
+
+    def __str__(self):
+        return f"{self.name}(columns={self.columns})"
+
+
+
 
 # if __name__ == '__main__':
 #     data = csv_to_json('data.csv', 'data.json')
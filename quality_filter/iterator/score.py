@@ -1,8 +1,10 @@
 from typing import Any
+from quality_filter.iterator.base import JsonIterator
 
-class score:
+
+class score(JsonIterator):
     """
-    评分模块
+    评分模块 遵循JsonIterator协议 子类实现`on_data`
     """
 
     def __init__(self):
@@ -11,69 +13,131 @@ class score:
         """
         pass
 
-    def on_start(self):
-        """处理数据前，主要用于一些数据处理的准备工作，不应该用于具体数据处理"""
-        pass
 
-    def __process__(self):
-        pass
+# 指标标准化方法：标量版本与向量化版本
+NORMALIZERS = {
+    # 常规指标限制在[0,1]
+    'clip': (lambda v: max(0, min(v, 1)), lambda np, v: np.clip(v, 0, 1)),
+    # 延迟类指标逆向处理
+    'inverse': (lambda v: 1 / (1 + v / 1000), lambda np, v: 1 / (1 + v / 1000)),
+    'identity': (lambda v: v, lambda np, v: v)
+}
 
-    def on_complete(self):
-        """结束处理。主要用于数据处理结束后的清理工作，不应该用于具体数据处理"""
-        pass
-    
-    @property
-    def name(self):
-        return self.__class__.__name__
+STRATEGIES = ('weighted_sum', 'product', 'min_max')
 
-    def __str__(self):
-        return f"{self.name}"
+DEFAULT_WEIGHTS = {
+    "SpecialCharacter": 0.6,
+    "ending": 0.4
+}
+
+
+def metric_value(val) -> float:
+    """取规则结果的数值 支持ModelRes或数值 空值按0处理"""
+    val = getattr(val, 'value', val)
+    return 0.0 if val is None else val
 
 
 class Comprehensive(score):
-    def __init__(self):
+    """
+    综合评分：按照配置的指标、权重、标准化方法和合并策略计算百分制得分
+    配置在构造时校验一次，可在yaml中声明，如`Comprehensive(weights={'SpecialCharacter': 0.6, 'ending': 0.4}, strategy='product')`
+    输入支持三种形式：
+    1. 规则结果列表（如Aggregate的输出） 按weights中指标的顺序对应
+    2. 字典记录 从记录中按指标名取值（ModelRes或数值），得分写入target_key字段后返回记录
+    3. 批量输入（二维数组，每行为一条记录的各指标值） 通过NumPy一次计算整批得分
+    """
+    def __init__(self, weights: dict = None, normalizers: dict = None, strategy: str = 'weighted_sum',
+                 target_key: str = 'score'):
         """
-        初始化评分模块
+        :param weights 指标名到权重的映射 指标顺序即列表输入的位置顺序，权重和必须为1
+        :param normalizers 指标名到标准化方法（clip/inverse/identity）的映射 默认clip，`latency`默认inverse
+        :param strategy 合并策略 weighted_sum/product/min_max
+        :param target_key 字典记录输入时得分写入的字段
         """
-        pass
+        super().__init__()
+        weights = dict(weights or DEFAULT_WEIGHTS)
+        normalizers = dict(normalizers or {})
+        assert weights, "指标不能为空"
+        assert abs(sum(weights.values()) - 1.0) < 1e-6, "权重和不等于1"
+        assert strategy in STRATEGIES, f"不支持的合并策略: {strategy}"
+        unknown = set(normalizers) - set(weights)
+        assert not unknown, f"指标与权重不匹配: {unknown}"
+        for k in weights:
+            normalizers.setdefault(k, 'inverse' if k == 'latency' else 'clip')
+            assert normalizers[k] in NORMALIZERS, f"不支持的标准化方法: {normalizers[k]}"
+
+        self.weights = weights
+        self.normalizers = normalizers
+        self.strategy = strategy
+        self.target_key = target_key
+        self.metrics = list(weights)
+        self.weight_list = [weights[k] for k in self.metrics]
+        self.norm_funcs = [NORMALIZERS[normalizers[k]][0] for k in self.metrics]
+        self.norm_batch_funcs = [NORMALIZERS[normalizers[k]][1] for k in self.metrics]
+
+    def check_width(self, width: int):
+        """指标值个数必须与指标个数一致 否则zip截断或按列取值越界会得到错误的得分"""
+        if width != len(self.metrics):
+            raise ValueError(f"{self.name}: 指标值个数{width}与指标个数{len(self.metrics)}不一致 指标为{self.metrics}")
 
-    def __process__(self, input_data: Any):
+    def score(self, values: list) -> float:
+        """对单条记录的指标值（按metrics顺序）计算得分"""
+        self.check_width(len(values))
+        normalized = [f(metric_value(v)) for f, v in zip(self.norm_funcs, values)]
+        if self.strategy == 'weighted_sum':
+            res = sum(v * w for v, w in zip(normalized, self.weight_list))
+        elif self.strategy == 'product':
+            res = 1.0
+            for v, w in zip(normalized, self.weight_list):
+                res *= v ** w
+        else:
+            res = 0.5 * (min(normalized) + max(normalized))
+        # 结果后处理 输出百分制得分
+        return max(0, min(res * 100, 100))
+
+    def score_batch(self, rows) -> list:
+        """
+        批量计算得分
+        :param rows 二维数组（n条记录 x m个指标），元素为数值或ModelRes
+        """
+        import numpy as np
+        if isinstance(rows, np.ndarray):
+            values = rows.astype(np.float64)
+        else:
+            values = np.array([[metric_value(v) for v in row] for row in rows], dtype=np.float64)
+        if values.size == 0:
+            return []
+        if values.ndim != 2:
+            raise ValueError(f"{self.name}: 批量输入应为二维数组（n条记录 x m个指标）")
+        self.check_width(values.shape[1])
+        values = np.nan_to_num(values)
+        normalized = np.empty_like(values)
+        for j, f in enumerate(self.norm_batch_funcs):
+            normalized[:, j] = f(np, values[:, j])
+        weights = np.array(self.weight_list)
+        if self.strategy == 'weighted_sum':
+            res = normalized @ weights
+        elif self.strategy == 'product':
+            res = np.prod(normalized ** weights, axis=1)
+        else:
+            res = 0.5 * (normalized.min(axis=1) + normalized.max(axis=1))
+        return np.clip(res * 100, 0, 100).tolist()
+
+    def on_data(self, input_data: Any, *args):
         """
         计算综合得分
         :return: 综合得分
         """
+        if getattr(input_data, 'ndim', 0) == 2:
+            return self.score_batch(input_data)
         if not input_data:
             return
-        self.metrics_dict = {
-            "SpecialCharacter": input_data[0].value,
-            "ending": input_data[1].value
-        }
-        self.weights_dict = {
-            "SpecialCharacter": 0.6,
-            "ending": 0.4
-        }
-        self.strategy = "weighted_sum"
-        # 输入校验
-        assert set(self.metrics_dict.keys()) == set(self.weights_dict.keys()), "指标与权重不匹配"
-        assert abs(sum(self.weights_dict.values()) - 1.0) < 1e-6, "权重和不等于1"
-
-        # 数值标准化（示例：延迟类指标取倒数）
-        normalized = {}
-        for k, v in self.metrics_dict.items():
-            if k == 'latency':  # 延迟类指标逆向处理
-                normalized[k] = 1 / (1 + v / 1000)
-            else:
-                normalized[k] = max(0, min(v, 1))  # 常规指标限制在[0,1]
-
-        # 合并策略选择
-        if self.strategy == 'weighted_sum':
-            res = sum(normalized[k] * self.weights_dict[k] for k in self.metrics_dict)
-        elif self.strategy == 'product':
-            res = 1.0
-            for k in self.metrics_dict:
-                res *= (normalized[k] ** self.weights_dict[k])
-        elif self.strategy == 'min_max':
-            res = 0.5 * (min(normalized.values()) + max(normalized.values()))
+        if isinstance(input_data, dict):
+            input_data[self.target_key] = self.score([input_data.get(k) for k in self.metrics])
+            return input_data
+        if isinstance(input_data[0], (list, tuple)):
+            return self.score_batch(input_data)
+        return self.score(input_data)
 
-        # 结果后处理
-        return max(0, min(res * 100, 100))  # 输出百分制得分
+    def __str__(self):
+        return f"{self.name}(weights={self.weights}, strategy='{self.strategy}')"
@@ -0,0 +1,441 @@
+import os
+import csv
+import io
+import re
+import queue
+import threading
+from bisect import bisect_right
+from typing import Any
+
+from quality_filter.iterator.base import JsonIterator
+from quality_filter.util.jsons import compile_getter, dumps, dumps_bytes
+
+# 文件名中的分片序号占位符 如`out/part-{index:05d}.jsonl.gz`
+_INDEX_PATTERN = re.compile(r'\{index(:[^}]*)?\}')
+_COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+# 后台线程结束标记
+_STOP = object()
+
+
+def open_compressed(raw, compression: str = None, level: int = None):
+    """在二进制文件流上叠加压缩流 返回可写入bytes的流（关闭压缩流不会关闭raw）"""
+    if not compression:
+        return raw
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6 if level is None else level)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires zstandard, please install it: pip install zstandard")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(raw, closefd=False)
+    raise ValueError(f"unsupported compression: {compression}")
+
+
+class FileWriter(JsonIterator):
+    """
+    文件写入节点基类 数据原样向后传递
+    - 按批（batch_size）交给后台线程序列化和写入，队列有界（queue_size批），写入跟不上时阻塞处理流程
+    - 写入临时文件（`.tmp`后缀），分片写满或结束时重命名为最终文件名，写入出错时删除临时文件，不会留下写了一半的文件
+    - 按记录数（rotate_records）或文件大小（rotate_bytes，按批检查）切分文件，文件名中的`{index}`为分片序号，
+      未指定时在后缀前插入`-00000`
+    后台写入时数据在写入节点之后不应再被修改
+    子类实现`open_part`/`write_records`/`close_part`
+    """
+    def __init__(self, output_file: str, rotate_records: int = 0, rotate_bytes: int = 0, batch_size: int = 1000,
+                 background: bool = True, queue_size: int = 16):
+        """
+        :param output_file 输出文件 目录不存在时自动创建
+        :param rotate_records 每个文件的最大记录数 0表示不限制
+        :param rotate_bytes 每个文件的最大字节数（写入磁盘的大小） 0表示不限制
+        :param batch_size 每批记录数
+        :param background 是否在后台线程中序列化和写入
+        :param queue_size 后台队列最多缓存的批数
+        """
+        self.output_file = output_file
+        self.rotate_records = rotate_records
+        self.rotate_bytes = rotate_bytes
+        self.batch_size = max(batch_size, 1)
+        self.background = background
+        self.queue_size = queue_size
+        self.rotating = rotate_records > 0 or rotate_bytes > 0
+        self.batch = []
+        self.queue = None
+        self.thread = None
+        self.error = None
+        self.index = 0
+        self.part_file = None
+        self.part_records = 0
+        self.files = []
+        self.records = 0
+
+    def on_start(self):
+        self.index = 0
+        self.files = []
+        self.records = 0
+        self.error = None
+        if self.background:
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            self.thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+            self.thread.start()
+
+    def on_data(self, data: Any, *args):
+        self.batch.append(data)
+        if len(self.batch) >= self.batch_size:
+            self._submit()
+        return data
+
+    def on_complete(self):
+        if self.batch:
+            self._submit()
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            # 出错后的分片不完整 删除临时文件而不重命名
+            self._abort_part()
+            self._check()
+        self._finish_part()
+        print(f"{self}: {self.records} records -> {len(self.files)} files")
+
+    def _submit(self):
+        batch, self.batch = self.batch, []
+        if self.thread is None:
+            try:
+                self._write(batch)
+            except Exception:
+                self._abort_part()
+                raise
+            return
+        self._check()
+        self.queue.put(batch)
+
+    def _check(self):
+        """后台线程出错时在处理流程中抛出"""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.error = e
+
+    def _write(self, batch: list):
+        pos = 0
+        while pos < len(batch):
+            if self.part_file is None:
+                self._open_part()
+            end = len(batch)
+            if self.rotate_records:
+                end = min(end, pos + self.rotate_records - self.part_records)
+            self.write_records(batch[pos:end])
+            self.part_records += end - pos
+            self.records += end - pos
+            pos = end
+            if (self.rotate_records and self.part_records >= self.rotate_records) or \
+                    (self.rotate_bytes and self.part_size() >= self.rotate_bytes):
+                self._finish_part()
+
+    def part_path(self, index: int) -> str:
+        """第index个分片的文件名"""
+        if _INDEX_PATTERN.search(self.output_file):
+            return self.output_file.format(index=index)
+        if not self.rotating:
+            return self.output_file
+        folder, name = os.path.split(self.output_file)
+        # 在第一个后缀前插入序号 如a.jsonl.gz -> a-00000.jsonl.gz
+        stem, dot, suffix = name.partition('.')
+        return os.path.join(folder, f'{stem}-{index:05d}{dot}{suffix}')
+
+    def _open_part(self):
+        self.part_file = self.part_path(self.index)
+        os.makedirs(os.path.dirname(os.path.abspath(self.part_file)), exist_ok=True)
+        self.part_records = 0
+        self.open_part(self.part_file + '.tmp')
+
+    def _finish_part(self):
+        if self.part_file is None:
+            return
+        self.close_part()
+        tmp = self.part_file + '.tmp'
+        # 写入第一批数据时出错的分片可能没有生成文件
+        if os.path.exists(tmp):
+            os.replace(tmp, self.part_file)
+            self.files.append(self.part_file)
+        self.part_file = None
+        self.index += 1
+
+    def _abort_part(self):
+        """关闭并删除未写完的分片"""
+        if self.part_file is None:
+            return
+        tmp = self.part_file + '.tmp'
+        self.part_file = None
+        try:
+            self.close_part()
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def open_part(self, path: str):
+        raise NotImplementedError
+
+    def write_records(self, records: list):
+        raise NotImplementedError
+
+    def part_size(self) -> int:
+        """当前分片已写入的字节数"""
+        return 0
+
+    def close_part(self):
+        raise NotImplementedError
+
+    def __str__(self):
+        return f"{self.name}('{self.output_file}')"
+
+
+class StreamWriter(FileWriter):
+    """基于字节流的文本格式写入 带写缓冲，按文件名后缀（.gz/.zst）或compression参数压缩"""
+    def __init__(self, output_file: str, compression: str = None, level: int = None, buffer_size: int = 1 << 20,
+                 **kwargs):
+        """
+        :param compression 压缩格式 gzip/zstd 默认根据文件名后缀判断
+        :param level 压缩级别
+        :param buffer_size 写缓冲大小（字节）
+        """
+        super().__init__(output_file, **kwargs)
+        if compression is None:
+            compression = _COMPRESSIONS.get(os.path.splitext(output_file)[1])
+        self.compression = compression
+        self.level = level
+        self.buffer_size = buffer_size
+        self.raw = None
+        self.stream = None
+
+    def open_part(self, path: str):
+        self.raw = open(path, 'wb', buffering=self.buffer_size)
+        self.stream = open_compressed(self.raw, self.compression, self.level)
+
+    def part_size(self) -> int:
+        return self.raw.tell()
+
+    def close_part(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+        self.stream = self.raw = None
+
+
+class JsonLineWriter(StreamWriter):
+    """
+    JSON行文件写入 每条记录一行
+    序列化与`util.jsons.dumps`一致（日期时间转为字符串等），安装了orjson时使用orjson
+    """
+    def write_records(self, records: list):
+        self.stream.write(b'\n'.join(map(dumps_bytes, records)) + b'\n')
+
+
+class CSVWriter(StreamWriter):
+    """
+    CSV文件写入 每个文件带表头
+    列可以是嵌套字段路径，未指定时使用第一条记录的字段；非标量的值序列化为JSON，字段不存在时为空
+    """
+    def __init__(self, output_file: str, *columns, sep: str = ',', header: bool = True, encoding: str = 'utf8',
+                 **kwargs):
+        super().__init__(output_file, **kwargs)
+        self.columns = list(columns)
+        self.getters = [compile_getter(c) for c in self.columns]
+        self.sep = sep
+        self.header = header
+        self.encoding = encoding
+        self.header_pending = header
+
+    def open_part(self, path: str):
+        super().open_part(path)
+        self.header_pending = self.header
+
+    def write_records(self, records: list):
+        if not self.columns:
+            first = records[0]
+            self.columns = list(first.keys()) if isinstance(first, dict) else [str(i) for i in range(len(first))]
+            self.getters = [compile_getter(c) for c in self.columns] if isinstance(first, dict) else None
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter=self.sep)
+        if self.header_pending:
+            writer.writerow(self.columns)
+            self.header_pending = False
+        getters = self.getters
+        for record in records:
+            row = record if getters is None else [getter(record) for getter in getters]
+            writer.writerow(['' if v is None else dumps(v) if isinstance(v, (dict, list)) else v for v in row])
+        self.stream.write(buf.getvalue().encode(self.encoding))
+
+
+class ParquetWriter(FileWriter):
+    """
+    Parquet列式文件写入 每批记录转换为一个Arrow表写入（行组大小不超过batch_size）
+    列类型由第一批数据推断；压缩在Parquet内部按列进行（compression参数），需要安装pyarrow
+    """
+    def __init__(self, output_file: str, *columns, compression: str = 'zstd', schema=None, **kwargs):
+        """
+        :param columns 输出的列 未指定时使用全部字段
+        :param compression Parquet列压缩格式 如zstd、snappy、gzip、none
+        :param schema pyarrow.Schema 未指定时由第一批数据推断
+        """
+        super().__init__(output_file, **kwargs)
+        self.columns = list(columns)
+        self.getters = [compile_getter(c) for c in self.columns]
+        self.compression = compression
+        self.schema = schema
+        self.writer = None
+        self.path = None
+
+    def _pa(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetWriter requires pyarrow, please install it: pip install pyarrow")
+        return pyarrow
+
+    def open_part(self, path: str):
+        self.path = path
+
+    def write_records(self, records: list):
+        pa = self._pa()
+        if self.columns:
+            data = {c: [getter(r) for r in records] for c, getter in zip(self.columns, self.getters)}
+            table = pa.table(data, schema=self.schema)
+        else:
+            table = pa.Table.from_pylist(records, schema=self.schema)
+        if self.schema is None:
+            self.schema = table.schema
+        if self.writer is None:
+            self.writer = pa.parquet.ParquetWriter(self.path, self.schema, compression=self.compression)
+        self.writer.write_table(table)
+
+    def part_size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+WRITERS = {'jsonl': JsonLineWriter, 'csv': CSVWriter, 'parquet': ParquetWriter}
+
+
+class BucketWriter(JsonIterator):
+    """
+    按质量分桶写入：根据得分字段（如Comprehensive的score）或规则结果（ModelRes.error_status）将记录写入不同的文件，
+    一次遍历同时得到合格、待定、不合格等数据集；每个桶一个写入节点（各自的后台线程并行写入），数据原样向后传递
+    - 数值得分按阈值分桶：thresholds=(60, 80)、names=('bad', 'borderline', 'good')表示<60、[60, 80)、>=80
+    - 规则结果或布尔值按error_status分桶：出错为第一个桶 否则为最后一个桶
+    - 得分缺失或无法识别的记录写入`unscored`桶
+    结束时输出各桶的记录数、字节数及得分直方图
+    """
+    def __init__(self, output_file: str, key: str = 'score', thresholds: list = (60, 80),
+                 names: list = ('bad', 'borderline', 'good'), writer: str = 'jsonl', bins: int = 10,
+                 hist_range: tuple = (0, 100), summary_file: str = None, **kwargs):
+        """
+        :param output_file 输出文件 `{bucket}`为桶名 未指定时在后缀前插入`-桶名`
+        :param key 得分字段路径 值可以是数值、ModelRes或布尔值（error_status）
+        :param thresholds 递增的分桶阈值
+        :param names 桶名 个数为阈值个数+1
+        :param writer 写入格式 jsonl/csv/parquet
+        :param bins 得分直方图的分箱数
+        :param hist_range 得分直方图的范围 超出范围的得分计入两端的分箱
+        :param summary_file 汇总报告的输出文件（JSON） 为空时只打印
+        :param kwargs 写入节点的其他参数 如rotate_records、compression
+        """
+        assert len(names) == len(thresholds) + 1, "桶名个数应为阈值个数+1"
+        assert list(thresholds) == sorted(thresholds), "阈值应递增"
+        assert writer in WRITERS, f"不支持的写入格式: {writer} 可选: {list(WRITERS)}"
+        self.output_file = output_file
+        self.key = key
+        self.getter = compile_getter(key)
+        self.thresholds = list(thresholds)
+        self.names = list(names)
+        self.writer_cls = WRITERS[writer]
+        self.writer_kwargs = kwargs
+        self.bins = bins
+        self.hist_range = hist_range
+        self.summary_file = summary_file
+        self.writers = {}
+        self.histograms = {}
+        self.summary = None
+
+    def bucket_file(self, bucket: str) -> str:
+        if '{bucket}' in self.output_file:
+            return self.output_file.replace('{bucket}', bucket)
+        folder, name = os.path.split(self.output_file)
+        stem, dot, suffix = name.partition('.')
+        return os.path.join(folder, f'{stem}-{bucket}{dot}{suffix}')
+
+    def on_start(self):
+        self.writers = {}
+        self.histograms = {}
+        self.summary = None
+
+    def get_writer(self, bucket: str) -> FileWriter:
+        writer = self.writers.get(bucket)
+        if writer is None:
+            writer = self.writer_cls(self.bucket_file(bucket), **self.writer_kwargs)
+            writer.on_start()
+            self.writers[bucket] = writer
+            self.histograms[bucket] = [0] * self.bins
+        return writer
+
+    def locate(self, value) -> tuple:
+        """返回(桶名, 数值得分或None)"""
+        if hasattr(value, 'error_status'):
+            value = value.error_status
+        if isinstance(value, bool):
+            return self.names[0] if value else self.names[-1], None
+        if isinstance(value, (int, float)) and value == value:
+            return self.names[bisect_right(self.thresholds, value)], value
+        return 'unscored', None
+
+    def on_data(self, data: Any, *args):
+        bucket, score = self.locate(self.getter(data))
+        self.get_writer(bucket).on_data(data)
+        if score is not None:
+            low, high = self.hist_range
+            idx = int((score - low) * self.bins / (high - low))
+            self.histograms[bucket][min(max(idx, 0), self.bins - 1)] += 1
+        return data
+
+    def on_complete(self):
+        low, high = self.hist_range
+        width = (high - low) / self.bins
+        summary = {}
+        for bucket, writer in self.writers.items():
+            writer.on_complete()
+            hist = self.histograms[bucket]
+            summary[bucket] = {
+                'count': writer.records,
+                'bytes': sum(os.path.getsize(f) for f in writer.files),
+                'files': writer.files,
+                'histogram': {f'{low + i * width:g}-{low + (i + 1) * width:g}': n for i, n in enumerate(hist) if n}
+            }
+        self.summary = summary
+        content = dumps(summary, indent=2)
+        if self.summary_file:
+            os.makedirs(os.path.dirname(os.path.abspath(self.summary_file)), exist_ok=True)
+            with open(self.summary_file, 'w', encoding='utf8') as fout:
+                fout.write(content)
+        print(f"{self} summary:\n{content}")
+
+    def __str__(self):
+        return f"{self.name}('{self.output_file}', key='{self.key}', thresholds={self.thresholds})"
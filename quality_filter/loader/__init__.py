@@ -1,2 +1,2 @@
-from .base import DataProvider, Random, Array, String, Input, TimedLoader, Function, QueueLoader, MultiLoader
+from .base import DataProvider, Random, Array, String, Input, TimedLoader, Incremental, Function, QueueLoader, MultiLoader
 from .text import TextBase, Text, CSV, JsonLine, JsonArray, JsonFree, TextPlain, Json, Yaml
\ No newline at end of file
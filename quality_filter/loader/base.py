@@ -1,3 +1,4 @@
+import json
 import time
 from typing import Iterable, Any
 from types import GeneratorType
@@ -10,6 +11,18 @@ class DataProvider:
     def iter(self) -> Iterable[Any]:
         pass
 
+    def push_filter(self, expr) -> bool:
+        """
+        谓词下推：加载器在解析数据时直接过滤（如按原始行或列判断），返回True表示已接受，
+        此后只输出满足条件的数据；默认不支持
+        :param expr 过滤表达式（util.filters.FilterExpr）
+        """
+        return False
+
+    def reopen(self):
+        """重新开始读取（如重新打开文件） 用于定时轮询等多次调用iter的场景；默认每次iter都从头生成 无需处理"""
+        pass
+
     def __call__(self, *args, **kwargs):
         return self.iter()
 
@@ -74,7 +87,10 @@ class Random(DataProvider):
 
 
 class TimedLoader(DataProvider):
-    """定时轮询器 定时无限（或指定次数）调用提供的Loader 比如定时进行数据库轮询或接口轮询"""
+    """
+    定时轮询器 定时无限（或指定次数）调用提供的Loader 比如定时进行数据库轮询或接口轮询
+    每轮开始前调用Loader的reopen（文件加载器重新打开文件）；配合`Incremental`每轮只输出新增或变化的数据
+    """
     def __init__(self, that: DataProvider, interval: int = 15, num_of_times: int = 0):
         self.that = that
         self.interval = interval
@@ -84,6 +100,8 @@ class TimedLoader(DataProvider):
         counter = 0
         while True:
             print(f"{self} running at: ", current_time())
+            if counter > 0:
+                self.that.reopen()
             counter += 1
             for item in self.that.iter():
                 yield item
@@ -93,10 +111,88 @@ class TimedLoader(DataProvider):
 
             time.sleep(self.interval)
 
+    def close(self):
+        self.that.close()
+
     def __str__(self):
         return f"TimedPull[{self.that.name}, interval={self.interval}]"
 
 
+class Incremental(DataProvider):
+    """
+    增量加载器 在本地持久化水印（util.watermark.Watermark），每次调用只输出新增或变化的数据，进程重启后依然有效
+    - 实体水印：指定`key`时，按实体标识记录版本号（`version`字段，如修订号）或内容哈希，版本未变化的实体不再输出
+    - 文件偏移：`offset=True`时记录按行读取的文件加载器（如Text、JsonLine）已读到的位置，下次从该位置继续，
+      适合只追加写入的文件；文件被替换或截断时从头读取
+    两种水印可同时使用，一般配合TimedLoader定时轮询：`TimedLoader(Incremental(JsonLine(f), 'state.db', key='id'))`
+    """
+    def __init__(self, that: DataProvider, state_file: str, key: str = None, version: str = None,
+                 offset: bool = False, table: str = 'watermark'):
+        """
+        :param that 被包装的加载器
+        :param state_file 水印文件
+        :param key 实体标识的字段路径（如'id'） 为空时不做实体去重
+        :param version 版本字段路径（如'lastrevid'） 为空时使用内容哈希
+        :param offset 是否记录文件读取位置 要求加载器为按行读取的文件加载器，且文件按整行追加写入
+        :param table 水印表名 不同数据源可共用一个水印文件
+        """
+        from quality_filter.util.watermark import Watermark
+        assert key or offset, "key和offset至少指定一个"
+        if offset:
+            assert getattr(that, 'instream', None) is not None and that.instream.seekable(), \
+                "offset水印需要可定位的文件加载器"
+        self.that = that
+        self.key = key
+        self.version = version
+        self.offset = offset
+        self.watermark = Watermark(state_file, table=table)
+        if key:
+            from quality_filter.util.jsons import compile_getter
+            self.key_getter = compile_getter(key)
+            self.version_getter = compile_getter(version) if version else None
+
+    def reopen(self):
+        self.that.reopen()
+
+    def get_version(self, item):
+        if self.version_getter is not None:
+            return self.version_getter(item)
+        from quality_filter.util.caches import content_hash
+        if isinstance(item, (str, bytes)):
+            return content_hash(item)
+        return content_hash(json.dumps(item, ensure_ascii=False, sort_keys=True, default=str))
+
+    def iter(self):
+        watermark = self.watermark
+        emitted, skipped = watermark.emitted, watermark.skipped
+        if self.offset:
+            self.that.instream.seek(watermark.get_offset(self.that.input_file))
+        if self.key:
+            key_getter = self.key_getter
+            get_version = self.get_version
+            for item in self.that.iter():
+                key, version = key_getter(item), get_version(item)
+                if watermark.changed(key, version):
+                    yield item
+                    watermark.update(key, version)
+        else:
+            for item in self.that.iter():
+                watermark.emitted += 1
+                yield item
+        # 完整读取后才保存水印和读取位置 中途退出时本轮的数据下次重新输出
+        if self.offset:
+            watermark.set_offset(self.that.input_file, self.that.instream.tell())
+        watermark.commit()
+        print(f"{self}: emitted {watermark.emitted - emitted}, skipped {watermark.skipped - skipped}")
+
+    def close(self):
+        self.watermark.close()
+        self.that.close()
+
+    def __str__(self):
+        return f"Incremental[{self.that}, key={self.key}, version={self.version}, offset={self.offset}]"
+
+
 class Function(DataProvider):
     """函数调用包装器 提供调用函数的结果"""
     def __init__(self, function, *args, **kwargs):
@@ -121,15 +217,59 @@ class Function(DataProvider):
 
 
 class QueueLoader(DataProvider):
-    """基于本地队列的加载器"""
-    def __init__(self, timeout: int = 60):
-        self.queue = []
+    """
+    基于有界队列的加载器（util.queues） 阻塞等待数据，收到结束消息`Message.end()`（由上游流程的WriteQueue在结束时发送）后结束，
+    超过timeout秒没有数据时也结束；配合WriteQueue可以在同一进程中以生产者/消费者方式连接两个流程，队列满时生产者阻塞（反压）
+    """
+    def __init__(self, queue=None, timeout: float = 60, maxsize: int = 1000, process: bool = False, producers: int = 1,
+                 batched: bool = False):
+        """
+        :param queue 队列对象或命名队列的名称（同名的WriteQueue写入同一个队列） 为空时新建
+        :param timeout 等待数据的超时时间（秒） 0表示一直等待
+        :param maxsize 新建队列的最大元素个数
+        :param process 新建队列是否跨进程（multiprocessing.Queue）
+        :param producers 生产者个数 收到相同个数的结束消息后结束
+        :param batched 队列中的每个元素是否为一批数据（列表） 逐条输出；按批传递可大幅减少队列的加锁开销
+        """
+        from quality_filter.util.queues import resolve_queue
+        self.queue = resolve_queue(queue, maxsize, process)
         self.timeout = timeout
+        self.producers = producers
+        self.batched = batched
+        # 是否已收到全部结束消息
+        self.finished = False
+
+    def put(self, item, timeout: float = None):
+        self.queue.put(item, timeout=timeout)
 
     def iter(self):
-        while self.queue:
-            item = self.queue.pop(0)
-            yield item
+        from queue import Empty
+        from quality_filter.iterator.base import Message
+        get = self.queue.get
+        timeout = self.timeout or None
+        ends = 0
+        self.finished = False
+        while True:
+            try:
+                item = get(timeout=timeout)
+            except Empty:
+                print(f"{self}: no data in {self.timeout}s, stop")
+                break
+            if isinstance(item, Message):
+                if item.msg_type == 'end':
+                    ends += 1
+                    if ends >= self.producers:
+                        self.finished = True
+                        break
+                    continue
+                item = item.data
+            if self.batched:
+                yield from item
+            else:
+                yield item
+
+    def __str__(self):
+        return f"{self.name}(timeout={self.timeout}, producers={self.producers}, batched={self.batched})"
 
 
 class MultiLoader(DataProvider):
@@ -25,3 +25,8 @@ class BinaryFile(File):
         if auto_open:
             self.instream = open(input_file, "rb")
         self.input_file = input_file
+
+    def reopen(self):
+        if self.instream:
+            self.close()
+            self.instream = open(self.input_file, "rb")
@@ -1,20 +1,197 @@
+import os
 import json
+import time
 
-from quality_filter.loader.text import TextBase, Text
+from quality_filter.util.files import open_file
+from quality_filter.loader.file import File
 
 
-class QadataJsonDump(Text):
+def line_blocks(path: str, num: int = 1, block_size: int = None, start: int = 0, end: int = None) -> list:
+    """
+    将文件的[start, end)区间（默认整个文件，start须为行首）按字节切分为对齐到行首的子区间[(start, end), ...]：
+    分为`num`段，或每段约`block_size`字节。每个边界向后移动到下一行的行首，从边界处开始的行属于后一段，
+    各区间互不重叠且覆盖整个区间
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    if block_size:
+        num = max(1, -(-(end - start) // block_size))
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for i in range(1, num):
+            pos = start + (end - start) * i // num
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= end:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_dump_line(line: bytes):
+    """解析Json数组转储的一行 兼容CRLF、缺少行末逗号的最后一项以及与[ ]同行的数据；空行和括号行返回None"""
+    line = line.strip()
+    if line[:1] == b'[':
+        line = line[1:].lstrip()
+    if line[-1:] == b',':
+        line = line[:-1].rstrip()
+    if line[-1:] == b']' and line[-2:-1] in (b'}', b''):
+        line = line[:-1].rstrip()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def iter_dump_lines(stream, start: int, end: int, failed: list):
+    """解析文件流中[start, end)区间内的行 失败的行以(位置, 原因)加入failed"""
+    # 空区间（如文件行数少于段数时靠后的段）不读取 否则会读到区间之外的一行
+    if start >= end:
+        return
+    stream.seek(start)
+    pos = start
+    for line in stream:
+        try:
+            item = parse_dump_line(line)
+        except ValueError as e:
+            failed.append((pos, f'{type(e).__name__}: {e}'))
+            item = None
+        pos += len(line)
+        if item is not None:
+            yield item
+        if pos >= end:
+            break
+
+
+def decode_block(path: str, start: int, end: int) -> tuple:
+    """子进程中解析文件的一个区间 返回(数据列表, 失败列表, (进程号, 字节数, 耗时))"""
+    started = time.time()
+    failed = []
+    with open(path, 'rb') as f:
+        items = list(iter_dump_lines(f, start, end, failed))
+    return items, failed, (os.getpid(), end - start, time.time() - started)
+
+
+class QadataJsonDump(File):
     """
     全量数据，Json格式，是一个非常大的Json Array，第一行为[，最后一行为]，中间每行为一个Json，行末带逗号
     尽管理论上可以直接用json.load，但并不推荐！
+    支持按字节切分为对齐到行首的区间并行处理（仅限未压缩的文件）：
+    - `part/parts`：只读取第part段（共parts段） 可同时启动parts个流程进程，各自处理互不重叠的部分
+    - `max_workers`：将本段再切分为约`block_size`字节的块，交给多个子进程解析，按文件顺序输出
+    格式不正确的行计数并跳过，结束时报告失败数、部分样例以及每个进程的吞吐
     """
-    def __init__(self, input_file: str):
-        super().__init__(input_file)
+    def __init__(self, input_file: str, part: int = 0, parts: int = 1, max_workers: int = 0,
+                 block_size: int = 16 << 20, max_samples: int = 10):
+        """
+        :param input_file 转储文件 支持bz2、gz压缩（此时只能顺序读取）
+        :param part 读取的段号 从0开始
+        :param parts 总段数
+        :param max_workers 解析进程数 0表示在当前进程中解析，None为CPU核数
+        :param block_size 交给子进程的块大小（字节）
+        :param max_samples 报告中保留的失败样例数
+        """
+        assert 0 <= part < parts, f"part应在[0, {parts})之间"
+        self.input_file = input_file
+        self.compressed = input_file.endswith(('.bz2', '.gz'))
+        assert not self.compressed or (parts == 1 and max_workers == 0), "压缩文件不能切分 只能顺序读取"
+        self.instream = open_file(input_file, mode="rb")
+        self.part = part
+        self.parts = parts
+        self.max_workers = max_workers
+        self.block_size = block_size
+        self.max_samples = max_samples
+        self.failures = 0
+        self.failure_samples = []
+        self.throughput = {}
+
+    def reopen(self):
+        self.close()
+        self.instream = open_file(self.input_file, mode="rb")
+
+    def section(self) -> tuple:
+        """本加载器负责的字节区间"""
+        if self.compressed:
+            return 0, float('inf')
+        blocks = line_blocks(self.input_file, self.parts)
+        # 文件行数少于段数时 靠后的段为空
+        return blocks[self.part] if self.part < len(blocks) else (0, 0)
+
+    def add_failures(self, failed: list):
+        self.failures += len(failed)
+        room = self.max_samples - len(self.failure_samples)
+        if room > 0:
+            self.failure_samples.extend(failed[:room])
+
+    def add_throughput(self, pid: int, size: int, records: int, seconds: float):
+        stat = self.throughput.setdefault(pid, [0, 0, 0.0])
+        stat[0] += size
+        stat[1] += records
+        stat[2] += seconds
 
     def iter(self):
-        for line in super().iter():
-            if len(line) > 4:
-                yield json.loads(line[:-2])
+        self.failures = 0
+        self.failure_samples = []
+        self.throughput = {}
+        start, end = self.section()
+        if self.max_workers == 0:
+            started = time.time()
+            failed = []
+            records = 0
+            for item in iter_dump_lines(self.instream, start, end, failed):
+                records += 1
+                yield item
+                if failed:
+                    self.add_failures(failed)
+                    failed.clear()
+            self.add_failures(failed)
+            size = (self.instream.tell() if self.compressed else end) - start
+            self.add_throughput(os.getpid(), size, records, time.time() - started)
+        elif end > start:
+            yield from self.iter_parallel(start, end)
+        self.report()
+
+    def iter_parallel(self, start: int, end: int):
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        blocks = line_blocks(self.input_file, block_size=self.block_size, start=start, end=end)
+        workers = self.max_workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # 每个进程最多两块在途 限制内存并保持输出顺序
+        max_pending = 2 * workers
+        pending = deque()
+
+        def collect(future):
+            items, failed, (pid, size, seconds) = future.result()
+            self.add_failures(failed)
+            self.add_throughput(pid, size, len(items), seconds)
+            return items
+
+        try:
+            for block in blocks:
+                pending.append(executor.submit(decode_block, self.input_file, *block))
+                if len(pending) >= max_pending:
+                    yield from collect(pending.popleft())
+            while pending:
+                yield from collect(pending.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def report(self):
+        print(f"{self}: {self.failures} malformed lines")
+        for pos, reason in self.failure_samples:
+            print(f"  offset {pos}: {reason}")
+        for pid, (size, records, seconds) in self.throughput.items():
+            seconds = max(seconds, 1e-6)
+            print(f"  worker {pid}: {records} records, {size / (1 << 20):.1f} MB in {seconds:.1f}s, "
+                  f"{records / seconds:.0f} records/s, {size / (1 << 20) / seconds:.1f} MB/s")
+
+    def __str__(self):
+        return f"{self.name}('{self.input_file}', part={self.part}, parts={self.parts})"
 
 
 ns_prefix = 'http://www.mediawiki.org/xml/export-0.11/'
@@ -39,21 +216,153 @@ def to_dict(elem, target: dict):
             target[etag] = e.text
 
 
-class QadataXmlIncr(TextBase):
+def decode_pages(pages: list) -> tuple:
+    """
+    解析一批页面[(标题, 修订号, Json文本), ...]的Json 可在子进程中执行
+    返回(成功列表[(标题, 修订号, 解析结果), ...], 失败列表[(标题, 原因), ...])
+    """
+    res, failed = [], []
+    for title, revision, text in pages:
+        try:
+            res.append((title, revision, json.loads(text)))
+        except (ValueError, TypeError) as e:
+            failed.append((title, f'{type(e).__name__}: {e}'))
+    return res, failed
+
+
+class QadataXmlIncr(File):
     """
     增量数据，仅提供XML格式，<page></page>表示一个最近修改的实体，page/revision/text为对应的Json
+    流式解析：每个page处理完即释放对应的元素及之前的兄弟节点，内存占用与文件大小无关；
+    Json按批交给子进程解析（`max_workers`），与XML解析流水线并行，输出顺序与文件一致；解析失败的页面计数并在结束时报告
+    指定`state_file`时为增量模式：按页面标题（实体ID）记录已输出的修订号（page/revision/id），修订号未变化的页面
+    在解析Json之前即跳过，重复轮询同一个增量文件时只输出新增或变化的实体；水印持久化在本地，进程重启后依然有效
+    水印只记录解析成功并已输出的页面，完整读取后统一提交，中途退出或解析失败的页面下次会重新输出
     """
-    def __init__(self, input_file: str):
-        super().__init__(input_file)
+    def __init__(self, input_file: str, state_file: str = None, table: str = 'qadata_revision',
+                 max_workers: int = 0, batch_size: int = 256, max_samples: int = 10):
+        """
+        :param input_file 增量XML文件
+        :param state_file 水印文件 为空时输出全部页面
+        :param table 水印表名
+        :param max_workers 解析Json的进程数 0表示在当前进程中解析，None为CPU核数
+        :param batch_size 每批交给子进程的页面数
+        :param max_samples 报告中保留的解析失败样例数
+        """
+        self.input_file = input_file
+        # lxml的iterparse需要读取字节流
+        self.instream = open_file(input_file, mode="rb")
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self.pages = 0
+        self.failures = 0
+        self.failure_samples = []
+        self.watermark = None
+        if state_file:
+            from quality_filter.util.watermark import Watermark
+            self.watermark = Watermark(state_file, table=table)
 
-    def iter(self):
+    def reopen(self):
+        super().close()
+        self.instream = open_file(self.input_file, mode="rb")
+
+    def iter_pages(self):
+        """流式解析XML 输出待解析的(标题, 修订号, Json文本)"""
         import lxml.etree as ET
-        for event, elem in ET.iterparse(self.instream, tag=f'{tag_prefix}page'):
-            res = {}
-            to_dict(elem, res)
-            text = res['revision']['text']
-            try:
-                rev = json.loads(text)
-            except:
-                continue
-            yield rev
+        watermark = self.watermark
+        title_tag, revision_tag = f'{tag_prefix}title', f'{tag_prefix}revision'
+        id_tag, text_tag = f'{tag_prefix}id', f'{tag_prefix}text'
+        # huge_tree: 个别实体的Json超过libxml2默认的单个文本节点上限（10MB）
+        for event, elem in ET.iterparse(self.instream, tag=f'{tag_prefix}page', huge_tree=True):
+            self.pages += 1
+            title = elem.findtext(title_tag)
+            revision = elem.find(revision_tag)
+            revision_id = text = None
+            if revision is not None:
+                revision_id = revision.findtext(id_tag)
+                if watermark is not None and not watermark.changed(title, revision_id):
+                    text = False
+                else:
+                    text = revision.findtext(text_tag)
+            # 释放已处理的page及之前的兄弟节点（根节点下的siteinfo等） 否则整棵树会一直留在内存中
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            if text is not False:
+                yield title, revision_id, text
+
+    def add_failures(self, failed: list):
+        self.failures += len(failed)
+        room = self.max_samples - len(self.failure_samples)
+        if room > 0:
+            self.failure_samples.extend(failed[:room])
+
+    def iter(self):
+        self.pages = self.failures = 0
+        self.failure_samples = []
+        watermark = self.watermark
+        if self.max_workers == 0:
+            # 逐条解析（攒批后集中解析、集中释放反而更慢）
+            loads = json.loads
+            for title, revision, text in self.iter_pages():
+                try:
+                    data = loads(text)
+                except (ValueError, TypeError) as e:
+                    self.add_failures([(title, f'{type(e).__name__}: {e}')])
+                    continue
+                yield data
+                if watermark is not None:
+                    watermark.update(title, revision)
+        else:
+            for title, revision, data in self.iter_parallel():
+                yield data
+                if watermark is not None:
+                    watermark.update(title, revision)
+        # 全部输出后才提交水印
+        if watermark is not None:
+            watermark.commit()
+        self.report()
+
+    def iter_parallel(self):
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        workers = self.max_workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # 每个进程最多两批在途 限制内存并保持输出顺序
+        max_pending = 2 * workers
+        pending = deque()
+
+        def collect(future):
+            res, failed = future.result()
+            if failed:
+                self.add_failures(failed)
+            return res
+
+        try:
+            batch = []
+            for page in self.iter_pages():
+                batch.append(page)
+                if len(batch) < self.batch_size:
+                    continue
+                pending.append(executor.submit(decode_pages, batch))
+                batch = []
+                if len(pending) >= max_pending:
+                    yield from collect(pending.popleft())
+            if batch:
+                pending.append(executor.submit(decode_pages, batch))
+            while pending:
+                yield from collect(pending.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def report(self):
+        print(f"{self}: {self.pages} pages, {self.failures} failed to decode")
+        for title, reason in self.failure_samples:
+            print(f"  {title}: {reason}")
+
+    def close(self):
+        super().close()
+        if self.watermark is not None:
+            self.watermark.close()
+            self.watermark = None
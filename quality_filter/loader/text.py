@@ -2,6 +2,7 @@ from typing import Iterable, Any
 import json
 import yaml
 from quality_filter.util.files import open_file
+from quality_filter.util.filters import column_accessor
 from quality_filter.loader.file import File
 
 
@@ -9,8 +10,14 @@ class TextBase(File):
     """文本文件基类，可加载整个文件作为一个字符串输出 仅适合小文件"""
     def __init__(self, input_file: str, encoding: str = "utf8", **kwargs):
         self.input_file = input_file
+        self.encoding = encoding
+        self.open_kwargs = kwargs
         self.instream = open_file(input_file, mode="r", encoding=encoding, **kwargs)
 
+    def reopen(self):
+        self.close()
+        self.instream = open_file(self.input_file, mode="r", encoding=self.encoding, **self.open_kwargs)
+
     def iter(self) -> Iterable[Any]:
         yield self.instream.read()
 
@@ -67,13 +74,27 @@ class Text(TextBase):
 class JsonLine(Text):
     """
      Json行文件加载器
+     支持过滤表达式下推：先对原始行做子串判断，可能匹配时再解析JSON并判断完整条件
     """
     def __init__(self, input_file: str, **kwargs):
         super().__init__(input_file, **kwargs)
+        self.filters = []
+
+    def push_filter(self, expr) -> bool:
+        self.filters.append(expr)
+        return True
 
     def iter(self):
+        filters = self.filters
+        if not filters:
+            for line in super().iter():
+                yield json.loads(line)
+            return
         for line in super().iter():
-            yield json.loads(line)
+            if all(f.prefilter(line) for f in filters):
+                item = json.loads(line)
+                if all(f(item) for f in filters):
+                    yield item
 
 
 class JsonFree(Text):
@@ -104,6 +125,14 @@ class CSV(Text):
         super().__init__(input_file, **kwargs)
         self.header = header
         self.sep = sep
+        self.filters = []
+
+    def push_filter(self, expr) -> bool:
+        """有表头时支持过滤表达式下推：按列判断 满足条件的行才构造字典"""
+        if not self.header:
+            return False
+        self.filters.append(expr)
+        return True
 
     def iter(self):
         try:
@@ -112,11 +141,15 @@ class CSV(Text):
             raise Exception("failed to import csv")
         reader = csv.reader(super().iter())
         header = None
+        predicates = []
         for index, row in enumerate(reader):
             if self.header:
                 if index == 0:
                     header = row
-                else:
+                    if self.filters:
+                        accessor = column_accessor(header)
+                        predicates = [f.bind(accessor) for f in self.filters]
+                elif all(p(row) for p in predicates):
                     yield dict(zip(header, row))
             else:
                 yield row
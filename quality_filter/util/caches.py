@@ -0,0 +1,191 @@
+import os
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+
+def content_hash(*parts) -> str:
+    """对若干内容计算稳定的哈希值（跨进程一致），用作缓存key"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode('utf8')
+        h.update(part)
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+# 同一进程内同一文件共用一个连接 避免多个连接的写事务互相锁定
+_connections = {}
+_registry_lock = threading.RLock()
+
+
+def _acquire_connection(path: str):
+    key = os.path.abspath(path)
+    with _registry_lock:
+        if key not in _connections:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            _connections[key] = [conn, threading.RLock(), 0]
+        entry = _connections[key]
+        entry[2] += 1
+        return entry[0], entry[1]
+
+
+def _release_connection(path: str):
+    key = os.path.abspath(path)
+    with _registry_lock:
+        entry = _connections[key]
+        entry[2] -= 1
+        if entry[2] <= 0:
+            entry[0].commit()
+            entry[0].close()
+            del _connections[key]
+
+
+class DiskCache:
+    """
+    基于SQLite的本地磁盘KV缓存，值采用pickle序列化，进程重启后仍然有效
+    - 可选LRU容量限制：超出max_size时淘汰最久未访问的条目
+    - 统计命中/未命中/淘汰次数
+    - 写操作按批提交，close时提交剩余写入
+    线程安全：所有读写通过同一把锁串行化；同一进程内同一文件的多个缓存（表）共用一个连接
+    """
+    def __init__(self, path: str, table: str = 'cache', max_size: int = 0, commit_every: int = 1):
+        """
+        :param path 缓存文件路径，目录不存在时自动创建
+        :param table 表名，同一文件中可存放多个缓存
+        :param max_size 最大条目数 0表示不限制
+        :param commit_every 每多少次写操作提交一次事务
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.table = table
+        self.max_size = max_size
+        self.commit_every = max(commit_every, 1)
+        self.conn, self.lock = _acquire_connection(path)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (k TEXT PRIMARY KEY, v BLOB, t INTEGER)')
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_t ON {table} (t)')
+        self.conn.commit()
+        # 访问时钟 用于LRU排序
+        self.tick = self.conn.execute(f'SELECT MAX(t) FROM {table}').fetchone()[0] or 0
+        self.count = self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _write(self):
+        """调用方需持有锁"""
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def get(self, key: str, default=None):
+        with self.lock:
+            row = self.conn.execute(f'SELECT v FROM {self.table} WHERE k=?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if self.max_size > 0:
+                self.tick += 1
+                self.conn.execute(f'UPDATE {self.table} SET t=? WHERE k=?', (self.tick, key))
+                self._write()
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._set(key, blob)
+            self._write()
+
+    def set_many(self, items: dict):
+        """批量写入并在同一个事务中提交"""
+        blobs = [(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)) for key, value in items.items()]
+        with self.lock:
+            for key, blob in blobs:
+                self._set(key, blob)
+            self.conn.commit()
+            self.pending = 0
+
+    def _set(self, key: str, blob: bytes):
+        """调用方需持有锁"""
+        self.tick += 1
+        cur = self.conn.execute(f'UPDATE {self.table} SET v=?, t=? WHERE k=?', (blob, self.tick, key))
+        if cur.rowcount == 0:
+            self.conn.execute(f'INSERT INTO {self.table} (k, v, t) VALUES (?, ?, ?)', (key, blob, self.tick))
+            self.count += 1
+            if 0 < self.max_size < self.count:
+                self._evict()
+
+    def _evict(self):
+        """淘汰最久未访问的条目 一次多淘汰1%以减少淘汰频率 调用方需持有锁"""
+        num = min(self.count - self.max_size + max(self.max_size // 100, 1), self.count)
+        self.conn.execute(f'DELETE FROM {self.table} WHERE k IN '
+                          f'(SELECT k FROM {self.table} ORDER BY t LIMIT ?)', (num,))
+        self.count -= num
+        self.evictions += num
+
+    def commit(self):
+        """提交尚未提交的写入"""
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def __contains__(self, key: str):
+        with self.lock:
+            row = self.conn.execute(f'SELECT 1 FROM {self.table} WHERE k=?', (key,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.count
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total > 0 else 0.0
+        }
+
+    def close(self):
+        if self.conn:
+            with self.lock:
+                self.conn.commit()
+            self.conn = None
+            _release_connection(self.path)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}('{self.path}', table='{self.table}', max_size={self.max_size})"
+
+
+_caches = {}
+
+
+def open_cache(path: str, table: str = 'cache', **kwargs) -> DiskCache:
+    """获取进程内共享的缓存对象 同一文件同一表只创建一个实例（参数以首次创建为准） 使用完毕调用close_cache"""
+    key = (os.path.abspath(path), table)
+    with _registry_lock:
+        if key not in _caches:
+            _caches[key] = [DiskCache(path, table=table, **kwargs), 0]
+        entry = _caches[key]
+        entry[1] += 1
+        return entry[0]
+
+
+def close_cache(cache: DiskCache):
+    key = (os.path.abspath(cache.path), cache.table)
+    with _registry_lock:
+        entry = _caches[key]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _caches[key]
+    cache.close()
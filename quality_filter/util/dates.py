@@ -1,6 +1,7 @@
 import re
 import time
 import pytz
+import numpy as np
 from datetime import datetime, timezone, timedelta
 
 
@@ -182,30 +183,243 @@ def native_datetime_to_beijing_timestamp(time_str: str, time_format: str = '%B %
         raise ValueError(f"转换失败：{e}")
 
 
-def normalize_time(datetime_str: str, tz=None):
-    """解析时间,转化为北京时间时间戳"""
-    # 先根据ISO和非ISO的连接符判断
-    if '-' not in datetime_str and '/' not in datetime_str:
-        print('无法解析时间：', datetime_str)
+# strptime中数字字段的正则（与_strptime一致） 用于手写的快速解析
+_FIELD_PATTERNS = {
+    'Y': r'(\d\d\d\d)',
+    'y': r'(\d\d)',
+    'm': r'(1[0-2]|0[1-9]|[1-9])',
+    'd': r'(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])',
+    'H': r'(2[0-3]|[0-1]\d|\d)',
+    'M': r'([0-5]\d|\d)',
+    'S': r'(6[0-1]|[0-5]\d|\d)',
+}
+ISO = 'iso'
+
+
+def days_from_civil(y: int, m: int, d: int) -> int:
+    """公历日期到1970-01-01的天数（适用于任意年份的整数运算）"""
+    y -= m <= 2
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+
+def compile_format(fmt: str):
+    """
+    将只包含数字字段（%Y %y %m %d %H %M %S）的strptime格式编译为正则和字段顺序 其他格式返回None（使用strptime）
+    匹配规则与strptime一致：格式中的空白匹配一个或多个空白字符，需完整匹配
+    """
+    pattern = []
+    fields = []
+    i = 0
+    while i < len(fmt):
+        c = fmt[i]
+        if c == '%':
+            field = fmt[i + 1:i + 2]
+            if field not in _FIELD_PATTERNS:
+                return None
+            pattern.append(_FIELD_PATTERNS[field])
+            fields.append(field)
+            i += 2
+            continue
+        pattern.append(r'\s+' if c.isspace() else re.escape(c))
+        i += 1
+    return re.compile(''.join(pattern), re.IGNORECASE), tuple(fields)
+
+
+class DateParser:
+    """
+    多格式日期时间解析 输出毫秒时间戳
+    - 总是先尝试ISO格式（`datetime.fromisoformat`，支持Z后缀），再尝试`formats`中的格式，成功的非ISO格式会被缓存，
+      之后的值在ISO之后优先使用该格式，失败时再重新检测；ISO优先保证结果与值的先后顺序无关
+    - 只包含数字字段的格式（如`%Y/%m/%d %H:%M:%S`）使用预编译的正则和整数运算解析，不调用strptime
+    - `parse_many`批量解析，固定宽度的`YYYY-MM-DD[ HH:MM:SS]`/`YYYY/MM/DD[ HH:MM:SS]`由NumPy向量化处理，输出datetime64数组
+    不带时区的时间：默认与`normalize_time`原有逻辑一致，ISO格式按本地时区、其他格式按UTC；指定`tz`时均按该时区
+    """
+    def __init__(self, formats: list = None, tz=None):
+        """
+        :param formats 候选格式（strptime语法） 默认为possible_formats
+        :param tz 不带时区的时间所属时区（tzinfo） 默认见上
+        """
+        self.formats = list(possible_formats if formats is None else formats)
+        self.tz = tz
+        self.compiled = {fmt: compile_format(fmt) for fmt in self.formats}
+        # 默认格式都包含-或/ 不包含的值直接判定为无法解析
+        self.need_sep = formats is None
+        # 缓存的格式
+        self.format = None
+        self.failures = 0
+
+    def _naive_ts(self, dt: datetime, iso: bool) -> int:
+        if dt.tzinfo is None:
+            if self.tz is not None:
+                dt = dt.replace(tzinfo=self.tz)
+            elif not iso:
+                dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+
+    def parse_with(self, text: str, fmt: str) -> int or None:
+        """按指定格式解析 失败返回None"""
+        if fmt == ISO:
+            try:
+                dt = datetime.fromisoformat(text.replace('Z', '+00:00') if 'Z' in text else text)
+            except ValueError:
+                return None
+            return self._naive_ts(dt, True)
+        compiled = self.compiled.get(fmt)
+        if compiled is None:
+            try:
+                return self._naive_ts(datetime.strptime(text, fmt), False)
+            except ValueError:
+                return None
+        regex, fields = compiled
+        m = regex.fullmatch(text)
+        if m is None:
+            return None
+        vals = dict(zip(fields, map(int, m.groups())))
+        if 'y' in vals:
+            vals['Y'] = vals['y'] + (1900 if vals['y'] >= 69 else 2000)
+        year, month, day = vals.get('Y', 1900), vals.get('m', 1), vals.get('d', 1)
+        second = vals.get('S', 0)
+        if year < 1 or day > month_days(year, month) or second > 59:
+            return None
+        ts = ((days_from_civil(year, month, day) * 24 + vals.get('H', 0)) * 60 + vals.get('M', 0)) * 60 + second
+        tz = self.tz
+        if tz is not None and tz is not timezone.utc:
+            offset = tz.utcoffset(None) if isinstance(tz, timezone) else None
+            if offset is None:
+                # 非固定偏移的时区（如pytz/zoneinfo）交给datetime处理
+                return self._naive_ts(datetime(year, month, day, vals.get('H', 0), vals.get('M', 0), second), False)
+            ts -= int(offset.total_seconds())
+        return ts * 1000
+
+    def parse(self, text: str) -> int or None:
+        """解析为毫秒时间戳 无法解析时返回None"""
+        # 先根据ISO和非ISO的连接符判断
+        if self.need_sep and '-' not in text and '/' not in text:
+            self.failures += 1
+            return None
+        # ISO始终最先尝试：否则缓存的非ISO格式（按UTC）可能抢先解析ISO格式的值（按本地时区），结果随数据顺序变化
+        ts = self.parse_with(text, ISO)
+        if ts is not None:
+            return ts
+        fmt = self.format
+        if fmt is not None:
+            ts = self.parse_with(text, fmt)
+            if ts is not None:
+                return ts
+        for candidate in self.formats:
+            if candidate == fmt:
+                continue
+            ts = self.parse_with(text, candidate)
+            if ts is not None:
+                self.format = candidate
+                return ts
+        self.failures += 1
         return None
 
-    # 假设为ISO格式
-    try:
-        iso_date = normalize_isotime(datetime_str)
-        return iso_date
-    except ValueError as e:
-        print("not ISO format:", datetime_str)
-
-    # 尝试按照几个格式进行解析
-    for fmt in possible_formats:
-        try:
-            timestamp_ms = custom_datetime_to_beijing_timestamp(datetime_str, fmt)
-            return timestamp_ms
-        except Exception as e:
-            pass
-
-    print("无法解析时间：", datetime_str)
-    return None
+    def parse_many(self, values) -> np.ndarray:
+        """
+        批量解析 返回datetime64[ms]数组 无法解析的值为NaT
+        固定宽度的`YYYY-MM-DD[ HH:MM:SS]`和`YYYY/MM/DD[ HH:MM:SS]`通过字符矩阵向量化计算，其余值逐个调用`parse`
+        """
+        values = [v if isinstance(v, str) else '' for v in values]
+        res = np.full(len(values), np.iinfo(np.int64).min, dtype=np.int64)
+        done = np.zeros(len(values), dtype=bool)
+        if values:
+            arr = np.array(values, dtype=str)
+            width = arr.dtype.itemsize // 4
+            if width >= 10:
+                chars = arr.view(np.uint32).reshape(len(values), width)
+                lengths = np.char.str_len(arr)
+                for sep, iso in ((ord('-'), True), (ord('/'), False)):
+                    local = iso and self.tz is None
+                    offset = None if local else self._fixed_offset()
+                    if offset is None and not local:
+                        continue
+                    ts, ok = _vector_parse(chars, lengths, sep)
+                    ok &= ~done
+                    res[ok] = (_local_to_utc(ts[ok]) if local else ts[ok] - offset) * 1000
+                    done |= ok
+        for i in np.flatnonzero(~done):
+            ts = self.parse(values[i]) if values[i] else None
+            if ts is not None:
+                res[i] = ts
+        return res.view('datetime64[ms]')
+
+    def _fixed_offset(self) -> int or None:
+        """不带时区的时间相对UTC的固定偏移（秒） 未指定tz时为UTC（非ISO格式），tz不是固定偏移时返回None"""
+        if self.tz is None:
+            return 0
+        offset = self.tz.utcoffset(None) if isinstance(self.tz, timezone) else None
+        return None if offset is None else int(offset.total_seconds())
+
+
+def _local_to_utc(ts: np.ndarray) -> np.ndarray:
+    """
+    本地时区的时间（按UTC计算的秒数）转换为UTC时间戳
+    本地时区的偏移随日期变化（夏令时，包括time.daylight未标记的历史夏令时），因此对每个不同的值单独换算
+    """
+    uniq, inverse = np.unique(ts, return_inverse=True)
+    utc = np.array([int((_EPOCH + timedelta(seconds=int(s))).timestamp()) for s in uniq], dtype=np.int64)
+    return utc[inverse]
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _vector_parse(chars: np.ndarray, lengths: np.ndarray, sep: int):
+    """对字符矩阵中`YYYY{sep}MM{sep}DD`（可选` HH:MM:SS`或`THH:MM:SS`）格式的行计算秒级时间戳 返回(时间戳, 是否匹配)"""
+    digits = chars.astype(np.int64) - ord('0')
+    width = chars.shape[1]
+
+    def num(start, end):
+        val = np.zeros(len(chars), dtype=np.int64)
+        for i in range(start, end):
+            val = val * 10 + digits[:, i]
+        return val
+
+    def all_digits(*positions):
+        d = digits[:, list(positions)]
+        return ((d >= 0) & (d <= 9)).all(axis=1)
+
+    ok = (chars[:, 4] == sep) & (chars[:, 7] == sep) & all_digits(0, 1, 2, 3, 5, 6, 8, 9)
+    date_only = ok & (lengths == 10)
+    with_time = np.zeros(len(chars), dtype=bool)
+    if width >= 19:
+        t_sep = chars[:, 10]
+        with_time = ok & (lengths == 19) & ((t_sep == ord(' ')) | (t_sep == ord('T') if sep == ord('-') else False)) \
+            & (chars[:, 13] == ord(':')) & (chars[:, 16] == ord(':')) & all_digits(11, 12, 14, 15, 17, 18)
+    ok = date_only | with_time
+    year, month, day = num(0, 4), num(5, 7), num(8, 10)
+    valid_month = (month >= 1) & (month <= 12)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days_in_month = np.array(MONTH_DAYS[0])[np.clip(month, 0, 12)] + (leap & (month == 2))
+    ok &= valid_month & (day >= 1) & (day <= days_in_month) & (year >= 1)
+
+    # days_from_civil的向量化版本
+    y = year - (month <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    ts = days * 86400
+    if width >= 19:
+        hour, minute, second = num(11, 13), num(14, 16), num(17, 19)
+        with_time &= (hour < 24) & (minute < 60) & (second < 60)
+        ok &= date_only | with_time
+        ts = ts + np.where(with_time, hour * 3600 + minute * 60 + second, 0)
+    return ts, ok
+
+
+# normalize_time使用的默认解析器（缓存最近成功的格式）
+_default_parser = DateParser()
+
+
+def normalize_time(datetime_str: str, tz=None):
+    """解析时间,转化为北京时间时间戳（毫秒） 无法解析时返回None 见DateParser"""
+    return _default_parser.parse(datetime_str)
 
 
 if __name__ == "__main__":
@@ -1,36 +1,51 @@
 import json
 from quality_filter.util.files import get_lines
+from quality_filter.util.kvindex import open_index
 
 
-def from_csv(file: str, key_col: int = 0, val_col: int = 1, sep: str = ",", encoding: str = "utf8"):
+def from_csv(file: str, key_col: int = 0, val_col: int = 1, sep: str = ",", encoding: str = "utf8",
+             index_file: str = None, hot_size: int = 10000):
     """基于csv构造dict
     :param file 输入文件
     :param key_col key字段序号，默认0第一列
     :param val_col value字段序号，默认1第二列
     :param sep 分隔符，默认半角逗号
     :param encoding 文件编码，默认为utf8
+    :param index_file 索引文件 指定时构建（或复用）磁盘索引并返回MmapKV，适用于无法加载到内存的大词典
+    :param hot_size 使用索引时热点key缓存大小
     """
-    kv = {}
-    for line in get_lines(file, encoding=encoding):
-        if sep in line:
-            parts = line.split(sep)
-            kv[parts[key_col].strip()] = parts[val_col]
-    return kv
+    def pairs():
+        for line in get_lines(file, encoding=encoding):
+            if sep in line:
+                parts = line.split(sep)
+                yield parts[key_col].strip(), parts[val_col]
 
+    if index_file:
+        params = {'format': 'csv', 'key_col': key_col, 'val_col': val_col, 'sep': sep, 'encoding': encoding}
+        return open_index(file, pairs, index_file=index_file, hot_size=hot_size, params=params)
+    return dict(pairs())
 
-def from_json(file: str, key_key: str = 'id', val_key: str = 'name', encoding: str = "utf8"):
+
+def from_json(file: str, key_key: str = 'id', val_key: str = 'name', encoding: str = "utf8",
+              index_file: str = None, hot_size: int = 10000):
     """基于json构造dict
         :param file 输入文件
         :param key_key key字段名，默认为'id'
         :param val_key value字段名，默认为'name'
         :param encoding 文件编码，默认为utf8
+        :param index_file 索引文件 指定时构建（或复用）磁盘索引并返回MmapKV，适用于无法加载到内存的大词典
+        :param hot_size 使用索引时热点key缓存大小
     """
-    kv = {}
-    for line in get_lines(file, encoding=encoding):
-        row = json.loads(line)
-        if key_key in row and val_key in row:
-            kv[row[key_key]] = row[val_key]
-    return kv
+    def pairs():
+        for line in get_lines(file, encoding=encoding):
+            row = json.loads(line)
+            if key_key in row and val_key in row:
+                yield row[key_key], row[val_key]
+
+    if index_file:
+        params = {'format': 'json', 'key_key': key_key, 'val_key': val_key, 'encoding': encoding}
+        return open_index(file, pairs, index_file=index_file, hot_size=hot_size, params=params)
+    return dict(pairs())
 
 
 def copy_val(val):
@@ -47,6 +62,105 @@ def copy_val(val):
         return val
 
 
+class CowDict(dict):
+    """
+    写时复制（copy-on-write）的记录视图，用于多个分支共享同一条记录
+    构造时只做顶层浅拷贝（C层面的指针复制），嵌套的dict/list在首次访问时才复制为新的视图并保存在本视图中，
+    因此分支对记录的写入（包括嵌套字段）只影响本视图，未访问/只读的字段（如大文本）与原记录共享。
+    视图是dict的子类，可直接用于fill/extract及各类字段节点；序列化（json/pickle）时与普通dict一致。
+    【注意】不要绕过视图直接修改原记录，否则各视图中尚未复制的嵌套字段会一同变化
+    """
+    __slots__ = ('_base',)
+
+    def __init__(self, base: dict):
+        dict.__init__(self, base)
+        self._base = base
+
+    def _own(self, k, v):
+        """嵌套的dict/list仍与原记录共享时，复制为本视图所有"""
+        if (type(v) is dict or type(v) is list) and self._base.get(k, None) is v:
+            v = cow(v)
+            dict.__setitem__(self, k, v)
+        return v
+
+    def __getitem__(self, k):
+        return self._own(k, dict.__getitem__(self, k))
+
+    def get(self, k, default=None):
+        v = dict.get(self, k, _MISSING)
+        if v is _MISSING:
+            return default
+        return self._own(k, v)
+
+    def setdefault(self, k, default=None):
+        if k in self:
+            return self[k]
+        dict.__setitem__(self, k, default)
+        return default
+
+    def pop(self, k, *default):
+        if k in self:
+            v = self[k]
+            dict.__delitem__(self, k)
+            return v
+        return dict.pop(self, k, *default)
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def _own_all(self):
+        for k, v in dict.items(self):
+            if type(v) is dict or type(v) is list:
+                self._own(k, v)
+
+    # 覆盖__iter__/keys后 dict(view)、{**view}、dict.update(view)不再走C层面的直接复制，而是按keys()+__getitem__取值，
+    # 嵌套字段先复制为本视图所有，避免新dict与原记录共享嵌套对象
+    def __iter__(self):
+        return dict.__iter__(self)
+
+    def keys(self):
+        return dict.keys(self)
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = dict(self)
+        result.update(other)
+        return result
+
+    def copy(self) -> dict:
+        """独立的普通dict（深拷贝） 与原记录及本视图均不共享嵌套对象"""
+        return self.materialize()
+
+    def materialize(self) -> dict:
+        """转换为独立的普通dict（深拷贝）"""
+        return {k: copy_val(v) for k, v in dict.items(self)}
+
+    def __reduce__(self):
+        # pickle/deepcopy时按普通dict处理 不携带原记录
+        return dict, (self.materialize(),)
+
+
+_MISSING = object()
+
+
+def cow(val):
+    """创建写时复制视图：dict返回CowDict，list复制为新列表（元素递归创建视图），其他值原样返回"""
+    if isinstance(val, CowDict):
+        # 视图的视图会把原视图当作底层记录 原视图之后的原地修改会影响新视图 因此先转换为独立的dict
+        return CowDict(val.materialize())
+    if isinstance(val, dict):
+        return CowDict(val)
+    if isinstance(val, list):
+        return [cow(v) for v in val]
+    return val
+
+
 def merge_dicts(target: dict, source: dict):
     """将source字典合并到target中，相同字段会替换"""
     for k, v in source.items():
@@ -28,7 +28,9 @@ def get_lines(filename: str, encoding="utf8", **kwargs):
 
 
 def open_file(filename: str, mode: str = "rb", encoding: str = "utf8", **kwargs):
-    """打开文件 返回文件流 根据文件名判断是否为bz2 gz或普通文件"""
+    """打开文件 返回文件流 根据文件名判断是否为bz2 gz或普通文件 二进制模式忽略encoding"""
+    if 'b' in mode:
+        encoding = None
     if filename.endswith('.bz2'):
         import bz2
         stream = bz2.open(filename, mode, encoding=encoding, **kwargs)
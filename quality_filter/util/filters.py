@@ -0,0 +1,248 @@
+import re
+import ast
+import json
+
+from quality_filter.util.jsons import compile_getter, compile_function, parse_path
+
+
+def _match(pattern, val):
+    return val is not None and pattern.search(str(val)) is not None
+
+
+def _contains(val, sub):
+    return val is not None and sub in val
+
+
+def _startswith(val, prefix):
+    return isinstance(val, str) and val.startswith(prefix)
+
+
+def _endswith(val, suffix):
+    return isinstance(val, str) and val.endswith(suffix)
+
+
+def _exists(val):
+    return val is not None
+
+
+def _lower(val):
+    return val.lower() if isinstance(val, str) else val
+
+
+def _upper(val):
+    return val.upper() if isinstance(val, str) else val
+
+
+# 表达式中可用的函数
+FUNCTIONS = {
+    'len': len,
+    'int': int,
+    'float': float,
+    'str': str,
+    'match': _match,
+    'contains': _contains,
+    'startswith': _startswith,
+    'endswith': _endswith,
+    'exists': _exists,
+    'lower': _lower,
+    'upper': _upper,
+}
+
+ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.Compare,
+                 ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+                 ast.Constant, ast.List, ast.Tuple, ast.Set, ast.Load, ast.Call, ast.Name, ast.Attribute,
+                 ast.Subscript)
+
+
+def field_path(node) -> str or None:
+    """字段引用转换为字段路径 如`user.name`、`items[0].id`；`f('a-b')`可引用包含特殊字符的字段"""
+    if isinstance(node, ast.Name):
+        if node.id in FUNCTIONS or node.id == 'f':
+            return None
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = field_path(node.value)
+        return None if parent is None else f'{parent}.{node.attr}'
+    if isinstance(node, ast.Subscript):
+        parent = field_path(node.value)
+        idx = node.slice
+        if parent is None or not isinstance(idx, ast.Constant) or not isinstance(idx.value, int):
+            return None
+        return f'{parent}[{idx.value}]'
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'f':
+        assert len(node.args) == 1 and isinstance(node.args[0], ast.Constant), "f()只接受一个字段名字符串"
+        return node.args[0].value
+    return None
+
+
+def _raw_literal(val) -> bool:
+    """可以在原始JSON行中直接查找的字符串：可打印ASCII且JSON序列化时无需转义"""
+    return isinstance(val, str) and val != '' and val.isascii() and val.isprintable() \
+        and '"' not in val and '\\' not in val and '/' not in val
+
+
+class FilterExpr:
+    """
+    过滤表达式 基于Python表达式语法（仅允许以下部分），编译为谓词函数：
+    - 字段：`lang`、`meta.source`、`items[0].id`，特殊字段名使用`f('a-b')`，字段不存在时为None
+    - 比较：`== != < <= > >= in not in is None`，逻辑：`and or not`
+    - 函数：`len(x)`、`match(x, 'regex')`、`contains(x, 's')`、`startswith`、`endswith`、`exists(x)`、`lower`、`upper`、`int`、`float`、`str`
+    例如：`lang == 'zh' and len(text) > 100 and not match(url, 'wiki')`
+    单个比较或函数调用出错（如字段不存在时`len(None)`、None与数字比较）时该比较结果为False，不影响`or`/`not`中的其他条件，
+    如`{'lang': 'zh'}`满足`len(text) > 100 or lang == 'zh'`。
+
+    支持谓词下推：`literals`为记录匹配时原始JSON行中必须包含的字符串（每组至少包含一个），
+    `bind(accessor)`可基于自定义的字段访问方式（如CSV的列下标）生成谓词
+    """
+    def __init__(self, expr: str):
+        self.expr = expr
+        tree = ast.parse(expr.strip(), mode='eval')
+        for node in ast.walk(tree):
+            assert isinstance(node, ALLOWED_NODES), f"过滤表达式不支持: {type(node).__name__} in `{expr}`"
+        self.tree = tree
+        self.fields = []
+        self.literals = self._literals(tree.body)
+        self.predicate = self.bind(compile_getter)
+
+    def bind(self, accessor):
+        """
+        生成谓词函数
+        :param accessor 字段访问函数的工厂 输入字段路径 返回取值函数`getter(record)`
+        """
+        env = dict(FUNCTIONS)
+        fields = {}
+        expr = self
+
+        class Rewriter(ast.NodeTransformer):
+            def visit(self, node):
+                path = field_path(node)
+                if path is not None:
+                    if path not in fields:
+                        fields[path] = f'g{len(fields)}'
+                        env[fields[path]] = accessor(path)
+                    return ast.Call(func=ast.Name(id=fields[path], ctx=ast.Load()),
+                                    args=[ast.Name(id='r', ctx=ast.Load())], keywords=[])
+                if isinstance(node, ast.Call):
+                    assert isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords, \
+                        f"过滤表达式不支持的函数: {ast.unparse(node)} in `{expr.expr}`"
+                    if node.func.id == 'match':
+                        # 正则表达式只编译一次
+                        assert len(node.args) == 2 and isinstance(node.args[1], ast.Constant), "match(x, 'regex')"
+                        name = f're{len(env)}'
+                        env[name] = re.compile(node.args[1].value)
+                        node.args = [ast.Name(id=name, ctx=ast.Load()), self.visit(node.args[0])]
+                    else:
+                        node.args = [self.visit(arg) for arg in node.args]
+                    return node
+                if isinstance(node, ast.Name):
+                    raise AssertionError(f"过滤表达式中的名称无效: {node.id} in `{expr.expr}`")
+                return self.generic_visit(node)
+
+        body = Rewriter().visit(ast.parse(self.expr.strip(), mode='eval').body)
+        self.fields = list(fields)
+        # 出错时改用逐个比较/函数调用捕获异常的版本重新计算 正常情况下没有额外开销
+        guarded = Guard(env).visit(ast.parse(ast.unparse(body), mode='eval').body)
+        env['guarded'] = compile_function('guarded', 'r', [f'return bool({ast.unparse(guarded)})'], env)
+        return compile_function('predicate', 'r', [
+            'try:',
+            f'    return bool({ast.unparse(body)})',
+            f'except {GUARDED_ERRORS}:',
+            '    return guarded(r)',
+        ], env)
+
+    @staticmethod
+    def _literals(node) -> list:
+        """提取记录匹配的必要条件：原始JSON行中必须出现的字符串 返回[{候选字符串}, ...]"""
+        if isinstance(node, ast.BoolOp):
+            parts = [FilterExpr._literals(v) for v in node.values]
+            if isinstance(node.op, ast.And):
+                return [group for part in parts for group in part]
+            if all(parts):
+                return [set().union(*[part[0] for part in parts])]
+            return []
+        if isinstance(node, ast.Compare) and len(node.ops) == 1:
+            left, op, right = node.left, node.ops[0], node.comparators[0]
+            if isinstance(op, ast.Eq):
+                if isinstance(left, ast.Constant):
+                    left, right = right, left
+                if field_path(left) is not None and isinstance(right, ast.Constant) and _raw_literal(right.value):
+                    return [{json.dumps(right.value)}]
+            if isinstance(op, ast.In):
+                if field_path(left) is not None and isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                    vals = [e.value for e in right.elts if isinstance(e, ast.Constant)]
+                    if vals and len(vals) == len(right.elts) and all(_raw_literal(v) for v in vals):
+                        return [{json.dumps(v) for v in vals}]
+                if isinstance(left, ast.Constant) and _raw_literal(left.value) and field_path(right) is not None:
+                    return [{left.value}]
+            return []
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 2:
+            arg = node.args[1]
+            if field_path(node.args[0]) is None or not isinstance(arg, ast.Constant) or not _raw_literal(arg.value):
+                return []
+            if node.func.id == 'contains':
+                return [{arg.value}]
+            if node.func.id == 'startswith':
+                return [{'"' + arg.value}]
+            if node.func.id == 'endswith':
+                return [{arg.value + '"'}]
+        return []
+
+    def prefilter(self, line: str) -> bool:
+        """基于原始行的快速判断 返回False时记录一定不匹配"""
+        for group in self.literals:
+            for one in group:
+                if one in line:
+                    break
+            else:
+                return False
+        return True
+
+    def __call__(self, record) -> bool:
+        return self.predicate(record)
+
+    def __str__(self):
+        return self.expr
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.expr!r})'
+
+
+GUARDED_ERRORS = '(TypeError, ValueError, AttributeError)'
+
+
+class Guard(ast.NodeTransformer):
+    """将每个比较和函数调用替换为捕获异常的辅助函数（出错时为False） 辅助函数加入env"""
+    def __init__(self, env: dict):
+        self.env = env
+
+    def wrap(self, node):
+        name = f'c{len(self.env)}'
+        self.env[name] = compile_function(name, 'r', [
+            'try:',
+            f'    return {ast.unparse(node)}',
+            f'except {GUARDED_ERRORS}:',
+            '    return False',
+        ], self.env)
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=[ast.Name(id='r', ctx=ast.Load())], keywords=[])
+
+    def visit_Compare(self, node):
+        return self.wrap(node)
+
+    def visit_Call(self, node):
+        # 字段取值函数（g0、g1...）不会出错
+        if node.func.id in FUNCTIONS:
+            return self.wrap(node)
+        return node
+
+
+def column_accessor(header: list):
+    """CSV列访问：基于表头生成按列下标取值的访问函数工厂 不存在的列取值为None（与dict记录一致）"""
+    index = {name: i for i, name in enumerate(header)}
+
+    def accessor(path: str):
+        tokens = parse_path(path)
+        i = index.get(tokens[0]) if len(tokens) == 1 else None
+        if i is None:
+            return lambda row: None
+        return lambda row: row[i] if i < len(row) else None
+    return accessor
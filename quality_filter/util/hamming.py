@@ -0,0 +1,142 @@
+import os
+import sqlite3
+
+
+def to_signed(h: int) -> int:
+    """64位无符号整数转换为有符号整数（SQLite INTEGER为有符号64位）"""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+class HammingIndex:
+    """
+    64位哈希的汉明距离近邻检索（多索引哈希 multi-index hashing）
+    哈希按位切分为`max_distance+1`段，每段一个精确匹配的哈希表；由抽屉原理，距离不超过max_distance的两个哈希
+    至少有一段完全相同，查询时只需比较这些段命中的候选，而不是全部哈希。
+    max_distance越大每段越短、候选越多，适合较小的距离阈值（感知哈希去重一般为4~8）
+    """
+    def __init__(self, max_distance: int = 4, bits: int = 64):
+        self.max_distance = max_distance
+        self.bits = bits
+        num = max_distance + 1
+        widths = [bits // num + (1 if i < bits % num else 0) for i in range(num)]
+        self.segments = []
+        shift = 0
+        for width in widths:
+            self.segments.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [{} for _ in self.segments]
+        self.hashes = {}
+
+    def add(self, id_: int, h: int):
+        if id_ in self.hashes:
+            self.remove(id_)
+        self.hashes[id_] = h
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            table.setdefault((h >> shift) & mask, []).append(id_)
+
+    def remove(self, id_: int):
+        h = self.hashes.pop(id_, None)
+        if h is None:
+            return
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            key = (h >> shift) & mask
+            ids = table[key]
+            ids.remove(id_)
+            if not ids:
+                del table[key]
+
+    def search(self, h: int, max_distance: int = None) -> list:
+        """查找距离不超过max_distance（不能大于构造时的值）的哈希 返回按距离排序的[(距离, id), ...]"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            ids = table.get((h >> shift) & mask)
+            if ids:
+                candidates.update(ids)
+        hashes = self.hashes
+        found = [(d, id_) for id_ in candidates if (d := (h ^ hashes[id_]).bit_count()) <= max_distance]
+        found.sort()
+        return found
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+class HashIndex:
+    """
+    持久化的图片哈希索引：SQLite中保存每个文件的（路径、修改时间、大小、哈希），启动时将哈希加载到HammingIndex中；
+    文件未修改时直接使用已保存的哈希，增量数据只需计算新文件。id按加入顺序递增
+    """
+    def __init__(self, index_file: str = None, table: str = 'phash', max_distance: int = 4, commit_every: int = 1000):
+        """
+        :param index_file 索引文件 为空时只在内存中
+        :param table 表名 不同的哈希类型使用不同的表
+        :param max_distance 近邻检索的最大汉明距离
+        """
+        if index_file:
+            os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+        self.index_file = index_file
+        self.table = table
+        self.commit_every = max(commit_every, 1)
+        self.conn = sqlite3.connect(index_file or ':memory:')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                          f'(id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime INTEGER, size INTEGER, hash INTEGER)')
+        self.conn.commit()
+        self.index = HammingIndex(max_distance)
+        for id_, h in self.conn.execute(f'SELECT id, hash FROM {table}'):
+            self.index.add(id_, to_unsigned(h))
+        self.pending = 0
+
+    def lookup(self, paths: list) -> dict:
+        """批量查询已保存的文件 返回{路径: (id, (修改时间, 大小), 哈希)}"""
+        res = {}
+        paths = list(paths)
+        # SQLite单条语句的参数个数有上限
+        for i in range(0, len(paths), 500):
+            part = paths[i:i + 500]
+            sql = f'SELECT path, id, mtime, size, hash FROM {self.table} WHERE path IN ({",".join("?" * len(part))})'
+            for path, id_, mtime, size, h in self.conn.execute(sql, part):
+                res[path] = (id_, (mtime, size), to_unsigned(h))
+        return res
+
+    def add(self, path: str, stamp: tuple, h: int) -> int:
+        """保存文件哈希 文件已存在时更新（id不变） 返回id"""
+        row = self.conn.execute(f'SELECT id FROM {self.table} WHERE path=?', (path,)).fetchone()
+        if row is None:
+            cur = self.conn.execute(f'INSERT INTO {self.table} (path, mtime, size, hash) VALUES (?, ?, ?, ?)',
+                                    (path, *stamp, to_signed(h)))
+            id_ = cur.lastrowid
+        else:
+            id_ = row[0]
+            self.conn.execute(f'UPDATE {self.table} SET mtime=?, size=?, hash=? WHERE id=?',
+                              (*stamp, to_signed(h), id_))
+        self.index.add(id_, h)
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+        return id_
+
+    def search(self, h: int, max_distance: int = None) -> list:
+        return self.index.search(h, max_distance)
+
+    def path_of(self, id_: int) -> str or None:
+        row = self.conn.execute(f'SELECT path FROM {self.table} WHERE id=?', (id_,)).fetchone()
+        return row and row[0]
+
+    def close(self):
+        if self.conn:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}('{self.index_file}', table='{self.table}', size={len(self)})"
@@ -0,0 +1,107 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# 只需要读取图片头部即可得到的指标
+HEADER_METRICS = frozenset(('width', 'height'))
+METRICS = frozenset(('width', 'height', 'blur', 'phash', 'dhash', 'qr'))
+
+
+def _pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("image rules require Pillow, please install it: pip install Pillow")
+    return Image
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """拉普拉斯算子响应的方差 作为清晰度得分 越小越模糊"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    g = gray.astype(np.float32)
+    lap = g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+
+@lru_cache(maxsize=4)
+def dct_matrix(n: int) -> np.ndarray:
+    """n阶DCT-II变换矩阵"""
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+def bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+
+def phash(img, size: int = 8, scale: int = 4) -> int:
+    """感知哈希：缩放到(size*scale)^2的灰度图 取二维DCT的低频size*size系数 与中位数比较得到size^2位整数"""
+    n = size * scale
+    a = np.asarray(img.resize((n, n), _pil().LANCZOS), dtype=np.float64)
+    d = dct_matrix(n)
+    low = (d @ a @ d.T)[:size, :size]
+    return bits_to_int(low > np.median(low))
+
+
+def dhash(img, size: int = 8) -> int:
+    """差异哈希：缩放到(size+1)*size的灰度图 比较水平相邻像素"""
+    a = np.asarray(img.resize((size + 1, size), _pil().LANCZOS), dtype=np.int16)
+    return bits_to_int(a[:, 1:] > a[:, :-1])
+
+
+def detect_qr(gray: np.ndarray) -> str or None:
+    """检测二维码 返回解码内容（无法解码时为空字符串），未检测到时返回None"""
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("QR code detection requires opencv, please install it: pip install opencv-python-headless")
+    text, points, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+    if points is None:
+        return None
+    return text or ''
+
+
+def analyze_image(path: str, metrics: frozenset, max_side: int = 1024) -> dict:
+    """
+    解码图片并计算指标 可在子进程中执行
+    宽高来自图片头部（原始尺寸），只需要宽高时不解码像素；其余指标在灰度图上计算，
+    解码时即按`max_side`降采样（JPEG通过draft在DCT域缩小，不解码全尺寸像素），清晰度得分与max_side相关
+    :return 指标字典 失败时为{'error': 原因}
+    """
+    try:
+        Image = _pil()
+        with Image.open(path) as img:
+            width, height = img.size
+            res = {'width': width, 'height': height}
+            if metrics <= HEADER_METRICS:
+                return res
+            img.draft('L', (max_side, max_side))
+            gray_img = img.convert('L')
+        if max(gray_img.size) > max_side:
+            gray_img.thumbnail((max_side, max_side))
+        gray = np.asarray(gray_img)
+        if 'blur' in metrics:
+            res['blur'] = laplacian_variance(gray)
+        if 'phash' in metrics:
+            res['phash'] = phash(gray_img)
+        if 'dhash' in metrics:
+            res['dhash'] = dhash(gray_img)
+        if 'qr' in metrics:
+            res['qr'] = detect_qr(gray)
+        return res
+    except ImportError:
+        raise
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def file_stamp(path: str) -> tuple or None:
+    """文件的(修改时间, 大小) 用于缓存失效判断 文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
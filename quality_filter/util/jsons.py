@@ -1,14 +1,23 @@
+import re
 import json
 import datetime
+from functools import lru_cache
+
+
+def json_default(z):
+    """不能直接序列化的对象：日期时间转为字符串，bytes转为空字符串，结果对象（如ModelRes）使用to_dict"""
+    if isinstance(z, datetime.date) or isinstance(z, datetime.datetime):
+        return str(z)
+    if isinstance(z, bytes):
+        return ''
+    if hasattr(z, 'to_dict'):
+        return z.to_dict()
+    raise TypeError(f'Object of type {z.__class__.__name__} is not JSON serializable')
 
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, z):
-        if isinstance(z, datetime.date) or isinstance(z, datetime.datetime):
-            return str(z)
-        if isinstance(z, bytes):
-            return ''
-        return super().default(z)
+        return json_default(z)
 
 
 def dumps(obj, ensure_ascii=False, **kwargs):
@@ -19,22 +28,175 @@ def dump(obj, out, ensure_ascii=False, **kwargs):
     return json.dump(obj, out, ensure_ascii=ensure_ascii, cls=DateTimeEncoder, **kwargs)
 
 
+try:
+    import orjson
+
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj) -> bytes:
+        """
+        序列化为UTF-8编码的紧凑JSON（分隔符为`,`和`:`，不转义非ASCII字符），安装了orjson时使用orjson，快数倍
+        与`dumps(obj, separators=(',', ':'))`的差异：orjson将NaN/Infinity写为null（json写为NaN/Infinity，不是合法的JSON），
+        浮点数的指数写法可能不同（如1e-7与1e-07），解析后的值相同
+        """
+        try:
+            return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # 超过64位的整数等orjson不支持的数据
+            return dumps(obj, separators=(',', ':')).encode('utf8')
+except ImportError:
+    def dumps_bytes(obj) -> bytes:
+        """序列化为UTF-8编码的紧凑JSON（分隔符为`,`和`:`，不转义非ASCII字符），即`dumps(obj, separators=(',', ':'))`"""
+        return dumps(obj, separators=(',', ':')).encode('utf8')
+
+
 def split_path(path: list or str):
     if isinstance(path, str):
         path = path.split('.')
     return path
 
 
+WILDCARD = '*'
+_TOKEN_PATTERN = re.compile(r'\[(-?\d+|\*)\]')
+
+
+def parse_path(path: list or tuple or str) -> tuple:
+    """
+    解析字段路径为token元组：字符串为字典key，整数为数组下标，`*`为通配符
+    字符串路径以`.`分隔，下标和通配符使用方括号，如`items[0].name`、`items[*].name`、`meta.*`
+    列表形式的路径各元素原样作为token（整数视为下标）
+    """
+    if not isinstance(path, str):
+        return tuple(path)
+    tokens = []
+    for part in path.split('.'):
+        pos = part.find('[')
+        if pos < 0:
+            tokens.append(part)
+            continue
+        if pos > 0:
+            tokens.append(part[:pos])
+        for m in _TOKEN_PATTERN.finditer(part, pos):
+            idx = m.group(1)
+            tokens.append(WILDCARD if idx == WILDCARD else int(idx))
+    return tuple(tokens)
+
+
+def _children(val):
+    if isinstance(val, dict):
+        return val.values()
+    if isinstance(val, (list, tuple)):
+        return val
+    return ()
+
+
+def compile_function(name: str, args: str, body: list, env: dict = None):
+    """根据函数体代码行生成函数 env为函数可引用的全局变量"""
+    code = f"def {name}({args}):\n" + ''.join(f'    {line}\n' for line in body)
+    namespace = dict(env or {})
+    exec(compile(code, f'<{name}>', 'exec'), namespace)
+    return namespace[name]
+
+
+@lru_cache(maxsize=1024)
+def _compile_getter(tokens: tuple):
+    if WILDCARD in tokens:
+        pos = tokens.index(WILDCARD)
+        head = _compile_getter(tokens[:pos])
+        rest = _compile_getter(tokens[pos + 1:])
+
+        def wildcard_getter(val):
+            res = []
+            for child in _children(head(val)):
+                one = rest(child)
+                if one is not None:
+                    # 多个通配符时展开为一维列表
+                    if WILDCARD in tokens[pos + 1:]:
+                        res.extend(one)
+                    else:
+                        res.append(one)
+            return res
+        return wildcard_getter
+
+    if not tokens:
+        return lambda val: val
+    expr = 'val' + ''.join(f'[{t!r}]' for t in tokens)
+    return compile_function('getter', 'val', [
+        'try:',
+        f'    return {expr}',
+        'except (KeyError, IndexError, TypeError):',
+        '    return None',
+    ])
+
+
+def compile_getter(path: list or tuple or str):
+    """
+    将字段路径编译为取值函数`getter(val)`，字段不存在时返回None，含通配符时返回匹配值的列表
+    编译结果会被缓存，应在节点初始化时编译，而不是每条数据调用一次
+    """
+    if isinstance(path, str):
+        return _str_getter(path)
+    return _compile_getter(tuple(path))
+
+
+@lru_cache(maxsize=1024)
+def _str_getter(path: str):
+    return _compile_getter(parse_path(path))
+
+
+@lru_cache(maxsize=1024)
+def _compile_setter(tokens: tuple):
+    assert tokens, "path should not be empty"
+    if WILDCARD in tokens:
+        pos = tokens.index(WILDCARD)
+        head = _compile_getter(tokens[:pos])
+        rest = _compile_setter(tokens[pos + 1:]) if pos + 1 < len(tokens) else None
+
+        def wildcard_setter(val, value):
+            target = head(val)
+            if rest is not None:
+                for child in _children(target):
+                    rest(child, value)
+            elif isinstance(target, dict):
+                for k in target:
+                    target[k] = value
+            elif isinstance(target, list):
+                target[:] = [value] * len(target)
+        return wildcard_setter
+
+    body = ['t = val']
+    for t in tokens[:-1]:
+        if isinstance(t, int):
+            body.append(f't = t[{t!r}]')
+        else:
+            # 与fill一致：中间字段不存在时创建字典
+            body.append(f'n = t.get({t!r})')
+            body.append('if n is None:')
+            body.append(f'    n = t[{t!r}] = {{}}')
+            body.append('t = n')
+    body.append(f't[{tokens[-1]!r}] = value')
+    return compile_function('setter', 'val, value', body)
+
+
+def compile_setter(path: list or tuple or str):
+    """
+    将字段路径编译为赋值函数`setter(val, value)`，中间字段不存在时自动创建字典，路径含通配符时对每个匹配项赋值
+    """
+    if isinstance(path, str):
+        return _str_setter(path)
+    return _compile_setter(tuple(path))
+
+
+@lru_cache(maxsize=1024)
+def _str_setter(path: str):
+    return _compile_setter(parse_path(path))
+
+
 def extract(val: dict, path: list or str):
-    """获取json的某个字段 支持嵌套字段获取"""
-    if isinstance(path, str) and '.' not in path:
+    """获取json的某个字段 支持嵌套字段获取（如`user.name`）、数组下标及通配符（如`items[0].id`、`items[*].id`）"""
+    if isinstance(path, str) and '.' not in path and '[' not in path:
         return val[path]
-    path = split_path(path)
-    for key in path:
-        if key not in val:
-            return None
-        val = val[key]
-    return val
+    return compile_getter(path)(val)
 
 
 def extract_num(val: dict, path: str):
@@ -64,12 +226,7 @@ def get_valid(items: list, key: str):
 
 def fill(target: dict, path: list or str, value):
     """设置json的某个字段 支持嵌套字段设置"""
-    path = split_path(path)
-    for part in path[:-1]:
-        if part not in target:
-            target = target[part] = {}
-        target = target[part]
-    target[path[-1]] = value
+    compile_setter(path)(target, value)
 
 
 def get_field_value(field):
@@ -0,0 +1,256 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+from collections import OrderedDict
+
+# 文件格式：
+#   头部 [magic 8B][记录数 u64][哈希表偏移 u64][哈希表槽数 u64][构建参数长度 u64][构建参数 json]
+#   数据区 每条记录 [key长度 u32][value长度 u32][key][value] key和value均带类型标记（见encode）
+#   哈希表 开放寻址（线性探测） 每个槽 [key哈希 u64][记录偏移+1 u64] 偏移为0表示空槽
+MAGIC = b'QFKV0002'
+HEADER = struct.Struct('<8sQQQQ')
+RECORD = struct.Struct('<II')
+SLOT = struct.Struct('<QQ')
+
+_MISSING = object()
+
+
+def encode(val) -> bytes:
+    """
+    key/value编码 保留类型信息（与dict一致，1与'1'是不同的key）
+    字符串和整数直接编码，其他值编码为json
+    """
+    if isinstance(val, str):
+        return b's' + val.encode('utf8')
+    if isinstance(val, int) and not isinstance(val, bool):
+        return b'i' + str(val).encode('ascii')
+    return b'j' + json.dumps(val, ensure_ascii=False).encode('utf8')
+
+
+def decode(raw: bytes):
+    tag, body = raw[:1], raw[1:]
+    if tag == b's':
+        return body.decode('utf8')
+    if tag == b'i':
+        return int(body)
+    return json.loads(body)
+
+
+def key_hash(raw: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little')
+
+
+class MmapKV:
+    """
+    基于内存映射文件的只读KV索引，用于无法全部加载到内存的大词典（千万级key）
+    索引文件通过`MmapKV.build`构建一次，之后以只读方式mmap打开，多个工作进程共享操作系统的页缓存；
+    查询前有一个小的热点key LRU缓存（包括不存在的key）。
+    支持`in`、`[]`、`get`、`len`及遍历，可直接作为`InjectField(kv=...)`的参数；pickle时只传递文件路径，在子进程中重新打开
+    """
+    def __init__(self, index_file: str, hot_size: int = 10000):
+        """
+        :param index_file 索引文件
+        :param hot_size 热点key缓存大小 0表示不缓存
+        """
+        self.index_file = index_file
+        self.hot_size = hot_size
+        self._open()
+
+    def _open(self):
+        self._file = open(self.index_file, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.table_offset, self.slots, params_len = HEADER.unpack_from(self._mm, 0)
+        assert magic == MAGIC, f"invalid index file: {self.index_file}"
+        self.params = json.loads(self._mm[HEADER.size:HEADER.size + params_len])
+        self.data_start = HEADER.size + params_len
+        self.mask = self.slots - 1
+        self._hot = OrderedDict()
+
+    def open(self):
+        """关闭后重新打开（如流程再次启动时）"""
+        if self._mm is None:
+            self._open()
+
+    @staticmethod
+    def build(pairs, index_file: str, hot_size: int = 10000, params: dict = None):
+        """
+        基于(key, value)序列构建索引文件 重复的key以最后一个为准；先写入临时文件 完成后再替换
+        第一遍顺序写入数据区，第二遍扫描数据区在文件内构建哈希表，构建过程不需要把所有key放在内存中
+        :param pairs (key, value)迭代器 key/value需可json序列化
+        :param index_file 索引文件
+        :param params 构建参数（如源文件的key/value列、分隔符） 保存在头部，`open_index`据此判断索引能否复用
+        """
+        folder = os.path.dirname(os.path.abspath(index_file))
+        os.makedirs(folder, exist_ok=True)
+        tmp = f'{index_file}.tmp'
+        num = 0
+        params_raw = encode_params(params)
+        data_start = HEADER.size + len(params_raw)
+        with open(tmp, 'wb', buffering=1 << 20) as out:
+            out.write(HEADER.pack(MAGIC, 0, 0, 0, len(params_raw)))
+            out.write(params_raw)
+            for k, v in pairs:
+                kb = encode(k)
+                vb = encode(v)
+                out.write(RECORD.pack(len(kb), len(vb)))
+                out.write(kb)
+                out.write(vb)
+                num += 1
+            data_end = out.tell()
+        # 负载因子不超过0.5
+        slots = 1 << max(4, (num * 2 - 1).bit_length())
+        table_offset = data_end + (-data_end) % 8
+
+        with open(tmp, 'r+b') as f:
+            f.truncate(table_offset + slots * SLOT.size)
+            mm = mmap.mmap(f.fileno(), 0)
+            try:
+                count = MmapKV._fill_table(mm, data_start, data_end, table_offset, slots)
+                HEADER.pack_into(mm, 0, MAGIC, count, table_offset, slots, len(params_raw))
+                mm.flush()
+            finally:
+                mm.close()
+        os.replace(tmp, index_file)
+        return MmapKV(index_file, hot_size=hot_size)
+
+    @staticmethod
+    def _fill_table(mm, data_start: int, data_end: int, table_offset: int, slots: int) -> int:
+        mask = slots - 1
+        count = 0
+        pos = data_start
+        while pos < data_end:
+            klen, vlen = RECORD.unpack_from(mm, pos)
+            kstart = pos + RECORD.size
+            raw = mm[kstart:kstart + klen]
+            h = key_hash(raw)
+            slot = h & mask
+            while True:
+                at = table_offset + slot * SLOT.size
+                sh, off = SLOT.unpack_from(mm, at)
+                if off == 0:
+                    count += 1
+                    break
+                if sh == h:
+                    klen2, _ = RECORD.unpack_from(mm, off - 1)
+                    if klen2 == klen and mm[off - 1 + RECORD.size:off - 1 + RECORD.size + klen] == raw:
+                        # 重复key 覆盖为后出现的记录
+                        break
+                slot = (slot + 1) & mask
+            SLOT.pack_into(mm, at, h, pos + 1)
+            pos = kstart + klen + vlen
+        return count
+
+    def _lookup(self, key):
+        raw = encode(key)
+        h = key_hash(raw)
+        mm = self._mm
+        slot = h & self.mask
+        while True:
+            sh, off = SLOT.unpack_from(mm, self.table_offset + slot * SLOT.size)
+            if off == 0:
+                return _MISSING
+            if sh == h:
+                klen, vlen = RECORD.unpack_from(mm, off - 1)
+                kstart = off - 1 + RECORD.size
+                if mm[kstart:kstart + klen] == raw:
+                    return decode(mm[kstart + klen:kstart + klen + vlen])
+            slot = (slot + 1) & self.mask
+
+    def get(self, key, default=None):
+        hot = self._hot
+        val = hot.get(key, _MISSING)
+        if val is _MISSING:
+            val = self._lookup(key)
+            if self.hot_size > 0:
+                hot[key] = val
+                if len(hot) > self.hot_size:
+                    hot.popitem(last=False)
+        else:
+            hot.move_to_end(key)
+        return default if val is _MISSING else val
+
+    def __getitem__(self, key):
+        val = self.get(key, _MISSING)
+        if val is _MISSING:
+            raise KeyError(key)
+        return val
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for k, _ in self.items():
+            yield k
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        """按数据区顺序遍历 重复key会出现多次"""
+        mm = self._mm
+        pos = self.data_start
+        end = self.table_offset
+        while pos + RECORD.size <= end:
+            klen, vlen = RECORD.unpack_from(mm, pos)
+            if klen == 0:
+                break
+            kstart = pos + RECORD.size
+            yield decode(mm[kstart:kstart + klen]), decode(mm[kstart + klen:kstart + klen + vlen])
+            pos = kstart + klen + vlen
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+
+    def __getstate__(self):
+        return {'index_file': self.index_file, 'hot_size': self.hot_size}
+
+    def __setstate__(self, state):
+        self.index_file = state['index_file']
+        self.hot_size = state['hot_size']
+        self._open()
+
+    def __str__(self):
+        return f"{self.__class__.__name__}('{self.index_file}', count={self.count})"
+
+
+def encode_params(params: dict = None) -> bytes:
+    return json.dumps(params or {}, ensure_ascii=False, sort_keys=True).encode('utf8')
+
+
+def read_params(index_file: str) -> dict or None:
+    """读取索引文件头部保存的构建参数 文件不存在或格式不符（如旧版本）时返回None"""
+    try:
+        with open(index_file, 'rb') as f:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                return None
+            magic, _, _, _, params_len = HEADER.unpack(head)
+            if magic != MAGIC:
+                return None
+            return json.loads(f.read(params_len))
+    except (OSError, ValueError):
+        return None
+
+
+def open_index(source: str, pairs, index_file: str = None, hot_size: int = 10000, params: dict = None) -> MmapKV:
+    """
+    打开索引文件 索引不存在、比源文件旧或构建参数不同（如换了key/value列、分隔符）时重新构建
+    :param source 源文件
+    :param pairs 返回(key, value)迭代器的函数 仅在需要构建时调用
+    :param index_file 索引文件 默认为源文件加`.kvidx`后缀
+    :param params 构建参数 保存在索引头部
+    """
+    index_file = index_file or f'{source}.kvidx'
+    expected = json.loads(encode_params(params))
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(source) \
+            and read_params(index_file) == expected:
+        return MmapKV(index_file, hot_size=hot_size)
+    return MmapKV.build(pairs(), index_file, hot_size=hot_size, params=params)
@@ -0,0 +1,35 @@
+import queue
+import threading
+
+# 进程内的命名队列 用于在同一进程中连接多个流程（生产者流程WriteQueue -> 消费者流程QueueLoader）
+_queues = {}
+_lock = threading.Lock()
+
+
+def create_queue(maxsize: int = 1000, process: bool = False):
+    """
+    创建有界队列 队列满时put阻塞（反压）
+    :param maxsize 最大元素个数 0表示不限制
+    :param process 是否跨进程（multiprocessing.Queue，元素需要可pickle） 否则为线程安全的queue.Queue
+    """
+    if process:
+        import multiprocessing
+        return multiprocessing.Queue(maxsize)
+    return queue.Queue(maxsize)
+
+
+def get_queue(name: str, maxsize: int = 1000, process: bool = False):
+    """获取命名队列 不存在时创建（参数以首次创建为准）"""
+    with _lock:
+        if name not in _queues:
+            _queues[name] = create_queue(maxsize, process)
+        return _queues[name]
+
+
+def resolve_queue(q, maxsize: int = 1000, process: bool = False):
+    """队列参数：队列对象直接使用，字符串为命名队列，None时新建"""
+    if q is None:
+        return create_queue(maxsize, process)
+    if isinstance(q, str):
+        return get_queue(q, maxsize, process)
+    return q
@@ -0,0 +1,47 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """令牌桶限流器 以固定速率补充令牌，取不到令牌时阻塞等待 线程安全"""
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        :param rate 每秒补充的令牌数（即平均请求速率）
+        :param capacity 桶容量（允许的突发量），默认与rate相同
+        """
+        assert rate > 0, "rate must be positive"
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """获取指定数量的令牌 不足时阻塞"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry(func, *args, retries: int = 3, backoff: float = 1.0, max_backoff: float = 30.0, retry_on=None, **kwargs):
+    """
+    失败后按指数退避重试 超过重试次数后抛出最后一次异常
+    :param retry_on 判断异常是否可重试的函数 返回False时直接抛出 默认所有异常均重试
+    """
+    delay = backoff
+    for i in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if i >= retries or (retry_on is not None and not retry_on(e)):
+                raise e
+            print(f'Warning: {e}, retry after {delay:.1f}s')
+            time.sleep(delay)
+            delay = min(delay * 2, max_backoff)
@@ -0,0 +1,73 @@
+import os
+
+from quality_filter.util.caches import open_cache, close_cache
+
+
+class Watermark:
+    """
+    持久化水印：在本地SQLite中记录每个实体最近一次输出的版本（修订号或内容哈希）以及文件的读取位置，
+    进程重启后依然有效；增量加载时只输出新增或版本变化的实体
+    一轮读取中的更新先保存在内存中，完整读取后由`commit`统一写入，中途异常退出时本轮的数据下次会重新输出（至少一次）；
+    同一文件中的其他缓存提交事务也不会提前写入本轮的水印
+    """
+    def __init__(self, state_file: str, table: str = 'watermark'):
+        """
+        :param state_file 水印文件
+        :param table 表名 同一文件中可保存多个数据源的水印
+        """
+        self.state_file = state_file
+        self.table = table
+        self.store = open_cache(state_file, table=table)
+        # 本轮尚未写入的更新
+        self.pending = {}
+        self.emitted = 0
+        self.skipped = 0
+
+    def _get(self, key: str):
+        if key in self.pending:
+            return self.pending[key]
+        return self.store.get(key)
+
+    def changed(self, key, version) -> bool:
+        """实体为新增或版本与水印不同时返回True，否则返回False（计入跳过数）"""
+        if self._get(str(key)) == version:
+            self.skipped += 1
+            return False
+        return True
+
+    def update(self, key, version):
+        """记录实体已输出的版本 在commit时写入"""
+        self.pending[str(key)] = version
+        self.emitted += 1
+
+    def get_offset(self, input_file: str) -> int:
+        """文件上次读取到的位置；文件被替换（inode变化）或截断时从头读取"""
+        state = self._get('offset:' + os.path.abspath(input_file))
+        if state is None:
+            return 0
+        ino, size, offset = state
+        st = os.stat(input_file)
+        if st.st_ino != ino or st.st_size < size:
+            return 0
+        return offset
+
+    def set_offset(self, input_file: str, offset: int):
+        st = os.stat(input_file)
+        self.pending['offset:' + os.path.abspath(input_file)] = (st.st_ino, st.st_size, offset)
+
+    def commit(self):
+        """将本轮的更新写入水印文件并提交"""
+        self.store.set_many(self.pending)
+        self.pending = {}
+
+    def stats(self) -> dict:
+        return {'emitted': self.emitted, 'skipped': self.skipped, 'size': len(self.store)}
+
+    def close(self):
+        """关闭水印 未提交的更新被丢弃"""
+        if self.store:
+            close_cache(self.store)
+            self.store = None
+
+    def __str__(self):
+        return f"{self.__class__.__name__}('{self.state_file}', table='{self.table}')"
@@ -0,0 +1,123 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from quality_filter.iterator.accuracy_llm import LLMJudge, retryable
+from quality_filter.util.rate_limit import retry
+
+
+class Handler(BaseHTTPRequestHandler):
+    status = 200
+    drop = 0
+    calls = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        Handler.calls.append(payload)
+        if Handler.status != 200:
+            self.send_response(Handler.status)
+            self.end_headers()
+            return
+        prompts = payload['prompt']
+        choices = [{'index': i, 'text': f'Rating: [[{8 if "good" in p else 2}]]'} for i, p in enumerate(prompts)]
+        body = json.dumps({'choices': choices[:len(choices) - Handler.drop]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.status, Handler.drop, Handler.calls = 200, 0, []
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/v1'
+    httpd.shutdown()
+
+
+def judge(api_base, **kwargs):
+    node = LLMJudge(api_base, 'm', api='completions', prompts_per_request=4, retries=2, **kwargs)
+    node.on_start()
+    return node
+
+
+def test_completions_batch(server):
+    node = judge(server)
+    res = node.evaluate([{'question': 'q', 'answer': 'good'}, {'question': 'q', 'answer': 'bad'}])
+    node.on_complete()
+    assert [r.value for r in res] == [0.8, 0.2]
+    assert [r.error_status for r in res] == [False, True]
+
+
+def test_fewer_choices_fail_group(server):
+    Handler.drop = 1
+    node = judge(server)
+    res = node.evaluate([{'question': 'q', 'answer': 'good'}] * 3)
+    node.on_complete()
+    assert len(res) == 3
+    assert all(r.error_status and r.value is None for r in res)
+    assert 'expected 3 choices, got 2' in res[0].reason[0]
+
+
+def test_client_error_not_retried(server):
+    Handler.status = 400
+    node = judge(server)
+    res = node.evaluate([{'question': 'q', 'answer': 'good'}])
+    node.on_complete()
+    assert res[0].error_status and res[0].reason[0].startswith('request failed')
+    assert len(Handler.calls) == 1
+
+
+def test_missing_template_field(server):
+    node = judge(server, prompt_template='{dialogue} lang={lang}')
+    res = node.evaluate([{'question': 'q', 'answer': 'good', 'lang': 'en'}, {'question': 'q', 'answer': 'good'}])
+    node.on_complete()
+    assert res[0].value == 0.8
+    assert res[1].error_status and res[1].reason == ["missing template field: 'lang'"]
+    assert [len(c['prompt']) for c in Handler.calls] == [1]
+
+
+def test_cache_key_includes_max_tokens(server, tmp_path):
+    cache_file = str(tmp_path / 'cache.db')
+    item = {'question': 'q', 'answer': 'good'}
+    for max_tokens, calls in ((512, 1), (512, 1), (1024, 2)):
+        node = judge(server, cache_file=cache_file, max_tokens=max_tokens)
+        assert node.evaluate([item])[0].value == 0.8
+        node.on_complete()
+        assert len(Handler.calls) == calls
+    assert Handler.calls[-1]['max_tokens'] == 1024
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_retryable():
+    assert retryable(http_error(500)) and retryable(http_error(503)) and retryable(http_error(429))
+    assert not retryable(http_error(400)) and not retryable(http_error(401)) and not retryable(http_error(404))
+    assert retryable(requests.ConnectionError()) and retryable(requests.Timeout())
+    assert not retryable(ValueError())
+
+    calls = []
+
+    def fail(status):
+        calls.append(status)
+        raise http_error(status)
+
+    for status, expected in ((503, 3), (404, 1)):
+        calls.clear()
+        with pytest.raises(requests.HTTPError):
+            retry(fail, status, retries=2, backoff=0, retry_on=retryable)
+        assert len(calls) == expected
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from quality_filter.iterator.base import JsonIterator
+from quality_filter.iterator.flow_control import Aggregate
+
+
+class Slow(JsonIterator):
+    """记录执行线程 模拟IO等待"""
+    def __init__(self, tag, delay=0.05):
+        self.tag = tag
+        self.delay = delay
+        self.threads = set()
+
+    def on_data(self, data, *args):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        return f"{self.tag}:{data['id']}"
+
+
+def run(node, records):
+    node.on_start()
+    res = [one for r in records for one in node.__process__(r)]
+    node.on_complete()
+    return res
+
+
+def test_sequential_by_default():
+    nodes = [Slow('a', 0), Slow('b', 0)]
+    agg = Aggregate(*nodes)
+    assert run(agg, [{'id': 1}, {'id': 2}]) == [['a:1', 'b:1'], ['a:2', 'b:2']]
+    assert agg.executor is None
+    assert nodes[0].threads == {threading.current_thread().name}
+
+
+def test_parallel_keeps_order():
+    nodes = [Slow('a'), Slow('b'), Slow('c', 0), Slow('d')]
+    agg = Aggregate(*nodes, lambda r: r['id'], max_workers=4)
+    started = time.time()
+    res = run(agg, [{'id': i} for i in range(3)])
+    elapsed = time.time() - started
+    assert res == [[f'a:{i}', f'b:{i}', f'c:{i}', f'd:{i}', i] for i in range(3)]
+    assert threading.current_thread().name not in nodes[0].threads
+    # 三个慢节点并行 每条记录约一个delay
+    assert elapsed < 3 * 3 * 0.05
+    assert agg.executor is None
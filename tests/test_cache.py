@@ -0,0 +1,44 @@
+from quality_filter.iterator.base import JsonIterator
+from quality_filter.iterator.cache import Cached, config_of
+from quality_filter.iterator.field_based import AddFields, Select
+from quality_filter.iterator.flow_control import Chain, If, Filter
+
+
+class Counter(JsonIterator):
+    def __init__(self, node):
+        self.node = node
+        self.calls = 0
+
+    def on_data(self, data, *args):
+        self.calls += 1
+        return self.node.on_data(data)
+
+
+def test_child_config_changes_hash():
+    assert config_of(Chain(AddFields(x='1'), Select('a'))) != config_of(Chain(AddFields(x='2'), Select('b')))
+    assert config_of(Chain(AddFields(x='1'))) == config_of(Chain(AddFields(x='1')))
+    assert config_of(If(AddFields(x='1'), key='a')) != config_of(If(AddFields(x='2'), key='a'))
+
+
+def test_lambda_changes_hash():
+    node = AddFields(x='1')
+    assert config_of(If(node, matcher=lambda r: r['a'] > 1)) == config_of(If(node, matcher=lambda r: r['a'] > 1))
+    assert config_of(If(node, matcher=lambda r: r['a'] > 1)) != config_of(If(node, matcher=lambda r: r['a'] > 2))
+    assert config_of(If(node, key='a')) != config_of(If(node, key='b'))
+    assert config_of(Filter("lang == 'zh'")) != config_of(Filter("lang == 'en'"))
+
+
+def test_changed_child_misses_cache(tmp_path):
+    cache_file = str(tmp_path / 'cache.db')
+
+    def run(value):
+        inner = Counter(AddFields(x=value))
+        node = Cached(inner, cache_file)
+        node.on_start()
+        res = [node.__process__({'id': i}) for i in range(3)]
+        node.on_complete()
+        return inner.calls, res
+
+    assert run('1') == (3, [{'id': i, 'x': '1'} for i in range(3)])
+    assert run('1')[0] == 0
+    assert run('2') == (3, [{'id': i, 'x': '2'} for i in range(3)])
@@ -0,0 +1,45 @@
+import time
+from datetime import timezone, timedelta
+
+import numpy as np
+import pytest
+
+from quality_filter.util.dates import DateParser
+
+
+@pytest.fixture
+def shanghai(monkeypatch):
+    """本地时区设为Asia/Shanghai（1986-1991年有夏令时，但time.daylight为0）"""
+    monkeypatch.setenv('TZ', 'Asia/Shanghai')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_iso_not_shadowed_by_cached_format(shanghai):
+    parser = DateParser()
+    # 非ISO格式按UTC 并被缓存
+    assert parser.parse('2020-1-1 10:00:00') == 1577872800000
+    # ISO格式按本地时区 不受缓存格式影响
+    assert parser.parse('2020-01-01 10:00:00') == 1577844000000
+    assert DateParser().parse('2020-01-01 10:00:00') == 1577844000000
+
+
+def test_parse_many_historical_dst(shanghai):
+    values = ['1988-06-01 12:00:00', '1988-01-01 12:00:00', '2020-01-01 10:00:00', '2020/01/01 10:00:00', 'x']
+    res = DateParser().parse_many(values).astype(np.int64)
+    expected = [DateParser().parse(v) for v in values[:4]]
+    assert list(res[:4]) == expected
+    # 1988年夏令时期间为UTC+9
+    assert expected[0] == 581137200000
+    assert expected[1] == 568008000000
+    assert np.isnat(DateParser().parse_many(values)[4])
+
+
+def test_parse_many_fixed_tz(shanghai):
+    tz = timezone(timedelta(hours=-5))
+    values = ['2020-01-01 10:00:00', '2020/01/01 10:00:00', '2020-1-1 10:00:00']
+    res = DateParser(tz=tz).parse_many(values).astype(np.int64)
+    assert list(res) == [1577890800000] * 3
+    assert [DateParser(tz=tz).parse(v) for v in values] == [1577890800000] * 3
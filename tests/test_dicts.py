@@ -0,0 +1,82 @@
+import copy
+import json
+import pickle
+
+from quality_filter.util.dicts import CowDict, cow
+
+
+def record():
+    return {'id': 1, 'text': 'x' * 10, 'meta': {'lang': 'zh', 'tags': ['a']}, 'items': [{'v': 1}]}
+
+
+def mutate(d):
+    d['meta']['lang'] = 'en'
+    d['meta']['tags'].append('b')
+    d['items'][0]['v'] = 2
+    d['items'].append({'v': 3})
+
+
+def test_view_write_isolated():
+    base = record()
+    view = cow(base)
+    mutate(view)
+    view['id'] = 2
+    assert base == record()
+    assert view['meta'] == {'lang': 'en', 'tags': ['a', 'b']}
+
+
+def test_dict_constructor_isolated():
+    base = record()
+    mutate(dict(cow(base)))
+    assert base == record()
+
+
+def test_unpack_isolated():
+    base = record()
+    mutate({**cow(base)})
+    assert base == record()
+
+
+def test_update_and_or_isolated():
+    base = record()
+    target = {}
+    target.update(cow(base))
+    mutate(target)
+    mutate(cow(base) | {'x': 1})
+    mutate({'x': 1} | cow(base))
+    assert base == record()
+
+
+def test_copy_isolated():
+    base = record()
+    view = cow(base)
+    dup = view.copy()
+    mutate(dup)
+    assert base == record()
+    assert view == record()
+    # 复制后修改原视图 不影响副本
+    dup = view.copy()
+    mutate(view)
+    assert dup == record()
+
+
+def test_view_of_view_isolated():
+    base = record()
+    view = cow(base)
+    nested = cow(view)
+    mutate(view)
+    assert nested == record()
+    mutate(nested)
+    assert base == record()
+
+
+def test_serialization_plain():
+    view = cow(record())
+    mutate(view)
+    expected = record()
+    mutate(expected)
+    assert json.loads(json.dumps(view)) == expected
+    restored = pickle.loads(pickle.dumps(view))
+    assert type(restored) is dict and restored == expected
+    assert copy.deepcopy(view) == expected
+    assert isinstance(view, CowDict)
@@ -0,0 +1,31 @@
+import pytest
+
+from quality_filter.util.filters import FilterExpr
+
+
+@pytest.mark.parametrize('expr, record, expected', [
+    ("len(text) > 100 or lang == 'zh'", {'lang': 'zh'}, True),
+    ("len(text) > 100 or lang == 'zh'", {'lang': 'en'}, False),
+    ("len(text) > 100 or lang == 'zh'", {'text': 'x' * 101}, True),
+    ("lang == 'zh' or len(text) > 100", {'lang': 'zh'}, True),
+    ("len(text) > 100 and lang == 'zh'", {'lang': 'zh'}, False),
+    ("not len(text) > 100", {}, True),
+    ("score > 0.5 or exists(label)", {'label': 'a'}, True),
+    ("score > 0.5 or exists(label)", {'score': 'high'}, False),
+    ("int(n) > 3 or meta.source == 'web'", {'n': 'x', 'meta': {'source': 'web'}}, True),
+    ("lower(lang) == 'zh' and not match(url, 'wiki')", {'lang': 'ZH'}, True),
+    ("items[0].id == 1 or len(items) == 0", {'items': []}, True),
+    ("f('a-b') >= 2", {'a-b': 3}, True),
+    ("f('a-b') >= 2", {}, False),
+])
+def test_missing_fields(expr, record, expected):
+    assert FilterExpr(expr)(record) is expected
+
+
+def test_csv_accessor():
+    from quality_filter.util.filters import column_accessor
+    expr = FilterExpr("len(text) > 3 or lang == 'zh'")
+    predicate = expr.bind(column_accessor(['lang', 'text']))
+    assert predicate(['zh', None]) is True
+    assert predicate(['en', 'abcd']) is True
+    assert predicate(['en', None]) is False
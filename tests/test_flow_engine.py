@@ -0,0 +1,63 @@
+import io
+import threading
+import contextlib
+
+from quality_filter.flow_engine import broadcast, run_flows
+from quality_filter.iterator.base import JsonIterator
+from quality_filter.iterator.flow_control import copier_of
+from quality_filter.loader import Array, QueueLoader
+from quality_filter.util.queues import create_queue
+
+
+class Mutate(JsonIterator):
+    """原地修改嵌套字段"""
+    def on_data(self, data, *args):
+        data['meta']['x'] = 'changed'
+        data['meta']['tags'].append('t')
+        return data
+
+
+class Collect(JsonIterator):
+    def __init__(self):
+        self.items = []
+
+    def on_data(self, data, *args):
+        self.items.append((data['meta']['x'], list(data['meta']['tags'])))
+        return data
+
+
+def records(num):
+    return [{'id': i, 'meta': {'x': 'origin', 'tags': []}} for i in range(num)]
+
+
+def test_broadcast_isolates_nested_fields():
+    data = records(600)
+    queues = [create_queue(2), create_queue(2)]
+    mutate, collect = Mutate(), Collect()
+
+    def drain(q, node):
+        for item in QueueLoader(q, timeout=0, batched=True).iter():
+            node.on_data(item)
+
+    threads = [threading.Thread(target=broadcast, args=(Array(data), queues, copier_of(True, 'cow'), 16)),
+               threading.Thread(target=drain, args=(queues[0], mutate)),
+               threading.Thread(target=drain, args=(queues[1], collect))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert collect.items == [('origin', [])] * 600
+    # 原始记录也不受影响
+    assert all(r['meta'] == {'x': 'origin', 'tags': []} for r in data)
+
+
+def test_run_flows_two_flows_nested_mutation(tmp_path):
+    data = tmp_path / 'data.jsonl'
+    data.write_text('\n'.join('{"id": %d, "meta": {"x": "origin", "tags": []}}' % i for i in range(1000)) + '\n')
+    (tmp_path / 'a.yaml').write_text(f"name: a\nloader: JsonLine('{data}')\nprocessor: =__mutate\n")
+    (tmp_path / 'b.yaml').write_text(f"name: b\nloader: JsonLine('{data}')\nprocessor: =__collect\n")
+    collect = Collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_flows([str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')], buffer_size=32, chunk_size=8,
+                  mutate=Mutate(), collect=collect)
+    assert collect.items == [('origin', [])] * 1000
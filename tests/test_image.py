@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from quality_filter.iterator.image import ImagePHash, ImageResolution
+
+
+def make_image(path, size=(320, 240), seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    Image.fromarray(pixels).resize(size, Image.NEAREST).save(path)
+    return str(path)
+
+
+def run(rule, records):
+    rule.on_start()
+    res = list(rule.__process__(r) for r in records)
+    res = [one for gen in res for one in gen] + list(rule.__process__(None))
+    rule.on_complete()
+    return res
+
+
+def test_resolution(tmp_path):
+    small = make_image(tmp_path / 'small.png', size=(64, 48))
+    large = make_image(tmp_path / 'large.png', size=(320, 240))
+    res = run(ImageResolution(min_width=100, min_height=100, max_workers=0),
+              [{'img': small}, {'img': large}, {'img': str(tmp_path / 'missing.png')}])
+    assert [r.error_status for r in res] == [True, False, True]
+    assert [r.value for r in res[:2]] == [48, 240]
+
+
+def test_phash_duplicates(tmp_path):
+    a = make_image(tmp_path / 'a.png', seed=1)
+    b = make_image(tmp_path / 'b.png', seed=2)
+    a_copy = make_image(tmp_path / 'a_copy.png', seed=1)
+    res = run(ImagePHash(max_workers=0), [{'img': a}, {'img': b}, {'img': a_copy}])
+    assert [r.error_status for r in res] == [False, False, True]
+    assert [r.value for r in res] == [None, None, 0]
+    assert res[0].reason[0].startswith('phash: ')
+    assert a in res[2].reason[0]
+    # value为数值 可以转换为pydantic模型
+    for r in res:
+        assert r.value is None or isinstance(r.value, (int, float))
+
+
+def test_process_pool(tmp_path):
+    paths = [make_image(tmp_path / f'{i}.png', seed=i) for i in range(6)]
+    res = run(ImagePHash(max_workers=2, batch_size=4), [{'img': p} for p in paths + paths[:1]])
+    assert [r.error_status for r in res] == [False] * 6 + [True]
+
+
+def test_dedup_repeated_path(tmp_path):
+    from quality_filter.iterator.image import ImageDedup
+    a = make_image(tmp_path / 'a.png', seed=1)
+    b = make_image(tmp_path / 'b.png', seed=2)
+    a_copy = make_image(tmp_path / 'a_copy.png', seed=1)
+    node = ImageDedup(max_workers=0, batch_size=2, max_referenced=2)
+    res = run(node, [{'img': a}, {'img': b}, {'img': a}, {'img': a_copy}, {'img': b}])
+    assert [r.error_status for r in res] == [False, False, True, True, False]
+    assert res[2].reason == [f'same image as record #0: {a}']
+    assert res[3].reason[0].startswith(f'near duplicate of: {a}')
+    # 只保留最近引用的2个路径 b已被淘汰
+    assert list(node.referenced) == [a_copy, b]
@@ -0,0 +1,23 @@
+import json
+import datetime
+
+from quality_filter.iterator.result import ModelRes
+from quality_filter.util.jsons import dumps, dumps_bytes
+
+
+def test_dumps_bytes_compact_and_equivalent():
+    obj = {'a': 1, 'b': [1.5, '中文', None, True], 'c': {'d': 1e-7}, 1: 2, 'big': 1 << 70,
+           'when': datetime.date(2020, 1, 2), 'res': ModelRes(name='r')}
+    raw = dumps_bytes(obj)
+    assert b', ' not in raw and b': ' not in raw
+    assert '中文'.encode('utf8') in raw
+    assert json.loads(raw) == json.loads(dumps(obj))
+
+
+def test_dumps_bytes_non_finite():
+    raw = dumps_bytes({'n': float('nan')})
+    try:
+        import orjson  # noqa: F401
+        assert raw == b'{"n":null}'
+    except ImportError:
+        assert raw == b'{"n":NaN}'
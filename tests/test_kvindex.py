@@ -0,0 +1,54 @@
+import os
+
+from quality_filter.iterator.field_based import InjectField
+from quality_filter.util.dicts import from_csv, from_json
+from quality_filter.util.kvindex import MmapKV, read_params
+
+
+def test_build_and_lookup(tmp_path):
+    kv = MmapKV.build(iter([('a', 1), (1, 'x'), ('a', 2)]), str(tmp_path / 'kv.idx'), params={'v': 1})
+    assert kv['a'] == 2 and kv[1] == 'x' and '1' not in kv and len(kv) == 2
+    assert kv.params == {'v': 1}
+    assert list(kv.items()) == [('a', 1), (1, 'x'), ('a', 2)]
+    kv.close()
+
+
+def test_index_rebuilt_when_params_change(tmp_path):
+    src = tmp_path / 'dict.csv'
+    src.write_text('k1,v1,w1\nk2,v2,w2\n')
+    index = str(tmp_path / 'dict.kvidx')
+    kv = from_csv(str(src), index_file=index)
+    assert kv.get('k1') == 'v1'
+    kv.close()
+    kv = from_csv(str(src), val_col=2, index_file=index)
+    assert kv.get('k1') == 'w1'
+    assert read_params(index)['val_col'] == 2
+    kv.close()
+    kv = from_csv(str(src), key_col=1, val_col=0, index_file=index)
+    assert kv.get('v2') == 'k2' and kv.get('k2') is None
+    kv.close()
+    # 参数相同时复用
+    mtime = os.path.getmtime(index)
+    from_csv(str(src), key_col=1, val_col=0, index_file=index).close()
+    assert os.path.getmtime(index) == mtime
+
+
+def test_json_index_params(tmp_path):
+    src = tmp_path / 'dict.jsonl'
+    src.write_text('{"id": "Q1", "name": "a", "label": "b"}\n')
+    index = str(tmp_path / 'dict.kvidx')
+    from_json(str(src), index_file=index).close()
+    kv = from_json(str(src), val_key='label', index_file=index)
+    assert kv['Q1'] == 'b'
+    kv.close()
+
+
+def test_inject_field_closes_index(tmp_path):
+    index = str(tmp_path / 'kv.idx')
+    MmapKV.build(iter([('Q1', 'name')]), index).close()
+    node = InjectField(index, 'name', 'id')
+    for _ in range(2):
+        node.on_start()
+        assert node.on_data({'id': 'Q1'}) == {'id': 'Q1', 'name': 'name'}
+        node.on_complete()
+        assert node.kv._mm is None
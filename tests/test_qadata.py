@@ -0,0 +1,40 @@
+import io
+import contextlib
+
+import pytest
+
+from quality_filter.loader.qadata import QadataJsonDump
+
+
+def read(path, **kwargs):
+    loader = QadataJsonDump(str(path), **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        res = [item['id'] for item in loader.iter()]
+    loader.close()
+    return res
+
+
+@pytest.mark.parametrize('text', [
+    '[{"id":1},\n{"id":2}]',
+    '[\n{"id":1},\n{"id":2}\n]\n',
+    '[\r\n' + ''.join('{"id":%d},\r\n' % i for i in range(1, 20)) + '{"id":20}\r\n]\r\n',
+])
+@pytest.mark.parametrize('parts', [1, 2, 3, 4, 7, 50])
+def test_parts_cover_file_once(tmp_path, text, parts):
+    path = tmp_path / 'dump.json'
+    path.write_bytes(text.encode())
+    expected = read(path)
+    assert expected == list(range(1, len(expected) + 1))
+    combined = []
+    for part in range(parts):
+        combined.extend(read(path, part=part, parts=parts))
+    assert combined == expected
+
+
+def test_parallel_blocks(tmp_path):
+    path = tmp_path / 'dump.json'
+    path.write_text('[\n' + ''.join('{"id":%d},\n' % i for i in range(1, 200)) + '{"id":200}\n]\n')
+    combined = []
+    for part in range(3):
+        combined.extend(read(path, part=part, parts=3, max_workers=2, block_size=64))
+    assert combined == list(range(1, 201))
@@ -0,0 +1,16 @@
+from quality_filter.iterator.result import ModelRes
+
+
+def test_reason_not_shared():
+    a, b = ModelRes(), ModelRes()
+    a.reason.append('x')
+    assert a.reason == ['x'] and b.reason == []
+
+
+def test_round_trip():
+    res = ModelRes(error_status=True, name='Rule', value=0.5, reason=['r'])
+    d = res.to_dict()
+    assert d == {'error_status': True, 'type': 'QUALITY_GOOD', 'name': 'Rule', 'value': 0.5, 'reason': ['r']}
+    assert ModelRes.from_dict(d) == res
+    assert ModelRes.from_dict.__annotations__['d'] is dict
+    assert res.model_dump() == d
@@ -0,0 +1,51 @@
+import pickle
+
+from quality_filter.iterator.rule import CheckDuplicateValues, ColumnProfile, ColumnProfiler
+
+
+def test_duplicate_ratio_matches_check_duplicate_values():
+    values = ['a', 'b', 'a', None, ' ', 'c', 'b', 'a', '', 'd']
+    expected = CheckDuplicateValues().on_data([{'data': values}])
+    profile = ColumnProfile()
+    for val in values:
+        profile.add(val)
+    report = profile.to_dict()
+    assert report['duplicate_rows'] == expected['duplicate_rows'].value == 5
+    assert report['duplicate_ratio'] == expected['duplicate_ratio'].value == 0.5
+    # 第二次及以后出现的非空行占比
+    assert report['repeat_ratio'] == round(1 - 4 / 7, 4)
+
+
+def test_equal_values_of_different_types_counted_apart():
+    profile = ColumnProfile()
+    for val in [1, 1.0, True, '1', 1]:
+        profile.add(val)
+    report = profile.to_dict()
+    assert report['distinct'] == 4
+    assert report['duplicate_rows'] == 2
+    top = report['top_k']
+    assert top[0] == (1, 2) and type(top[0][0]) is int
+    assert sorted((repr(val), num) for val, num in top[1:]) == [("'1'", 1), ('1.0', 1), ('True', 1)]
+    assert report['min'] == 1 and report['max'] == 1.0
+
+
+def test_unhashable_values_and_merge():
+    a, b = ColumnProfiler('x'), ColumnProfiler('x')
+    for node, vals in ((a, [[1], {'k': 1}]), (b, [[1], '[1]'])):
+        for val in vals:
+            node.on_data({'x': val})
+    merged = pickle.loads(pickle.dumps(a)).merge(pickle.loads(pickle.dumps(b)))
+    report = merged.profile()['x']
+    assert report['total'] == 4
+    # 列表[1]与字符串'[1]'不相同
+    assert report['distinct'] == 3
+    assert report['duplicate_rows'] == 2
+
+
+def test_exact_limit_exceeded():
+    profile = ColumnProfile(exact_limit=3)
+    for val in 'abcdd':
+        profile.add(val)
+    report = profile.to_dict()
+    assert report['duplicate_rows'] is None and report['duplicate_ratio'] is None
+    assert report['distinct'] == 4
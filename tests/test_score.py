@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from quality_filter.iterator.score import Comprehensive
+
+
+def make():
+    return Comprehensive(weights={'a': 0.5, 'b': 0.5})
+
+
+def test_score():
+    node = make()
+    assert node.score([1.0, 0.0]) == 50.0
+    assert node.on_data({'a': 1.0, 'b': 1.0})['score'] == 100.0
+    assert node.score_batch([[1.0, 0.0], [1.0, 1.0]]) == [50.0, 100.0]
+
+
+@pytest.mark.parametrize('values', [[1.0], [1.0, 1.0, 1.0]])
+def test_score_width_mismatch(values):
+    with pytest.raises(ValueError, match='指标值个数'):
+        make().score(values)
+    with pytest.raises(ValueError, match='指标值个数'):
+        make().score_batch([values])
+    with pytest.raises(ValueError, match='指标值个数'):
+        make().score_batch(np.array([values]))
@@ -0,0 +1,20 @@
+import random
+
+import pytest
+
+from quality_filter.util.texts import count_tokens, normalize
+
+
+@pytest.mark.parametrize('sep', [chr(i) for i in range(128)])
+def test_count_tokens_separators(sep):
+    for text in (f'a{sep}b', f'a{sep}{sep}b c', f'{sep}a, b{sep}', f'中{sep}文，b'):
+        assert count_tokens(text) == len(normalize(text).split()), repr(text)
+        assert count_tokens(text, remove_punct=False) == len(text.split())
+
+
+def test_count_tokens_random():
+    rng = random.Random(0)
+    alphabet = [chr(i) for i in range(128)] + ['中', '文', '，', '。', '　', '\xa0']
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert count_tokens(text) == len(normalize(text).split()), repr(text)
@@ -0,0 +1,85 @@
+import io
+import json
+import contextlib
+
+from quality_filter.loader import Incremental, JsonLine
+from quality_filter.loader.qadata import QadataXmlIncr, ns_prefix
+from quality_filter.util.caches import open_cache, close_cache
+
+
+def write_lines(path, records):
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records))
+
+
+def consume(loader, limit=None):
+    res = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in loader.iter():
+            res.append(item)
+            if limit is not None and len(res) >= limit:
+                break
+    loader.close()
+    return res
+
+
+def test_incremental_commits_only_after_full_pass(tmp_path):
+    data, state = tmp_path / 'data.jsonl', str(tmp_path / 'state.db')
+    write_lines(data, [{'id': i, 'v': 0} for i in range(5)])
+    # 中途退出：本轮的水印不保存
+    assert len(consume(Incremental(JsonLine(str(data)), state, key='id'), limit=3)) == 3
+    assert [r['id'] for r in consume(Incremental(JsonLine(str(data)), state, key='id'))] == list(range(5))
+    assert consume(Incremental(JsonLine(str(data)), state, key='id')) == []
+    write_lines(data, [{'id': i, 'v': int(i == 2)} for i in range(5)])
+    assert consume(Incremental(JsonLine(str(data)), state, key='id')) == [{'id': 2, 'v': 1}]
+
+
+def test_shared_connection_commit_does_not_persist_pass(tmp_path):
+    data, state = tmp_path / 'data.jsonl', str(tmp_path / 'state.db')
+    write_lines(data, [{'id': i} for i in range(3)])
+    other = open_cache(state, table='other')
+    loader = Incremental(JsonLine(str(data)), state, key='id')
+    it = loader.iter()
+    next(it)
+    next(it)
+    # 同一文件中其他缓存提交事务
+    other.set('k', 1)
+    other.commit()
+    it.close()
+    loader.close()
+    close_cache(other)
+    assert len(consume(Incremental(JsonLine(str(data)), state, key='id'))) == 3
+
+
+def test_incremental_offset(tmp_path):
+    data, state = tmp_path / 'data.jsonl', str(tmp_path / 'state.db')
+    write_lines(data, [{'id': i} for i in range(3)])
+    assert len(consume(Incremental(JsonLine(str(data)), state, offset=True), limit=2)) == 2
+    assert len(consume(Incremental(JsonLine(str(data)), state, offset=True))) == 3
+    with open(data, 'a') as f:
+        f.write(json.dumps({'id': 3}) + '\n')
+    assert consume(Incremental(JsonLine(str(data)), state, offset=True)) == [{'id': 3}]
+
+
+def write_xml(path, pages):
+    body = ''.join(f'<page><title>{title}</title><revision><id>{rev}</id><text>{text}</text></revision></page>'
+                   for title, rev, text in pages)
+    path.write_text(f'<mediawiki xmlns="{ns_prefix}">{body}</mediawiki>')
+
+
+def test_xml_incr_failed_pages_not_marked(tmp_path):
+    xml, state = tmp_path / 'incr.xml', str(tmp_path / 'state.db')
+    write_xml(xml, [('Q1', 1, '{"id": "Q1"}'), ('Q2', 1, '{bad'), ('Q3', 1, '{"id": "Q3"}')])
+    assert consume(QadataXmlIncr(str(xml), state), limit=1) == [{'id': 'Q1'}]
+    assert consume(QadataXmlIncr(str(xml), state)) == [{'id': 'Q1'}, {'id': 'Q3'}]
+    # 解析失败的页面未记录水印 修复后输出
+    write_xml(xml, [('Q1', 1, '{"id": "Q1"}'), ('Q2', 1, '{"id": "Q2"}'), ('Q3', 1, '{"id": "Q3"}')])
+    assert consume(QadataXmlIncr(str(xml), state)) == [{'id': 'Q2'}]
+    assert consume(QadataXmlIncr(str(xml), state)) == []
+
+
+def test_xml_incr_parallel_commits_after_output(tmp_path):
+    xml, state = tmp_path / 'incr.xml', str(tmp_path / 'state.db')
+    write_xml(xml, [(f'Q{i}', 1, '{"id": %d}' % i) for i in range(10)])
+    assert len(consume(QadataXmlIncr(str(xml), state, max_workers=1, batch_size=2), limit=3)) == 3
+    assert len(consume(QadataXmlIncr(str(xml), state, max_workers=1, batch_size=2))) == 10
+    assert consume(QadataXmlIncr(str(xml), state, max_workers=1, batch_size=2)) == []
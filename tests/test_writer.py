@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from quality_filter.iterator.writer import JsonLineWriter
+
+
+def run(writer, records):
+    writer.on_start()
+    for r in records:
+        writer.on_data(r)
+    writer.on_complete()
+
+
+@pytest.mark.parametrize('background', [True, False])
+def test_failed_write_publishes_no_file(tmp_path, background):
+    out = tmp_path / 'out.jsonl'
+    records = [{'id': i} for i in range(6)]
+    records[2]['bad'] = object()
+    writer = JsonLineWriter(str(out), batch_size=2, background=background)
+    with pytest.raises(TypeError):
+        run(writer, records)
+    # 前台写入时错误在on_data中抛出 之后再结束也不应生成文件
+    writer.on_complete()
+    assert os.listdir(tmp_path) == []
+
+
+def test_rotated_parts_before_error_are_kept(tmp_path):
+    records = [{'id': i} for i in range(6)]
+    records[4]['bad'] = object()
+    writer = JsonLineWriter(str(tmp_path / 'out.jsonl'), batch_size=2, rotate_records=2)
+    with pytest.raises(TypeError):
+        run(writer, records)
+    assert sorted(os.listdir(tmp_path)) == ['out-00000.jsonl', 'out-00001.jsonl']
+
+
+def test_write_success(tmp_path):
+    out = tmp_path / 'out.jsonl'
+    run(JsonLineWriter(str(out), batch_size=4), [{'id': i} for i in range(6)])
+    assert out.read_text().splitlines() == ['{"id":%d}' % i for i in range(6)]
+    assert os.listdir(tmp_path) == ['out.jsonl']